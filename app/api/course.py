@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List
 from ..models.course import Model, ModelCreate, Chapter, ChapterCreate, Video, VideoCreate, ModelWithChapters
 from ..config.database import get_db_connection
+from ..services.lesson_index import lesson_index
+from ..services.embedding_store import embedding_store
 
 router = APIRouter()
 
@@ -111,6 +113,7 @@ async def create_chapter(chapter: ChapterCreate):
             (chapter.model_id, chapter.name, chapter.description)
         )
         conn.commit()
+        lesson_index.invalidate()
         chapter_id = cursor.lastrowid
         cursor.execute("SELECT * FROM chapters WHERE id = %s", (chapter_id,))
         return cursor.fetchone()
@@ -154,7 +157,13 @@ async def create_video(video: VideoCreate):
             (video.model_id, video.chapter_id, video.video_filename)
         )
         conn.commit()
+        lesson_index.invalidate()
         video_id = cursor.lastrowid
+        # Đưa embedding của video mới vào RAM và chỉ mục ANN ngay (nếu file embedding đã có)
+        try:
+            embedding_store.add_video(video.model_id, video.video_filename, video_id)
+        except Exception as e:
+            print(f"Could not add embedding for {video.video_filename}: {str(e)}")
         cursor.execute("SELECT * FROM videos WHERE id = %s", (video_id,))
         return cursor.fetchone()
     finally:
@@ -190,6 +199,7 @@ async def update_chapter(chapter_id: int, chapter: ChapterCreate):
             (chapter.model_id, chapter.name, chapter.description, chapter_id)
         )
         conn.commit()
+        lesson_index.invalidate()
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Chapter not found")
         cursor.execute("SELECT * FROM chapters WHERE id = %s", (chapter_id,))
@@ -208,6 +218,7 @@ async def update_video(video_id: int, video: VideoCreate):
             (video.model_id, video.chapter_id, video.video_filename, video_id)
         )
         conn.commit()
+        lesson_index.invalidate()
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Video not found")
         cursor.execute("SELECT * FROM videos WHERE id = %s", (video_id,))
@@ -224,6 +235,7 @@ async def delete_model(model_id: int):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM models WHERE id = %s", (model_id,))
         conn.commit()
+        lesson_index.invalidate()
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Model not found")
         return {"message": "Model deleted successfully"}
@@ -238,6 +250,7 @@ async def delete_chapter(chapter_id: int):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM chapters WHERE id = %s", (chapter_id,))
         conn.commit()
+        lesson_index.invalidate()
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Chapter not found")
         return {"message": "Chapter deleted successfully"}
@@ -252,6 +265,7 @@ async def delete_video(video_id: int):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM videos WHERE id = %s", (video_id,))
         conn.commit()
+        lesson_index.invalidate()
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Video not found")
         return {"message": "Video deleted successfully"}
@@ -1,22 +1,37 @@
-import os
-import base64
-import numpy as np
-import cv2
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import RedirectResponse
-from app.models.schemas import VideoProcessRequest, VideoResponse
-from app.services.landmark_service import LandmarkService
-from app.services.model_service import ModelService
-from app.services.roadmap_service import RoadmapService
-from app.config.settings import FRAMES_LIMIT
+import json
+from collections import deque
+from typing import Optional
+from urllib.parse import unquote
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, PlainTextResponse
+from app.models.schemas import VideoProcessRequest, VideoResponse, RecognizeRequest, RecognizeResponse
+from app.services.landmark_pool import landmark_pool, LandmarkWorkerError
+from app.services.admission import scoring_queue
+from app.services.early_exit import CheckpointScorer
+from app.services.recognition_service import RecognitionService
+from app.services.model_registry import model_registry
+from app.services.embedding_store import embedding_store
+from app.services.lesson_index import lesson_index
+from app.services.frame_pipeline import (
+    frame_pipeline, imread_flag_for_scale, decode_base64_frame, decode_image, split_length_prefixed_frames,
+    frame_cache_key
+)
+from app.services.result_cache import frame_cache, result_cache, frame_digest, request_digest
+from app.services.metrics import registry, RequestMetrics, bind_model_id
+from app.services.tracing import RequestTrace, span, profiler
+from app.config.settings import (
+    FRAMES_LIMIT, RECOGNIZE_MAX_TOP_K, PROFILE_INTERVAL_MS, PROFILE_MAX_REQUESTS, PROFILE_TIMEOUT_SECONDS,
+    LANDMARK_RETRY_AFTER_SECONDS
+)
+from app.utils.landmarks import describe_layout, parse_landmark_tensor, LandmarkRingBuffer
 from .user import router as user_router
 from .course import router as course_router
-from app.core.deps import get_current_active_user, get_current_user_optional  # Import optional authentication
+from app.core.deps import get_current_admin_user, get_current_user_optional  # Import optional authentication
+from app.database import SessionLocal
 
 router = APIRouter()
-landmark_service = LandmarkService()
-model_service = ModelService()
-roadmap_service = RoadmapService(model_service)
+recognition_service = RecognitionService(embedding_store, lesson_index)
 
 router.include_router(user_router, tags=["users"])
 router.include_router(course_router, prefix="/course", tags=["courses"])
@@ -25,98 +40,474 @@ router.include_router(course_router, prefix="/course", tags=["courses"])
 @router.get("/roadmap")
 async def get_roadmap():
     """Lấy danh sách các chương và bài học"""
-    return roadmap_service.get_roadmap()
+    return lesson_index.get_roadmap()
 
-@router.post("/process-video", response_model=VideoResponse)
-async def process_video(
-    request: VideoProcessRequest,
-    current_user: dict = Depends(get_current_user_optional)  # Make authentication optional
+@router.get("/models/registry-stats", dependencies=[Depends(get_current_admin_user)])
+async def get_model_registry_stats():
+    """Thống kê hit/miss/thời gian load của model registry"""
+    return model_registry.get_stats()
+
+@router.get("/models/batching-stats", dependencies=[Depends(get_current_admin_user)])
+async def get_model_batching_stats():
+    """Histogram kích thước batch và thời gian chờ gom batch của từng model"""
+    return model_registry.get_batching_stats()
+
+@router.get("/scoring-queue/stats", dependencies=[Depends(get_current_admin_user)])
+async def get_scoring_queue_stats():
+    """Độ sâu hàng đợi và thời gian chờ của đường chấm điểm (dùng cho autoscale)"""
+    return scoring_queue.get_stats()
+
+@router.get("/embeddings/stats", dependencies=[Depends(get_current_admin_user)])
+async def get_embedding_stats():
+    """Số lượng embedding tham chiếu đang có trong RAM theo model"""
+    return embedding_store.get_stats()
+
+@router.get("/cache/stats", dependencies=[Depends(get_current_admin_user)])
+async def get_cache_stats():
+    """Tỉ lệ hit, số mục và dung lượng của cache landmark theo frame và cache kết quả chấm"""
+    return {"frames": frame_cache.get_stats(), "results": result_cache.get_stats()}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Metrics định dạng Prometheus: thời gian từng bước, thời gian request, hàng đợi và cache"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.post("/admin/profile", response_class=PlainTextResponse)
+async def profile_scoring(
+    requests: int = Query(10, ge=1, le=PROFILE_MAX_REQUESTS),
+    interval_ms: float = Query(PROFILE_INTERVAL_MS, gt=0),
+    timeout: float = Query(PROFILE_TIMEOUT_SECONDS, gt=0),
+    current_user: dict = Depends(get_current_admin_user)
 ):
     """
-    Xử lý video từ người dùng và so sánh với video mẫu
-    - frames: Danh sách các frame dạng base64
-    - lessonPath: Đường dẫn đến bài học cần so sánh
-    - modelId: ID của model cần sử dụng
+    Profile lấy mẫu stack trên `requests` request chấm điểm/nhận dạng tiếp theo (chờ tối đa timeout giây).
+    Trả về collapsed stack (flamegraph.pl, speedscope, ...). Chỉ tài khoản admin.
     """
-    frames = request.frames
-    lesson_path = request.lessonPath
-    model_id = request.modelId
+    try:
+        session = profiler.start(requests, interval_ms / 1000.0)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    profile = await run_in_threadpool(profiler.collect, session, timeout)
+    return PlainTextResponse(profile, headers={
+        "X-Profiled-Requests": str(session.completed),
+        "X-Profile-Samples": str(session.samples),
+    })
 
-    # Log authentication status
-    if current_user:
-        print(f"Processing video for authenticated user: {current_user['email']}")
+@router.post("/embeddings/reload")
+async def reload_embeddings(model_id: int = None, current_user: dict = Depends(get_current_admin_user)):
+    """Load lại embedding tham chiếu (sau khi thêm file .npy mới) mà không cần khởi động lại. Chỉ tài khoản admin."""
+    try:
+        if model_id is None:
+            embedding_store.load_all()
+        else:
+            embedding_store.reload(model_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return embedding_store.get_stats()
+
+def find_lesson_reference(model_id, lesson_path=None, video_id=None):
+    """Tìm bài học (theo videoId hoặc lessonPath) và embedding tham chiếu của nó"""
+    if video_id is not None:
+        lesson = lesson_index.find_by_video_id(video_id)
+        if lesson and lesson["modelId"] != model_id:
+            lesson = None
+    elif lesson_path:
+        lesson = lesson_index.find_by_path(model_id, lesson_path)
     else:
-        print("Processing video for unauthenticated user")
+        raise HTTPException(status_code=400, detail="Either lessonPath or videoId is required")
+
+    if not lesson:
+        print(f"No lesson found for path={lesson_path}, video_id={video_id} in model {model_id}")
+        raise HTTPException(status_code=400, detail="Lesson not found or embedding missing")
+
+    # Embedding tham chiếu đã được load sẵn vào RAM, không đọc file trong request.
+    # video_id ghi trong store (file hợp nhất / lúc đăng ký) được ưu tiên, sau đó tới đường dẫn trong roadmap
+    key = embedding_store.key_for_video(model_id, lesson["id"])
+    if key is not None:
+        reference_embedding = embedding_store.get(model_id, key)
+    else:
+        reference_embedding = embedding_store.get_by_path(model_id, lesson["embedding"])
+    if reference_embedding is None:
+        print(f"Embedding not loaded for lesson: {lesson['embedding']}")
+        raise HTTPException(status_code=400, detail="Embedding file not found")
 
-    print(f"Processing video request - Model ID: {model_id}, Lesson Path: {lesson_path}")
+    return lesson, reference_embedding
 
-    # Load model configuration cho model_id tương ứng
+def run_on_landmarker(work):
+    """
+    work(landmarker) trên một worker MediaPipe mượn cho cả chuỗi frame. Worker chết/lỗi giữa chừng thì
+    pool thay worker và chạy lại một lần trên worker mới; vẫn lỗi thì trả 503 để client thử lại sau.
+    """
     try:
-        model_service.load_config_and_model(model_id)
-        print(f"Loaded model configuration for model {model_id}")
+        return landmark_pool.run(work)
+    except LandmarkWorkerError as e:
+        print(f"Landmark worker unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail="Landmark worker unavailable",
+                            headers={"Retry-After": str(LANDMARK_RETRY_AFTER_SECONDS)})
+
+def extract_frame_into(encoded, decoder, imread_flag, out, landmark_options, landmarker):
+    """Decode một frame và ghi landmark vào out (một hàng của bộ đệm), frame đã gặp lấy từ frame_cache"""
+    key = frame_cache_key(frame_digest(encoded), imread_flag, landmark_options) if frame_cache.enabled else None
+    cached = frame_cache.get(key) if key is not None else None
+    if cached is not None:
+        out[...] = cached
+        return
+    frame_rgb = decoder(encoded, imread_flag)
+    landmarker.get_frame_landmarks(frame_rgb, out=out, **landmark_options)
+    if key is not None:
+        frame_cache.put(key, out.copy())
+
+def extract_window_landmarks(pending, window, imread_flag, landmark_options):
+    """
+    Landmark các frame WebSocket đang chờ (pending: deque (encoded, decoder)), ghi vào cửa sổ theo thứ tự.
+    Mượn một worker cho cả chuỗi frame như một request HTTP, để trạng thái tracking của MediaPipe
+    không bị trộn với phiên khác. Trả về lỗi của các frame không decode được (frame đó bị bỏ qua).
+    Frame chỉ rời pending sau khi xong, nên khi worker lỗi lần chạy lại tiếp tục từ frame đang dở.
+    """
+    errors = []
+
+    def work(landmarker):
+        while pending:
+            encoded, decoder = pending[0]
+            try:
+                extract_frame_into(encoded, decoder, imread_flag, window.next_slot(), landmark_options, landmarker)
+            except ValueError as e:
+                errors.append(str(e))
+            else:
+                window.commit()
+            pending.popleft()
+
+    run_on_landmarker(work)
+    return errors
+
+def get_model_service(model_id):
+    """Lấy model đã load sẵn từ registry (chỉ load từ đĩa ở lần đầu)"""
+    try:
+        return model_registry.get(model_id)
     except Exception as e:
         print(f"Error loading model configuration: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error loading model: {str(e)}")
 
-    # Tìm embedding path từ roadmap
-    roadmap = roadmap_service.get_roadmap()
-    print(f"Available chapters in roadmap: {list(roadmap.keys())}")
-    
-    reference_embedding_path = None
-    video_id = None
-    # Tìm bài học trong roadmap với model_id tương ứng
-    for chapter_key, chapter in roadmap.items():
-        chapter_model_id = int(chapter_key.split('-')[0])
-        print(f"Checking chapter {chapter_key} (model_id: {chapter_model_id})")
-        if chapter_model_id == model_id:
-            for lesson in chapter:
-                print(f"Checking lesson path: {lesson['path']} against {lesson_path}")
-                print(f"Lesson data: {lesson}")  # Print full lesson data
-                if lesson["path"] == lesson_path:
-                    reference_embedding_path = lesson["embedding"]
-                    video_id = lesson.get("id")  # Lấy video_id từ lesson
-                    print(f"Found embedding path: {reference_embedding_path}")
-                    print(f"Found video_id: {video_id}")  # Print video_id
-                    break
-            if reference_embedding_path:
-                break
+def resolve_scoring_target(model_id, lesson_path, video_id, current_user):
+    """Model và bài học cần chấm; kiểm tra trước khi làm các bước tốn CPU"""
+    # Log authentication status
+    if current_user:
+        print(f"Processing video for authenticated user: {current_user['email']}")
+    else:
+        print("Processing video for unauthenticated user")
 
-    if not reference_embedding_path:
-        print(f"No embedding path found for lesson {lesson_path} in model {model_id}")
-        raise HTTPException(status_code=400, detail="Lesson not found or embedding missing")
+    print(f"Processing video request - Model ID: {model_id}, Lesson Path: {lesson_path}, Video ID: {video_id}")
 
-    if not os.path.exists(reference_embedding_path):
-        print(f"Embedding file not found at path: {reference_embedding_path}")
-        raise HTTPException(status_code=400, detail="Embedding file not found")
+    model_service = get_model_service(model_id)
+    lesson, reference_embedding = find_lesson_reference(model_id, lesson_path, video_id)
+    return model_service, lesson, reference_embedding
 
-    # Xử lý frames từ client
-    user_landmarks = []
-    for frame_data in frames[:FRAMES_LIMIT]:
-        img_data = base64.b64decode(frame_data.split(',')[1])
-        nparr = np.frombuffer(img_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        landmarks = landmark_service.get_frame_landmarks(frame_rgb)
-        user_landmarks.append(landmarks)
-
-    # Tạo embedding từ video của người dùng
+def compare_to_reference(model_service, user_landmarks, reference_embedding):
+    """Similarity giữa chuỗi landmark của người dùng và embedding của video mẫu"""
     user_embedding = model_service.extract_embedding(user_landmarks)
-    reference_embedding = np.load(reference_embedding_path)
+    return model_service.calculate_similarity(user_embedding, reference_embedding)
+
+def score_landmarks(model_service, lesson, reference_embedding, user_landmarks, current_user, similarity=None,
+                    frames_scored=None):
+    """
+    Landmark -> embedding -> so sánh với video mẫu và lưu tiến trình
+    (similarity/frames_scored: đã chấm sẵn, ở checkpoint hoặc lấy từ result_cache)
+    """
+    video_id = lesson["id"]
+
+    if similarity is None:
+        # Tạo embedding từ video của người dùng và tính độ tương đồng
+        similarity = compare_to_reference(model_service, user_landmarks, reference_embedding)
+    if frames_scored is None:
+        frames_scored = len(user_landmarks)
 
-    # Tính độ tương đồng
-    similarity = model_service.calculate_similarity(user_embedding, reference_embedding)
-    
     # Lấy user_id từ current_user nếu có
     user_id = current_user["id"] if current_user else None
     print(f"Authentication status:")
     print(f"- Current user: {current_user}")
     print(f"- User ID: {user_id}")
     print(f"- Video ID: {video_id}")
-    
+
     status = model_service.get_similarity_status(similarity, user_id, video_id)
 
     print(f"Video processing complete - Similarity: {similarity}, Status: {status}")
-    return VideoResponse(similarity=float(similarity), status=status)
+    return VideoResponse(similarity=float(similarity), status=status, framesScored=frames_scored)
+
+def extract_frames_landmarks(model_service, encoded_frames, decoder, out, on_checkpoint=None, frame_digests=None):
+    """
+    Decode + landmark các frame của một request, ghi thẳng vào tensor đầu vào out (LandmarkTensor).
+    Frame đã gặp (frame_cache) không phải decode/landmark lại; frame_digests: hash đã tính sẵn.
+    """
+    # Xử lý frames từ client: decode (thread pool) chạy trước tầng landmark
+    imread_flag = imread_flag_for_scale(model_service.options["decode_scale"])
+
+    def work(landmarker):
+        # Chạy lại trên worker mới (worker cũ lỗi) thì ghi lại từ frame đầu
+        out.reset()
+        frame_pipeline.extract_landmarks(encoded_frames[:FRAMES_LIMIT], landmarker,
+                                         decoder=decoder, imread_flag=imread_flag, out=out,
+                                         landmark_options=model_service.landmark_options,
+                                         detector_stride=model_service.detector_stride,
+                                         on_checkpoint=on_checkpoint,
+                                         frame_cache=frame_cache, frame_digests=frame_digests)
+
+    try:
+        # Mượn một worker MediaPipe cho cả chuỗi frame của request
+        run_on_landmarker(work)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(out) == 0:
+        raise HTTPException(status_code=400, detail="No frames received")
+    return out
+
+def score_frames(model_id, lesson_path, video_id, encoded_frames, decoder, current_user):
+    """Phần chung của các endpoint nhận ảnh: decode + landmark rồi chấm điểm"""
+    with RequestMetrics("score", model_id) as request, \
+            RequestTrace("score", model_id=model_id, frames=len(encoded_frames)):
+        with span("resolve_target"):
+            model_service, lesson, reference_embedding = resolve_scoring_target(
+                model_id, lesson_path, video_id, current_user)
+        encoded_frames = encoded_frames[:FRAMES_LIMIT]
+
+        def compute():
+            policy = model_service.early_exit
+            scorer = CheckpointScorer(model_service, reference_embedding, policy) if policy else None
+            # Một tensor (1, *target_shape) dùng lại giữa các request cho cả landmark và inference
+            with model_service.input_buffers.acquire() as user_landmarks:
+                with span("extract_landmarks"):
+                    extract_frames_landmarks(model_service, encoded_frames, decoder, user_landmarks,
+                                             on_checkpoint=scorer, frame_digests=digests)
+                if scorer is not None and scorer.frames is not None:
+                    print(f"Early exit after {scorer.frames} frames")
+                    return scorer.similarity, scorer.frames
+                with span("compare_to_reference"):
+                    similarity = compare_to_reference(model_service, user_landmarks, reference_embedding)
+                return similarity, len(user_landmarks)
+
+        # Cùng model, cùng bài và cùng các frame (vd. client gửi lại khi mạng lỗi) thì dùng lại kết quả chấm;
+        # tiến trình vẫn được ghi ở score_landmarks
+        with span("hash_frames"):
+            digests = [frame_digest(encoded) for encoded in encoded_frames] if result_cache.enabled else None
+        if digests is None:
+            similarity, frames_scored = compute()
+        else:
+            key = request_digest(model_service.cache_version, lesson["id"], reference_embedding, digests)
+            similarity, frames_scored = result_cache.get_or_compute(key, compute)
+        request.frames = frames_scored
+        with span("record_result"):
+            return score_landmarks(model_service, lesson, reference_embedding, None, current_user,
+                                   similarity=similarity, frames_scored=frames_scored)
+
+@router.post("/process-video", response_model=VideoResponse)
+async def process_video(
+    request: VideoProcessRequest,
+    x_deadline_ms: Optional[int] = Header(None),
+    current_user: dict = Depends(get_current_user_optional)  # Make authentication optional
+):
+    """
+    Xử lý video từ người dùng và so sánh với video mẫu
+    - frames: Danh sách các frame dạng base64
+    - lessonPath: Đường dẫn đến bài học cần so sánh
+    - videoId: ID của video mẫu (thay cho lessonPath, không cần so khớp đường dẫn)
+    - modelId: ID của model cần sử dụng
+    - X-Deadline-Ms (header, tuỳ chọn): thời gian tối đa client chờ, quá hạn thì trả 503 sớm
+    """
+    # Chạy ngoài event loop để các request khác không bị chặn trong lúc chờ MediaPipe
+    async with scoring_queue.slot(x_deadline_ms):
+        return await run_in_threadpool(score_frames, request.modelId, request.lessonPath, request.videoId,
+                                       request.frames, decode_base64_frame, current_user)
+
+@router.post("/process-video-binary", response_model=VideoResponse)
+async def process_video_binary(
+    request: Request,
+    x_model_id: int = Header(...),
+    x_lesson_path: Optional[str] = Header(None),
+    x_video_id: Optional[int] = Header(None),
+    x_deadline_ms: Optional[int] = Header(None),
+    current_user: dict = Depends(get_current_user_optional)
+):
+    """
+    Giống /process-video nhưng nhận frame JPEG/WebP dạng nhị phân thay vì base64 trong JSON
+    - Body: lặp lại [độ dài 4 byte big-endian][bytes ảnh] cho mỗi frame
+    - X-Model-Id: ID của model cần sử dụng
+    - X-Lesson-Path: Đường dẫn bài học (URL-encoded), hoặc X-Video-Id
+    """
+    body = await request.body()
+    try:
+        frames = split_length_prefixed_frames(body, FRAMES_LIMIT)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    lesson_path = unquote(x_lesson_path) if x_lesson_path else None
+    async with scoring_queue.slot(x_deadline_ms):
+        return await run_in_threadpool(score_frames, x_model_id, lesson_path, x_video_id,
+                                       frames, decode_image, current_user)
+
+def recognize_frames(model_id, encoded_frames, top_k, include_below_threshold):
+    with RequestMetrics("recognize", model_id) as request, \
+            RequestTrace("recognize", model_id=model_id, top_k=top_k):
+        model_service = get_model_service(model_id)
+        with model_service.input_buffers.acquire() as user_landmarks:
+            with span("extract_landmarks"):
+                extract_frames_landmarks(model_service, encoded_frames, decode_base64_frame, user_landmarks)
+            user_embedding = model_service.extract_embedding(user_landmarks)
+            request.frames = len(user_landmarks)
+        with span("search"):
+            matches = recognition_service.recognize(model_service, user_embedding, top_k, include_below_threshold)
+        return RecognizeResponse(matches=matches)
+
+@router.post("/recognize", response_model=RecognizeResponse)
+async def recognize(request: RecognizeRequest, x_deadline_ms: Optional[int] = Header(None)):
+    """
+    Nhận dạng ký hiệu người dùng vừa làm ("đây là ký hiệu gì?")
+    - frames: Danh sách các frame dạng base64
+    - modelId: ID của model cần sử dụng
+    - topK: số ký hiệu giống nhất trả về (mặc định chỉ những ký hiệu vượt threshold của model)
+    """
+    if not 1 <= request.topK <= RECOGNIZE_MAX_TOP_K:
+        raise HTTPException(status_code=400, detail=f"topK must be between 1 and {RECOGNIZE_MAX_TOP_K}")
+    async with scoring_queue.slot(x_deadline_ms):
+        return await run_in_threadpool(recognize_frames, request.modelId, request.frames,
+                                       request.topK, request.includeBelowThreshold)
+
+def score_landmark_body(model_id, lesson_path, video_id, body, dtype, shape, layout, current_user):
+    """Chấm điểm tensor landmark client gửi lên (chạy trong threadpool, sau khi đã được nhận vào hàng đợi)"""
+    model_service, lesson, reference_embedding = resolve_scoring_target(model_id, lesson_path, video_id, current_user)
+    try:
+        user_landmarks = parse_landmark_tensor(body, dtype, shape, layout, model_service.config['target_shape'])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return score_landmarks(model_service, lesson, reference_embedding, user_landmarks, current_user)
+
+@router.get("/landmark-layout/{model_id}")
+async def get_landmark_layout(model_id: int):
+    """Layout tensor landmark mà /process-landmarks chấp nhận cho model này"""
+    model_service = get_model_service(model_id)
+    return describe_layout(model_service.config['target_shape'])
+
+@router.post("/process-landmarks", response_model=VideoResponse)
+async def process_landmarks(
+    request: Request,
+    x_model_id: int = Header(...),
+    x_landmark_dtype: str = Header(...),
+    x_landmark_shape: str = Header(...),
+    x_landmark_layout: str = Header(...),
+    x_lesson_path: Optional[str] = Header(None),
+    x_video_id: Optional[int] = Header(None),
+    x_deadline_ms: Optional[int] = Header(None),
+    current_user: dict = Depends(get_current_user_optional)
+):
+    """
+    Chấm điểm từ landmark do client tự tính (MediaPipe trên trình duyệt), bỏ qua MediaPipe trên server
+    - Body: mảng float16/float32 liên tục, shape (frames, điểm, 3) theo layout của /landmark-layout
+    - X-Landmark-Dtype: float16 hoặc float32
+    - X-Landmark-Shape: vd. "60,100,3"; số frame tối đa là max_frames của /landmark-layout, vượt quá thì 400
+    - X-Landmark-Layout: phải trùng layout của server (vd. "hand:21x2,pose:6,face:52")
+    """
+    lesson_path = unquote(x_lesson_path) if x_lesson_path else None
+    body = await request.body()
+
+    # Tìm model/bài học (có thể load model, truy vấn DB) cũng nằm trong slot, không chạy trên event loop
+    async with scoring_queue.slot(x_deadline_ms):
+        return await run_in_threadpool(score_landmark_body, x_model_id, lesson_path, x_video_id, body,
+                                       x_landmark_dtype, x_landmark_shape, x_landmark_layout, current_user)
+
+@router.websocket("/ws/practice")
+async def practice_stream(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None)
+):
+    """
+    Luyện tập dạng streaming theo cửa sổ trượt FRAMES_LIMIT frame
+    - Tin nhắn đầu tiên (JSON): {"modelId": 1, "lessonPath": "..."} hoặc {"modelId": 1, "videoId": 12}
+    - Sau đó: mỗi tin nhắn nhị phân là một frame JPEG/WebP (hoặc text là data URL base64)
+    - {"action": "score"} để chấm ngay, {"action": "reset"} để xoá cửa sổ frame
+    Frame nhận được được giữ lại; khi đủ FRAMES_LIMIT frame mới (hoặc client yêu cầu) thì decode + landmark
+    các frame đó và chấm điểm trong cùng một slot của scoring_queue, như một request HTTP.
+    """
+    await websocket.accept()
+    # Session DB chỉ dùng để xác thực rồi đóng ngay, không giữ connection suốt phiên WebSocket
+    db = SessionLocal()
+    try:
+        current_user = await get_current_user_optional(f"Bearer {token}" if token else None, db)
+    finally:
+        db.close()
+
+    try:
+        setup = await websocket.receive_json()
+        model_service, lesson, reference_embedding = await run_in_threadpool(
+            resolve_scoring_target, int(setup["modelId"]), setup.get("lessonPath"), setup.get("videoId"),
+            current_user)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close()
+        return
+    except (KeyError, ValueError, TypeError):
+        await websocket.send_json({"type": "error", "detail": "First message must contain modelId and lessonPath or videoId"})
+        await websocket.close()
+        return
+
+    imread_flag = imread_flag_for_scale(model_service.options["decode_scale"])
+    bind_model_id(model_service.model_id)
+    window = LandmarkRingBuffer(FRAMES_LIMIT)
+    # Frame chưa tính landmark; quá một cửa sổ thì frame cũ nhất bị bỏ (cửa sổ cũng chỉ giữ chừng đó)
+    pending = deque(maxlen=FRAMES_LIMIT)
+    await websocket.send_json({"type": "ready", "videoId": lesson["id"], "window": FRAMES_LIMIT})
+
+    async def send_score():
+        # Bị từ chối (429/503) thì frame vẫn được giữ và cửa sổ được chấm lại ở frame sau
+        result = None
+        try:
+            async with scoring_queue.slot():
+                errors = await run_in_threadpool(extract_window_landmarks, pending, window, imread_flag,
+                                                 model_service.landmark_options)
+                if len(window):
+                    result = await run_in_threadpool(score_landmarks, model_service, lesson, reference_embedding,
+                                                     window.ordered(), current_user)
+        except HTTPException as e:
+            await websocket.send_json({"type": "error", "detail": e.detail, "status": e.status_code})
+            return
+        for error in errors:
+            await websocket.send_json({"type": "error", "detail": error})
+        if result is None:
+            await websocket.send_json({"type": "error", "detail": "No frames received"})
+            return
+        window.mark_scored()
+        await websocket.send_json({"type": "result", "frames": len(window), **result.dict()})
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes") is not None:
+                encoded, decoder = message["bytes"], decode_image
+            else:
+                text = message.get("text") or ""
+                if text.startswith("data:"):
+                    encoded, decoder = text, decode_base64_frame
+                else:
+                    try:
+                        action = json.loads(text).get("action")
+                    except (json.JSONDecodeError, AttributeError):
+                        await websocket.send_json({"type": "error", "detail": "Invalid control message"})
+                        continue
+                    if action == "score":
+                        if len(window) == 0 and not pending:
+                            await websocket.send_json({"type": "error", "detail": "No frames received"})
+                        else:
+                            await send_score()
+                    elif action == "reset":
+                        window.clear()
+                        pending.clear()
+                    continue
+
+            pending.append((encoded, decoder))
+            if window.since_score + len(pending) >= window.capacity:
+                await send_score()
+    except WebSocketDisconnect:
+        pass
 
 # Thêm route mới để điều hướng
 # @router.get("/dictionary")
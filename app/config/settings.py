@@ -3,6 +3,97 @@ import os
 # Cấu hình cơ bản
 FRAMES_LIMIT = 60
 
+# Cấu hình model registry
+MODEL_CACHE_MAX_MB = 2048  # Ngân sách bộ nhớ cho các model đang được giữ trong RAM
+PRELOAD_MODEL_IDS = [1]  # Model được load sẵn khi khởi động
+
+# Ánh xạ model_id -> thư mục video mẫu và embedding tham chiếu
+MODEL_DIRS = {
+    1: {
+        "video_dir": "Family_video2",
+        "embedding_dir": "Family/reference_embedding2",
+    },
+    2: {
+        "video_dir": "Color_video2",
+        "embedding_dir": "Color_model/reference_embedding2",
+    }
+    # Thêm model khác nếu cần
+}
+
+# Tuỳ chọn runtime theo model, model không khai báo thì dùng DEFAULT_MODEL_OPTIONS
+DEFAULT_MODEL_OPTIONS = {
+    "decode_scale": 1,  # 1 = độ phân giải gốc, 2/4/8 = decode JPEG ở 1/2, 1/4, 1/8 kích thước
+    "batching": True,  # Gom batch inference giữa các request đồng thời
+    "inference_backend": "function",  # keras | direct | function | xla | tflite
+    "quantized_variant": None,  # int8 | float16 | int8-calibrated, chỉ bật khi đã qua kiểm tra độ chính xác
+    "similarity_metric": "cosine",  # cosine | l2
+    "threshold": None,  # Ghi đè threshold trong bảng models (cần khi đổi metric)
+    "landmark_detection": "full",  # full = hands/pose/face trên cả frame, roi = pose độ phân giải thấp rồi cắt vùng tay/mặt
+    "detector_stride": {"hands": 1, "pose": 1, "face": 1},  # Chạy mỗi detector 1 lần trên N frame, frame bỏ qua được nội suy
+    "early_exit": None,  # {"checkpoints": [{"frames": 30, "accept_margin": .., "reject_margin": ..}]}, xem tools/tune_early_exit.py
+    "embedding_store_version": "latest",  # Version file embedding hợp nhất: "latest", số cụ thể, None = đọc từng file .npy
+}
+MODEL_OPTIONS = {
+    # vd. 1: {"decode_scale": 2} nếu độ chính xác landmark của model cho phép decode ở 1/2 kích thước
+}
+
+# Cấu hình pipeline decode frame
+DECODE_WORKERS = 4
+DECODE_QUEUE_SIZE = 8  # Số frame tối đa được decode trước tầng landmark
+
+# Cấu hình pool process MediaPipe
+LANDMARK_WORKERS = 4  # Số process landmark, 0 = chạy MediaPipe ngay trong process API
+LANDMARK_WARMUP_FRAMES = 2  # Số frame chạy thử khi worker khởi động
+LANDMARK_RETRY_AFTER_SECONDS = 5  # Retry-After của lỗi 503 khi worker MediaPipe lỗi cả sau khi đã thay
+LANDMARK_FRAME_BYTES = 1920 * 1080 * 3  # Kích thước ban đầu của shared memory cho frame RGB (frame lớn hơn thì cấp lại)
+
+# Cấu hình hàng đợi chấm điểm (admission control)
+SCORING_CONCURRENCY = LANDMARK_WORKERS or 1  # Số request được landmark/inference cùng lúc
+SCORING_MAX_QUEUE = 32  # Số request tối đa được phép chờ, vượt quá trả 429
+SCORING_DEADLINE_MS = 10000  # Deadline mặc định nếu client không gửi header X-Deadline-Ms
+
+# Cấu hình gom batch inference giữa các request đồng thời
+INFERENCE_MAX_BATCH = 16  # Số tensor tối đa trong một lần predict
+INFERENCE_MAX_WAIT_MS = 5  # Thời gian tối đa phần tử đầu tiên chờ gom batch
+INPUT_BUFFER_POOL_SIZE = SCORING_CONCURRENCY * 2  # Số tensor đầu vào (1, *target_shape) rảnh được giữ lại mỗi model
+
+# Cấu hình TFLite
+TFLITE_NUM_THREADS = 2  # Số thread mỗi interpreter (XNNPACK)
+
+# Cấu hình nhận dạng ký hiệu (/recognize)
+RECOGNIZE_MAX_TOP_K = 20
+
+# Cấu hình embedding tham chiếu
+EMBEDDING_SUFFIX = "_embedding.npy"
+EMBEDDING_WATCH_INTERVAL = 30  # Giây giữa hai lần kiểm tra thư mục embedding, 0 để tắt
+EMBEDDING_STORE_FILE = "embeddings-v{version}.emb"  # File hợp nhất (tools/build_embedding_store.py), nằm trong thư mục embedding
+EMBEDDING_SCORE_CHUNK_ROWS = 4096  # Số hàng giải lượng tử mỗi lần khi chấm điểm trên file float16/int8
+
+# Cấu hình cache theo nội dung (0 để tắt)
+FRAME_CACHE_MAX_MB = 64  # Mức 1: hash frame -> landmark, frame trùng không phải chạy lại decode/MediaPipe
+FRAME_CACHE_TTL = 600  # Giây
+RESULT_CACHE_MAX_MB = 4  # Mức 2: hash (model, bài học, các frame) -> kết quả chấm, cho request gửi lại
+RESULT_CACHE_TTL = 300  # Giây
+
+# Cấu hình metrics Prometheus (GET /api/metrics)
+METRICS_STAGE_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]  # Giây, từng bước
+METRICS_REQUEST_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0]  # Giây, cả request
+METRICS_FRAME_BUCKETS = [15, 30, 45, FRAMES_LIMIT]  # Nhãn frames (số frame mỗi request) của histogram request
+
+# Cấu hình chỉ mục láng giềng gần đúng (IVF) cho tập embedding lớn
+ANN_MIN_VECTORS = 1000  # Ít hơn số này thì so sánh toàn bộ (brute force) đã đủ nhanh
+ANN_NPROBE = 8  # Số cụm được quét mỗi lần tìm kiếm
+ANN_INDEX_FILE = "ann_index.npz"  # Lưu cạnh các file embedding
+
+# Cấu hình chế độ phát hiện theo vùng (options["landmark_detection"] = "roi")
+ROI_MIN_FRAME_SIDE = 480  # Frame có cạnh dài không quá mức này thì vẫn chạy cả ba graph trên toàn frame
+ROI_POSE_WIDTH = 256  # Chiều rộng frame thu nhỏ cho lượt pose tìm cổ tay và đầu
+ROI_MIN_VISIBILITY = 0.5  # Điểm pose có visibility thấp hơn không được dùng để dựng vùng
+ROI_HAND_MARGIN = 0.6  # Nới vùng tay mỗi phía, tính theo độ rộng vai
+ROI_FACE_MARGIN = 0.35  # Nới vùng mặt mỗi phía, tính theo độ rộng vai
+ROI_HAND_SIZE = 640  # Cạnh dài tối đa của vùng tay (chứa cả hai tay) đưa vào Hands, lớn hơn thì thu nhỏ
+ROI_FACE_SIZE = 256  # Cạnh dài tối đa của vùng mặt đưa vào FaceMesh
+
 # Cấu hình MediaPipe
 FILTERED_HAND = list(range(21))
 FILTERED_POSE = [11, 12, 13, 14, 15, 16]
@@ -21,4 +112,14 @@ DB_CONFIG = {
 
 # Cấu hình thư mục
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-PUBLIC_DIR = os.path.join(BASE_DIR, "public") 
\ No newline at end of file
+PUBLIC_DIR = os.path.join(BASE_DIR, "public")
+
+# Cấu hình tracing request chậm và profiler lấy mẫu (POST /api/admin/profile)
+SLOW_REQUEST_MS = 2000  # Request lâu hơn ngưỡng này được ghi cả danh sách span ra file (0 để tắt)
+SLOW_REQUEST_LOG_FILE = os.path.join(BASE_DIR, "logs", "slow_requests.log")
+SLOW_REQUEST_LOG_MAX_BYTES = 10 * 1024 * 1024  # Mỗi file, quá thì xoay vòng
+SLOW_REQUEST_LOG_BACKUPS = 5
+TRACE_MAX_SPANS = 2000  # Số span tối đa giữ cho một request (mỗi frame có vài span decode/MediaPipe)
+PROFILE_INTERVAL_MS = 5  # Khoảng cách giữa hai lần lấy mẫu stack
+PROFILE_MAX_REQUESTS = 100
+PROFILE_TIMEOUT_SECONDS = 300  # Chờ tối đa bấy nhiêu giây để đủ số request cần profile 
\ No newline at end of file
@@ -59,6 +59,13 @@ def get_current_active_user(
 ):
     return current_user 
 
+def get_current_admin_user(
+    current_user = Depends(get_current_active_user),
+):
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return current_user
+
 async def get_current_user_optional(
     authorization: str = Header(None),
     db: Session = Depends(get_db)
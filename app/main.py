@@ -8,6 +8,11 @@ import os
 from app.models.flashcard import Course, Quiz  # Import Course và Quiz sau
 from app.api.routes import router
 from app.api.endpoints import flashcard, auth
+from app.services.model_registry import model_registry
+from app.services.embedding_store import embedding_store
+from app.services.frame_pipeline import frame_pipeline
+from app.services.landmark_pool import landmark_pool
+from app.config.settings import PRELOAD_MODEL_IDS
 
 app = FastAPI()
 
@@ -32,6 +37,32 @@ app.add_middleware(
     max_age=3600,
 )
 
+@app.on_event("startup")
+async def preload_models():
+    # Load sẵn các model hay dùng để request đầu tiên không phải chờ load_model()
+    for model_id in PRELOAD_MODEL_IDS:
+        try:
+            model_registry.get(model_id)
+        except Exception as e:
+            print(f"Could not preload model {model_id}: {str(e)}")
+
+@app.on_event("startup")
+async def preload_embeddings():
+    # Đưa toàn bộ embedding tham chiếu vào RAM và theo dõi thư mục để nhận file mới
+    embedding_store.load_all()
+    embedding_store.start_watcher()
+
+@app.on_event("startup")
+async def start_landmark_workers():
+    # Khởi động và warm-up các process MediaPipe trước khi nhận request
+    landmark_pool.start()
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    embedding_store.stop_watcher()
+    frame_pipeline.shutdown()
+    landmark_pool.shutdown()
+
 # Add middleware to log all requests
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
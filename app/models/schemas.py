@@ -1,11 +1,30 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class VideoProcessRequest(BaseModel):
     frames: List[str]
-    lessonPath: str
+    lessonPath: Optional[str] = None
+    videoId: Optional[int] = None  # Có thể gửi videoId thay cho lessonPath
     modelId: int
 
 class VideoResponse(BaseModel):
     similarity: float
-    status: str 
\ No newline at end of file
+    status: str
+    framesScored: Optional[int] = None  # Số frame đã dùng để chấm (ít hơn số frame gửi lên khi dừng sớm)
+
+class RecognizeRequest(BaseModel):
+    frames: List[str]
+    modelId: int
+    topK: int = 5
+    includeBelowThreshold: bool = False  # Trả cả các ký hiệu dưới threshold
+
+class RecognizedSign(BaseModel):
+    name: str
+    similarity: float
+    isMatch: bool
+    videoId: Optional[int] = None
+    path: Optional[str] = None
+    vocabulary: Optional[dict] = None
+
+class RecognizeResponse(BaseModel):
+    matches: List[RecognizedSign] 
\ No newline at end of file
@@ -0,0 +1,118 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from app.config.settings import SCORING_CONCURRENCY, SCORING_MAX_QUEUE, SCORING_DEADLINE_MS
+from app.services.metrics import registry
+
+
+class ScoringQueue:
+    """
+    Hàng đợi có giới hạn trước đường chấm điểm (landmark + inference).
+    - Tối đa `concurrency` request chạy cùng lúc, tối đa `max_queue` request chờ
+    - Request bị từ chối sớm (429/503 + Retry-After) nếu thời gian chờ dự kiến vượt deadline của nó
+    """
+
+    def __init__(self, concurrency=SCORING_CONCURRENCY, max_queue=SCORING_MAX_QUEUE,
+                 default_deadline_ms=SCORING_DEADLINE_MS):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.default_deadline_ms = default_deadline_ms
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.waiting = 0
+        self.active = 0
+        self.avg_service_time = 1.0  # Giây, trung bình trượt (EWMA) thời gian xử lý một request
+        self.avg_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self._stats = {
+            "admitted": 0,
+            "completed": 0,
+            "rejected_queue_full": 0,
+            "rejected_deadline": 0,
+            "timed_out": 0,
+        }
+
+    def expected_wait(self):
+        """Thời gian chờ dự kiến (giây) cho một request mới vào hàng đợi"""
+        if self.active < self.concurrency and self.waiting == 0:
+            return 0.0
+        rounds = (self.waiting // self.concurrency) + 1
+        return rounds * self.avg_service_time
+
+    @asynccontextmanager
+    async def slot(self, deadline_ms=None):
+        budget = (deadline_ms or self.default_deadline_ms) / 1000.0
+
+        if self.waiting >= self.max_queue:
+            self._stats["rejected_queue_full"] += 1
+            raise self._reject(429, "Scoring queue is full")
+
+        expected = self.expected_wait()
+        if expected + self.avg_service_time > budget:
+            self._stats["rejected_deadline"] += 1
+            raise self._reject(503, "Expected wait exceeds request deadline", expected)
+
+        start = time.monotonic()
+        if self._semaphore.locked():
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(),
+                                       timeout=max(budget - self.avg_service_time, 0.001))
+            except asyncio.TimeoutError:
+                self._stats["timed_out"] += 1
+                raise self._reject(503, "Request deadline expired while queued")
+            finally:
+                self.waiting -= 1
+        else:
+            # Còn chỗ trống: acquire() trả về ngay, không phải chờ
+            await self._semaphore.acquire()
+
+        waited = time.monotonic() - start
+        self.avg_wait_time = 0.9 * self.avg_wait_time + 0.1 * waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+        self._stats["admitted"] += 1
+
+        self.active += 1
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            self._stats["completed"] += 1
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * (time.monotonic() - started)
+
+    def get_stats(self):
+        return {
+            **self._stats,
+            "queue_depth": self.waiting,
+            "active": self.active,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "expected_wait_seconds": self.expected_wait(),
+            "avg_wait_seconds": self.avg_wait_time,
+            "max_wait_seconds": self.max_wait_time,
+            "avg_service_seconds": self.avg_service_time,
+        }
+
+    def _reject(self, status_code, detail, retry_after=None):
+        retry_after = retry_after if retry_after is not None else self.expected_wait() or self.avg_service_time
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+scoring_queue = ScoringQueue()
+
+ADMISSION_OUTCOMES = ("admitted", "completed", "rejected_queue_full", "rejected_deadline", "timed_out")
+
+registry.gauge("hearme_scoring_queue_depth", "Số request đang chờ chỗ trong hàng đợi chấm điểm",
+               lambda: [((), scoring_queue.waiting)])
+registry.gauge("hearme_scoring_active", "Số request đang được chấm",
+               lambda: [((), scoring_queue.active)])
+registry.gauge("hearme_scoring_requests_total", "Số request theo kết quả admission",
+               lambda: [((outcome,), scoring_queue.get_stats()[outcome]) for outcome in ADMISSION_OUTCOMES],
+               ("outcome",), kind="counter")
@@ -0,0 +1,161 @@
+import os
+import numpy as np
+from app.services.similarity import normalize
+
+
+class IVFIndex:
+    """
+    Chỉ mục láng giềng gần đúng kiểu IVF (inverted file) bằng NumPy cho embedding đã chuẩn hoá L2.
+    - Build: spherical k-means chia vector vào nlist cụm
+    - Search: chỉ chấm điểm chính xác các vector trong nprobe cụm gần query nhất
+    - add(): chèn thêm vector mới vào cụm gần nhất, không cần build lại
+    """
+
+    def __init__(self, centroids, nprobe=8):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.dim = self.centroids.shape[1]
+        self.nprobe = nprobe
+        self.keys = []
+        self.rows = {}
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._lists = [[] for _ in range(len(self.centroids))]
+        self._list_arrays = None
+        self.built_size = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @property
+    def vectors(self):
+        return self._vectors[:len(self.keys)]
+
+    @classmethod
+    def build(cls, keys, vectors, nlist=None, nprobe=8, iterations=10, seed=0):
+        vectors = normalize(vectors)
+        if nlist is None:
+            nlist = max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+
+        # Spherical k-means: tâm cụm là trung bình đã chuẩn hoá, gán theo cosine lớn nhất
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = vectors[assignments == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+                else:
+                    # Cụm rỗng: lấy lại một vector ngẫu nhiên làm tâm
+                    centroids[c] = vectors[rng.integers(len(vectors))]
+            centroids = normalize(centroids)
+
+        index = cls(centroids, nprobe)
+        index.add_many(keys, vectors, normalized=True)
+        index.built_size = len(index)
+        return index
+
+    def copy(self):
+        """Bản sao độc lập: chèn thêm vào bản sao rồi thay tham chiếu, không sửa index đang được tìm kiếm"""
+        index = IVFIndex(self.centroids, self.nprobe)
+        index.keys = list(self.keys)
+        index.rows = dict(self.rows)
+        index._vectors = self._vectors.copy()
+        index._assignments = self._assignments.copy()
+        index._lists = [list(rows) for rows in self._lists]
+        index.built_size = self.built_size
+        return index
+
+    def add(self, key, vector):
+        self.add_many([key], vector, normalized=False)
+
+    def add_many(self, keys, vectors, normalized=False):
+        vectors = vectors if normalized else normalize(vectors)
+        assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+        for key, vector, cluster in zip(keys, vectors, assignments):
+            row = self.rows.get(key)
+            if row is not None:
+                # Key đã có: thay vector và chuyển sang cụm mới nếu cần
+                self._lists[self._assignments[row]].remove(row)
+            else:
+                row = len(self.keys)
+                self._reserve(row + 1)
+                self.keys.append(key)
+                self.rows[key] = row
+            self._vectors[row] = vector
+            self._assignments[row] = cluster
+            self._lists[cluster].append(row)
+        self._list_arrays = None
+
+    def search(self, query, k, nprobe=None):
+        """Trả về (row ids, cosine) của tối đa k vector gần query nhất, sắp giảm dần"""
+        query = normalize(query)[0]
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        if self._list_arrays is None:
+            self._list_arrays = [np.asarray(rows, dtype=np.int64) for rows in self._lists]
+
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        candidates = np.concatenate([self._list_arrays[c] for c in probes])
+        if len(candidates) == 0:
+            return candidates, np.zeros(0, dtype=np.float32)
+
+        scores = self._vectors[candidates] @ query
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top]
+
+    def needs_rebuild(self, max_growth=2.0):
+        """Chèn thêm quá nhiều so với lúc build thì các cụm bị lệch, nên build lại"""
+        return len(self) > max(self.built_size, 1) * max_growth
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            vectors=self.vectors,
+            assignments=self._assignments[:len(self.keys)],
+            keys=np.array(self.keys),
+            meta=np.array([self.nprobe, self.built_size]),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            nprobe, built_size = (int(x) for x in data["meta"])
+            index = cls(data["centroids"], nprobe)
+            keys = [str(key) for key in data["keys"]]
+            vectors = data["vectors"]
+            assignments = data["assignments"]
+        index._reserve(len(keys))
+        for row, (key, cluster) in enumerate(zip(keys, assignments)):
+            index.keys.append(key)
+            index.rows[key] = row
+            index._lists[cluster].append(row)
+        index._vectors[:len(keys)] = vectors
+        index._assignments[:len(keys)] = assignments
+        index.built_size = built_size
+        return index
+
+    def _reserve(self, size):
+        capacity = len(self._vectors)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 64)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:len(self.keys)] = self._vectors[:len(self.keys)]
+        assignments = np.zeros(capacity, dtype=np.int32)
+        assignments[:len(self.keys)] = self._assignments[:len(self.keys)]
+        self._vectors = vectors
+        self._assignments = assignments
@@ -0,0 +1,65 @@
+class EarlyExitPolicy:
+    """
+    Chấm điểm sớm tại các checkpoint (số frame đã landmark). Tại mỗi checkpoint, chuỗi đang dở
+    (phần còn lại = 0 như khi pad) được embed và so với video mẫu; dừng nếu similarity chắc chắn
+    trên threshold (>= threshold + accept_margin) hoặc chắc chắn dưới (<= threshold - reject_margin).
+    Margin được chọn offline bằng tools/tune_early_exit.py.
+    """
+
+    def __init__(self, checkpoints):
+        # [(frames, accept_margin, reject_margin)] theo thứ tự số frame tăng dần
+        self.checkpoints = sorted(checkpoints)
+        self.margins = {frames: (accept, reject) for frames, accept, reject in self.checkpoints}
+
+    @classmethod
+    def from_options(cls, options):
+        """options["early_exit"] = {"checkpoints": [{"frames": 30, "accept_margin": .., "reject_margin": ..}]}"""
+        config = options.get("early_exit")
+        if not config or not config.get("checkpoints"):
+            return None
+        return cls([
+            (int(item["frames"]), float(item["accept_margin"]), float(item["reject_margin"]))
+            for item in config["checkpoints"]
+        ])
+
+    @property
+    def frames(self):
+        return [frames for frames, _, _ in self.checkpoints]
+
+    def decide(self, frames, similarity, threshold):
+        """True/False nếu đã chắc chắn Match/Not Match ở checkpoint này, None nếu phải xem thêm frame"""
+        margins = self.margins.get(frames)
+        if margins is None:
+            return None
+        accept_margin, reject_margin = margins
+        if similarity >= threshold + accept_margin:
+            return True
+        if similarity <= threshold - reject_margin:
+            return False
+        return None
+
+
+class CheckpointScorer:
+    """Chấm điểm từng checkpoint của một request; truyền vào FramePipeline.extract_landmarks làm on_checkpoint"""
+
+    def __init__(self, model_service, reference_embedding, policy):
+        self.model_service = model_service
+        self.reference_embedding = reference_embedding
+        self.policy = policy
+        self.similarity = None
+        self.frames = None  # Số frame tại checkpoint đã dừng, None nếu chạy hết chuỗi
+
+    @property
+    def checkpoints(self):
+        return self.policy.frames
+
+    def __call__(self, landmarks):
+        """landmarks: LandmarkTensor đang được ghi; True nếu có thể dừng landmark ở đây"""
+        frames = len(landmarks)
+        user_embedding = self.model_service.extract_embedding(landmarks)
+        similarity = self.model_service.calculate_similarity(user_embedding, self.reference_embedding)
+        if self.policy.decide(frames, similarity, self.model_service.threshold) is None:
+            return False
+        self.similarity = similarity
+        self.frames = frames
+        return True
@@ -0,0 +1,146 @@
+"""
+File embedding hợp nhất của một model: thay cho hàng nghìn file <video>_embedding.npy nhỏ.
+
+Bố cục (little-endian):
+    header   HEADER (magic, phiên bản định dạng, dtype, số vector, dim, version model, offset các phần)
+    vectors  count x dim (float32 | float16 | int8), căn lề ALIGNMENT byte
+    scales   count float32: vector gốc ~= vectors[i] * scales[i] (float32/float16 luôn là 1.0)
+    index    JSON utf-8: {"keys": [...], "video_ids": [...], ...metadata}
+
+Vector được chuẩn hoá L2 trước khi lưu (cả cosine và l2 đều chuẩn hoá trước khi so sánh nên không
+mất thông tin). File được mở bằng một lần mmap chỉ đọc, vectors/scales là view trên mmap nên không có
+bản sao nào; các worker process cùng map một file sẽ dùng chung page cache của hệ điều hành.
+"""
+import json
+import mmap
+import os
+import re
+import struct
+import numpy as np
+from app.config.settings import EMBEDDING_STORE_FILE
+from app.services.similarity import normalize
+
+MAGIC = b"HMEMB\x00\x00\x00"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+# magic, format, dtype, count, dim, model_version, vectors/scales/index offset, index length
+HEADER = struct.Struct("<8sHBxIIIQQQQ")
+DTYPES = {"float32": 0, "float16": 1, "int8": 2}
+DTYPE_NAMES = {code: name for name, code in DTYPES.items()}
+INT8_MAX = 127
+
+_FILE_PATTERN = re.compile("^" + re.escape(EMBEDDING_STORE_FILE).replace(r"\{version\}", r"(\d+)") + "$")
+
+
+def embedding_file_name(version):
+    return EMBEDDING_STORE_FILE.format(version=version)
+
+
+def find_embedding_files(directory):
+    """{version: path} của các file embedding hợp nhất trong thư mục"""
+    files = {}
+    with os.scandir(directory) as it:
+        for entry in it:
+            match = _FILE_PATTERN.match(entry.name)
+            if match:
+                files[int(match.group(1))] = entry.path
+    return files
+
+
+def is_embedding_file(name):
+    return _FILE_PATTERN.match(name) is not None
+
+
+def quantize(matrix, dtype):
+    """Chuẩn hoá L2 từng hàng rồi lượng tử hoá -> (vectors, scales); int8 dùng scale riêng cho mỗi vector"""
+    vectors = normalize(matrix)
+    scales = np.ones(len(vectors), dtype=np.float32)
+    if dtype == "float32":
+        return vectors, scales
+    if dtype == "float16":
+        return vectors.astype(np.float16), scales
+    if dtype == "int8":
+        absmax = np.abs(vectors).max(axis=1) if vectors.size else scales
+        scales = np.maximum(absmax, 1e-12).astype(np.float32) / INT8_MAX
+        quantized = np.clip(np.rint(vectors / scales[:, None]), -INT8_MAX, INT8_MAX).astype(np.int8)
+        return quantized, scales
+    raise ValueError(f"Unknown embedding dtype '{dtype}', expected one of {list(DTYPES)}")
+
+
+def dequantize(vectors, scales):
+    """vectors (n, dim) lưu trên file -> float32; float32 trả lại chính view đó, không copy"""
+    if vectors.dtype == np.float32:
+        return vectors
+    if vectors.dtype == np.float16:
+        return vectors.astype(np.float32)
+    return vectors.astype(np.float32) * scales[:, None]
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_embedding_file(path, keys, matrix, dtype="float16", model_version=1, video_ids=None, metadata=None):
+    """Ghi file hợp nhất; ghi ra file tạm rồi os.replace để process đang map file cũ không bị ảnh hưởng"""
+    matrix = np.asarray(matrix, dtype=np.float32).reshape(len(keys), -1)
+    vectors, scales = quantize(matrix, dtype)
+    index = dict(metadata or {})
+    index["keys"] = list(keys)
+    index["video_ids"] = list(video_ids) if video_ids is not None else [None] * len(keys)
+    index_bytes = json.dumps(index, ensure_ascii=False).encode("utf-8")
+
+    vectors_offset = _aligned(HEADER.size)
+    scales_offset = _aligned(vectors_offset + vectors.nbytes)
+    index_offset = scales_offset + scales.nbytes
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, DTYPES[dtype], len(keys), matrix.shape[1] if len(keys) else 0,
+        model_version, vectors_offset, scales_offset, index_offset, len(index_bytes),
+    )
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(b"\x00" * (vectors_offset - HEADER.size))
+        f.write(np.ascontiguousarray(vectors).tobytes())
+        f.write(b"\x00" * (scales_offset - vectors_offset - vectors.nbytes))
+        f.write(scales.tobytes())
+        f.write(index_bytes)
+    os.replace(tmp_path, path)
+    return path
+
+
+class EmbeddingFile:
+    """File hợp nhất đã được mmap: vectors (count, dim) và scales (count,) là view chỉ đọc trên mmap"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            # mmap vẫn hợp lệ sau khi đóng file descriptor
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, format_version, dtype_code, count, dim, model_version,
+         vectors_offset, scales_offset, index_offset, index_length) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an embedding store file")
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported format version {format_version}")
+
+        self.dtype = DTYPE_NAMES[dtype_code]
+        self.model_version = model_version
+        self.count = count
+        self.dim = dim
+        self.vectors = np.frombuffer(self._mmap, dtype=np.dtype(self.dtype), count=count * dim,
+                                     offset=vectors_offset).reshape(count, dim)
+        self.scales = np.frombuffer(self._mmap, dtype=np.float32, count=count, offset=scales_offset)
+
+        index = json.loads(self._mmap[index_offset:index_offset + index_length].decode("utf-8"))
+        self.keys = index.pop("keys")
+        self.video_ids = index.pop("video_ids")
+        self.metadata = index
+
+    @property
+    def nbytes(self):
+        return len(self._mmap)
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,473 @@
+import os
+import threading
+import numpy as np
+from app.services.similarity import normalize, pairwise_similarity
+from app.services.ann_index import IVFIndex
+from app.services.embedding_file import EmbeddingFile, dequantize, find_embedding_files, is_embedding_file
+from app.config.settings import (
+    MODEL_DIRS, MODEL_OPTIONS, DEFAULT_MODEL_OPTIONS, EMBEDDING_SUFFIX, EMBEDDING_WATCH_INTERVAL,
+    EMBEDDING_SCORE_CHUNK_ROWS, BASE_DIR, ANN_MIN_VECTORS, ANN_NPROBE, ANN_INDEX_FILE
+)
+
+
+def embedding_key(filename):
+    """Khoá của một embedding: tên video không có phần mở rộng (vd. '2815788565679065-MOTHER')"""
+    name = os.path.basename(filename)
+    if name.endswith(EMBEDDING_SUFFIX):
+        return name[:-len(EMBEDDING_SUFFIX)]
+    return name.split('.')[0]
+
+
+def embedding_filename(video_filename):
+    """Tên file .npy của embedding tham chiếu ứng với một video"""
+    return f"{embedding_key(video_filename)}{EMBEDDING_SUFFIX}"
+
+
+class ModelEmbeddings:
+    """Embedding tham chiếu của một model: một ma trận float32 liên tục + chỉ mục key -> hàng"""
+
+    storage = "npy"
+
+    def __init__(self, model_id, matrix, keys, signature, video_ids=None):
+        self.model_id = model_id
+        self.matrix = matrix
+        # Bản đã chuẩn hoá L2 để chấm cosine một-với-nhiều bằng một lần nhân ma trận
+        self.normalized = normalize(matrix) if len(keys) else matrix
+        self._set_index(keys, signature, video_ids)
+
+    def _set_index(self, keys, signature, video_ids):
+        self.keys = keys
+        self.rows = {key: i for i, key in enumerate(keys)}
+        self.video_ids = {video_id: key for video_id, key in zip(video_ids or (), keys) if video_id is not None}
+        self.signature = signature
+        self.ann = None  # IVFIndex khi tập embedding đủ lớn (xem ANN_MIN_VECTORS)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def dim(self):
+        return int(self.matrix.shape[1]) if len(self) else 0
+
+    @property
+    def nbytes(self):
+        return int(self.matrix.nbytes + self.normalized.nbytes)
+
+    def get(self, key):
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        # Giữ shape (1, dim) giống như np.load() file .npy trước đây
+        return self.matrix[row:row + 1]
+
+    def get_normalized(self, key):
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        return self.vectors(slice(row, row + 1))
+
+    def key_for_video(self, video_id):
+        return self.video_ids.get(video_id)
+
+    def row_video_ids(self):
+        """video_id của từng hàng (None nếu không biết), theo thứ tự keys"""
+        by_key = {key: video_id for video_id, key in self.video_ids.items()}
+        return [by_key.get(key) for key in self.keys]
+
+    def with_vector(self, key, vector, video_id, signature):
+        """Bản mới có thêm (hoặc thay) embedding của key; bản hiện tại không đổi vì request khác đang đọc"""
+        video_ids = self.row_video_ids()
+        row = self.rows.get(key)
+        if row is not None:
+            keys = self.keys
+            matrix = self.matrix.copy()
+            matrix[row] = vector[0]
+            video_ids[row] = video_id if video_id is not None else video_ids[row]
+        else:
+            keys = self.keys + [key]
+            matrix = np.concatenate((self.matrix, vector))
+            video_ids.append(video_id)
+        return ModelEmbeddings(self.model_id, np.ascontiguousarray(matrix), keys, signature, video_ids)
+
+    def vectors(self, rows=None):
+        """Vector đã chuẩn hoá float32 của mọi hàng (hoặc các hàng rows)"""
+        return self.normalized if rows is None else self.normalized[rows]
+
+    def similarities(self, query, metric, rows=None):
+        """query đã chuẩn hoá (1, dim) -> điểm (n,) với mọi hàng (hoặc các hàng rows)"""
+        return pairwise_similarity(query, self.vectors(rows), metric, normalized=True)[0]
+
+
+class MappedEmbeddings(ModelEmbeddings):
+    """
+    Embedding đọc từ file hợp nhất đã mmap (xem embedding_file). Không giữ bản float32 nào trong RAM:
+    file float32 được chấm điểm trực tiếp trên mmap, float16/int8 được giải lượng tử theo từng khối hàng.
+    Embedding chưa có trong file (video đăng ký sau khi build) nằm trong overlay float32 đã chuẩn hoá,
+    là các hàng nối tiếp sau file; key có trong cả hai thì hàng trong overlay thay hàng trong file.
+    """
+
+    storage = "mmap"
+
+    def __init__(self, model_id, embedding_file, signature, overlay_keys=(), overlay=None, overlay_video_ids=None):
+        self.model_id = model_id
+        self.file = embedding_file
+        self.overlay_keys = list(overlay_keys)
+        self.overlay = overlay if overlay is not None else np.zeros((0, embedding_file.dim), dtype=np.float32)
+        overlay_video_ids = list(overlay_video_ids) if overlay_video_ids is not None \
+            else [None] * len(self.overlay_keys)
+        self._set_index(embedding_file.keys + self.overlay_keys, signature,
+                        embedding_file.video_ids + overlay_video_ids)
+        # Hàng trong file đã bị overlay thay: bỏ qua khi chấm điểm toàn bộ
+        self._shadowed = np.array([row for row, key in enumerate(embedding_file.keys) if self.rows[key] != row],
+                                  dtype=np.int64)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def dim(self):
+        return self.file.dim
+
+    @property
+    def nbytes(self):
+        return int(self.file.nbytes + self.overlay.nbytes)
+
+    def get(self, key):
+        # Vector đã chuẩn hoá: cả cosine và l2 đều chuẩn hoá trước khi so sánh nên kết quả không đổi
+        return self.get_normalized(key)
+
+    def with_vector(self, key, vector, video_id, signature):
+        # Không giải lượng tử cả file: chỉ overlay được sao chép (nhỏ, chỉ gồm video đăng ký sau khi build)
+        vector = normalize(vector)
+        overlay_keys = list(self.overlay_keys)
+        video_ids = self.row_video_ids()
+        overlay_video_ids = video_ids[len(self.file):]
+        if video_id is None and key in self.rows:
+            video_id = video_ids[self.rows[key]]
+        if key in overlay_keys:
+            index = overlay_keys.index(key)
+            overlay = self.overlay.copy()
+            overlay[index] = vector[0]
+            overlay_video_ids[index] = video_id
+        else:
+            overlay_keys.append(key)
+            overlay = np.concatenate((self.overlay, vector))
+            overlay_video_ids.append(video_id)
+        return MappedEmbeddings(self.model_id, self.file, signature, overlay_keys, overlay, overlay_video_ids)
+
+    def vectors(self, rows=None):
+        if not len(self.overlay):
+            if rows is None:
+                return dequantize(self.file.vectors, self.file.scales)
+            return dequantize(self.file.vectors[rows], self.file.scales[rows])
+        rows = np.arange(len(self.keys))[rows if rows is not None else slice(None)]
+        count = len(self.file)
+        in_file = rows < count
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        if in_file.any():
+            file_rows = rows[in_file]
+            out[in_file] = dequantize(self.file.vectors[file_rows], self.file.scales[file_rows])
+        if not in_file.all():
+            out[~in_file] = self.overlay[rows[~in_file] - count]
+        return out
+
+    def similarities(self, query, metric, rows=None):
+        if rows is not None or (self.file.dtype == "float32" and not len(self.overlay)):
+            return super().similarities(query, metric, rows)
+        # Giải lượng tử từng khối để bộ nhớ tạm không phụ thuộc kích thước tập embedding
+        total = len(self.keys)
+        scores = np.empty(total, dtype=np.float32)
+        for start in range(0, total, EMBEDDING_SCORE_CHUNK_ROWS):
+            block = slice(start, start + EMBEDDING_SCORE_CHUNK_ROWS)
+            scores[block] = pairwise_similarity(query, self.vectors(block), metric, normalized=True)[0]
+        if len(self._shadowed):
+            scores[self._shadowed] = -np.inf
+        return scores
+
+
+class ReferenceEmbeddingStore:
+    """
+    Load toàn bộ embedding tham chiếu vào RAM khi khởi động để request
+    không phải đọc file .npy. Thư mục có thể load lại bằng reload() hoặc watcher.
+    Nếu thư mục có file hợp nhất (tools/build_embedding_store.py) thì chỉ cần một lần mmap file đó.
+    """
+
+    def __init__(self, model_dirs=MODEL_DIRS, watch_interval=EMBEDDING_WATCH_INTERVAL):
+        self.model_dirs = model_dirs
+        self.watch_interval = watch_interval
+        self._models = {}
+        self._lock = threading.Lock()
+        # Mỗi lúc chỉ một reload; add_video xảy ra trong lúc reload được ghi vào _added để áp lại lên bản mới
+        self._reload_lock = threading.Lock()
+        self._added = {}
+        self._watcher = None
+        self._stop_event = threading.Event()
+
+    def embedding_dir(self, model_id):
+        config = self.model_dirs.get(model_id)
+        if not config:
+            return None
+        path = config['embedding_dir']
+        return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+    def load_all(self):
+        for model_id in self.model_dirs:
+            self.reload(model_id)
+
+    def reload(self, model_id):
+        """Đọc lại thư mục embedding của model và thay ma trận cũ"""
+        directory = self.embedding_dir(model_id)
+        if directory is None:
+            raise KeyError(f"No embedding directory configured for model {model_id}")
+        with self._reload_lock:
+            with self._lock:
+                self._added[model_id] = []
+            try:
+                if not os.path.isdir(directory):
+                    print(f"Embedding directory not found for model {model_id}: {directory}")
+                    embeddings = ModelEmbeddings(model_id, np.zeros((0, 0), dtype=np.float32), [], ())
+                else:
+                    embeddings = self._load_consolidated(model_id, directory) \
+                        or self._load_directory(model_id, directory)
+                    self._attach_ann(embeddings, directory)
+
+                with self._lock:
+                    # Video đăng ký trong lúc đang đọc thư mục có thể chưa có trong bản mới: áp lại trước khi thay
+                    added = self._added[model_id]
+                    for key, vector, video_id in added:
+                        embeddings = self._with_added(embeddings, key, vector, video_id, embeddings.signature) \
+                            or embeddings
+                    self._models[model_id] = embeddings
+            finally:
+                with self._lock:
+                    self._added.pop(model_id, None)
+            if added and os.path.isdir(directory):
+                self._attach_ann(embeddings, directory, new_keys=[key for key, _, _ in added])
+        print(f"Loaded {len(embeddings)} reference embeddings for model {model_id} ({embeddings.storage})")
+        return embeddings
+
+    def refresh_if_changed(self, model_id):
+        """Load lại nếu có file .npy hoặc file hợp nhất được thêm/xoá/sửa trong thư mục"""
+        directory = self.embedding_dir(model_id)
+        if directory is None or not os.path.isdir(directory):
+            return False
+        current = self.get_model(model_id)
+        if current is not None and current.signature == self._signature(directory):
+            return False
+        self.reload(model_id)
+        return True
+
+    def add_video(self, model_id, video_filename, video_id=None):
+        """
+        Thêm embedding của một video mới đăng ký (POST /api/course/videos/) mà không load lại cả thư mục.
+        Trả về False nếu file embedding chưa có (watcher sẽ thêm sau khi file được tạo).
+        """
+        directory = self.embedding_dir(model_id)
+        if directory is None:
+            return False
+        key = embedding_key(video_filename)
+        path = os.path.join(directory, f"{key}{EMBEDDING_SUFFIX}")
+        if not os.path.exists(path):
+            return False
+
+        vector = np.load(path).reshape(1, -1).astype(np.float32)
+        with self._lock:
+            embeddings = self._with_added(self._models.get(model_id), key, vector, video_id,
+                                          self._signature(directory), model_id)
+            if embeddings is None:
+                return False
+            self._models[model_id] = embeddings
+            if model_id in self._added:
+                self._added[model_id].append((key, vector, video_id))
+
+        self._attach_ann(embeddings, directory, new_keys=[key])
+        return True
+
+    def _with_added(self, current, key, vector, video_id, signature, model_id=None):
+        """Bản mới của current có thêm embedding key, None nếu khác số chiều (gọi khi đang giữ _lock)"""
+        if current is None or len(current) == 0:
+            return ModelEmbeddings(model_id if current is None else current.model_id, vector, [key], signature,
+                                   [video_id])
+        if current.dim != vector.shape[1]:
+            print(f"Skipping embedding {key}: dimension {vector.shape[1]} != {current.dim}")
+            return None
+        # File hợp nhất chỉ đọc: video mới nằm trong overlay (RAM) cho tới khi chạy lại converter
+        embeddings = current.with_vector(key, vector, video_id, signature)
+        embeddings.ann = current.ann
+        return embeddings
+
+    def candidate_rows(self, embeddings, query, k):
+        """Các hàng ứng viên gần query: qua chỉ mục IVF nếu có, None nghĩa là phải xét toàn bộ"""
+        if embeddings.ann is None:
+            return None
+        ids, _ = embeddings.ann.search(query, k)
+        keys = embeddings.ann.keys
+        return np.array([embeddings.rows[keys[i]] for i in ids if keys[i] in embeddings.rows], dtype=np.int64)
+
+    def get_model(self, model_id):
+        with self._lock:
+            return self._models.get(model_id)
+
+    def get(self, model_id, key):
+        embeddings = self.get_model(model_id)
+        if embeddings is None:
+            return None
+        return embeddings.get(key)
+
+    def get_by_path(self, model_id, embedding_path):
+        return self.get(model_id, embedding_key(embedding_path))
+
+    def key_for_video(self, model_id, video_id):
+        """Khoá embedding của video theo video_id ghi trong file hợp nhất / lúc đăng ký, None nếu không biết"""
+        embeddings = self.get_model(model_id)
+        if embeddings is None:
+            return None
+        return embeddings.key_for_video(video_id)
+
+    def start_watcher(self):
+        if self.watch_interval <= 0 or self._watcher is not None:
+            return
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=self._watch, name="embedding-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_event.set()
+        self._watcher = None
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                model_id: {
+                    "count": len(embeddings),
+                    "dim": embeddings.dim,
+                    "bytes": embeddings.nbytes,
+                    "storage": embeddings.storage,
+                    "dtype": embeddings.file.dtype if embeddings.storage == "mmap" else "float32",
+                    "version": embeddings.file.model_version if embeddings.storage == "mmap" else None,
+                }
+                for model_id, embeddings in self._models.items()
+            }
+
+    def _watch(self):
+        while not self._stop_event.wait(self.watch_interval):
+            for model_id in list(self.model_dirs):
+                try:
+                    self.refresh_if_changed(model_id)
+                except Exception as e:
+                    print(f"Error refreshing embeddings for model {model_id}: {str(e)}")
+
+    def _signature(self, directory):
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith(EMBEDDING_SUFFIX) or is_embedding_file(entry.name):
+                    stat = entry.stat()
+                    entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(entries))
+
+    def _attach_ann(self, embeddings, directory, new_keys=None):
+        """
+        Gắn chỉ mục IVF (load từ file, chèn thêm key mới, hoặc build lại) và lưu cạnh thư mục embedding.
+        Index đang gắn có thể đang được request khác tìm kiếm: chèn vào bản sao rồi thay tham chiếu.
+        """
+        if len(embeddings) < ANN_MIN_VECTORS:
+            embeddings.ann = None
+            return
+
+        path = os.path.join(directory, ANN_INDEX_FILE)
+        ann = embeddings.ann.copy() if embeddings.ann is not None else None
+        if ann is None and os.path.exists(path):
+            try:
+                ann = IVFIndex.load(path)
+            except Exception as e:
+                print(f"Could not load ANN index {path}: {str(e)}")
+
+        current = set(embeddings.keys)
+        if ann is not None and (ann.dim != embeddings.dim or not set(ann.keys) <= current):
+            ann = None  # Kích thước đổi hoặc có embedding bị xoá: build lại
+
+        if ann is None:
+            ann = IVFIndex.build(embeddings.keys, embeddings.vectors(), nprobe=ANN_NPROBE)
+        else:
+            # Key mới đăng ký luôn được chèn lại (vector có thể đã đổi), còn lại chỉ chèn key còn thiếu
+            missing = new_keys or [key for key in embeddings.keys if key not in ann]
+            if missing:
+                rows = [embeddings.rows[key] for key in missing]
+                ann.add_many(missing, embeddings.vectors(rows), normalized=True)
+            if ann.needs_rebuild():
+                ann = IVFIndex.build(embeddings.keys, embeddings.vectors(), nprobe=ANN_NPROBE)
+
+        try:
+            ann.save(path)
+        except OSError as e:
+            print(f"Could not save ANN index {path}: {str(e)}")
+        embeddings.ann = ann
+
+    def _load_consolidated(self, model_id, directory):
+        """
+        MappedEmbeddings từ file hợp nhất theo options["embedding_store_version"], None nếu không dùng.
+        File .npy chưa có trong file hợp nhất (video đăng ký sau khi build) được gộp thêm vào RAM.
+        """
+        options = {**DEFAULT_MODEL_OPTIONS, **MODEL_OPTIONS.get(model_id, {})}
+        version = options["embedding_store_version"]
+        if version is None:
+            return None
+        files = find_embedding_files(directory)
+        if version == "latest":
+            path = files[max(files)] if files else None
+        else:
+            path = files.get(version)
+            if path is None:
+                print(f"Embedding store v{version} not found for model {model_id}, reading .npy files")
+        if path is None:
+            return None
+
+        signature = self._signature(directory)
+        try:
+            embeddings = MappedEmbeddings(model_id, EmbeddingFile(path), signature)
+        except (OSError, ValueError) as e:
+            print(f"Could not map embedding store {path}: {str(e)}")
+            return None
+
+        extra = [name for name, _, _ in signature
+                 if name.endswith(EMBEDDING_SUFFIX) and embedding_key(name) not in embeddings.rows]
+        if not extra:
+            return embeddings
+        loaded = self._load_files(directory, extra, embeddings.dim)
+        if not loaded:
+            return embeddings
+        print(f"{len(loaded)} embeddings of model {model_id} are not in {os.path.basename(path)}, "
+              f"rebuild it with tools/build_embedding_store.py")
+        overlay = normalize(np.stack([vector for _, vector in loaded]).astype(np.float32))
+        return MappedEmbeddings(model_id, embeddings.file, signature, [key for key, _ in loaded], overlay)
+
+    def _load_files(self, directory, names, dim=None):
+        """[(key, vector)] của các file .npy đọc được và cùng kích thước"""
+        loaded = []
+        for name in names:
+            try:
+                vector = np.load(os.path.join(directory, name)).reshape(-1)
+            except Exception as e:
+                print(f"Skipping unreadable embedding {name}: {str(e)}")
+                continue
+            if dim is None:
+                dim = vector.shape[0]
+            if vector.shape != (dim,):
+                print(f"Skipping embedding {name}: dimension {vector.shape[0]} != {dim}")
+                continue
+            loaded.append((embedding_key(name), vector))
+        return loaded
+
+    def _load_directory(self, model_id, directory):
+        signature = self._signature(directory)
+        loaded = self._load_files(directory, [name for name, _, _ in signature if name.endswith(EMBEDDING_SUFFIX)])
+        keys = [key for key, _ in loaded]
+        if loaded:
+            matrix = np.ascontiguousarray(np.stack([vector for _, vector in loaded]), dtype=np.float32)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        return ModelEmbeddings(model_id, matrix, keys, signature)
+
+
+embedding_store = ReferenceEmbeddingStore()
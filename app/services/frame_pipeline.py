@@ -0,0 +1,202 @@
+import base64
+import contextvars
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+from app.config.settings import DECODE_WORKERS, DECODE_QUEUE_SIZE
+from app.utils.landmarks import DETECTORS, detector_schedule, interpolate_skipped
+from app.services.result_cache import frame_digest
+from app.services.metrics import observe_stage
+
+_END = object()
+
+# Hệ số thu nhỏ khi decode -> cờ của cv2.imdecode (JPEG được decode thẳng ở độ phân giải thấp)
+IMREAD_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def imread_flag_for_scale(scale):
+    if scale not in IMREAD_FLAGS:
+        raise ValueError(f"Unsupported decode scale: {scale}")
+    return IMREAD_FLAGS[scale]
+
+
+def decode_image(buffer, imread_flag=cv2.IMREAD_COLOR):
+    """Decode ảnh JPEG/PNG/WebP (bytes hoặc memoryview) thành frame RGB"""
+    started = time.perf_counter()
+    nparr = np.frombuffer(buffer, np.uint8)
+    frame = cv2.imdecode(nparr, imread_flag)
+    if frame is None:
+        raise ValueError("Could not decode frame image")
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    observe_stage("imdecode", time.perf_counter() - started)
+    return frame
+
+
+def decode_base64_frame(frame_data, imread_flag=cv2.IMREAD_COLOR):
+    """Decode một frame dạng data URL base64 ('data:image/jpeg;base64,...')"""
+    started = time.perf_counter()
+    try:
+        img_data = base64.b64decode(frame_data.split(',')[1])
+    except (IndexError, ValueError) as e:
+        raise ValueError(f"Invalid base64 frame: {str(e)}")
+    observe_stage("base64_decode", time.perf_counter() - started)
+    return decode_image(img_data, imread_flag)
+
+
+def split_length_prefixed_frames(body, limit=None):
+    """
+    Tách body nhị phân [uint32 big-endian độ dài][bytes ảnh]... thành các memoryview
+    trỏ thẳng vào body (không copy từng frame).
+    """
+    view = memoryview(body)
+    frames = []
+    offset = 0
+    while offset < len(view):
+        if limit is not None and len(frames) >= limit:
+            break
+        if offset + 4 > len(view):
+            raise ValueError("Truncated frame length prefix")
+        length = int.from_bytes(view[offset:offset + 4], "big")
+        offset += 4
+        if length == 0 or offset + length > len(view):
+            raise ValueError(f"Invalid frame length {length} at offset {offset - 4}")
+        frames.append(view[offset:offset + length])
+        offset += length
+    return frames
+
+
+def frame_cache_key(digest, imread_flag, landmark_options):
+    """Khoá của frame_cache: landmark phụ thuộc cả nội dung frame, cách decode và tuỳ chọn landmark"""
+    return digest, imread_flag, tuple(sorted(landmark_options.items()))
+
+
+class FramePipeline:
+    """
+    Pipeline hai tầng cho một request: tầng decode chạy trên thread pool và đi trước
+    tầng landmark (MediaPipe) tối đa queue_size frame, nên decode và landmark chạy chồng lên nhau.
+    """
+
+    def __init__(self, max_workers=DECODE_WORKERS, queue_size=DECODE_QUEUE_SIZE):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="frame-decode")
+        self.queue_size = queue_size
+
+    def iter_decoded(self, encoded_frames, decoder=decode_base64_frame, imread_flag=cv2.IMREAD_COLOR):
+        """Trả về các frame RGB đã decode theo đúng thứ tự gửi lên"""
+        pending = deque()
+        frames = iter(encoded_frames)
+
+        def submit_next():
+            encoded = next(frames, _END)
+            if encoded is _END:
+                return False
+            # Chạy trong context của request để metrics của bước decode có nhãn model_id
+            pending.append(self.executor.submit(contextvars.copy_context().run, decoder, encoded, imread_flag))
+            return True
+
+        try:
+            while len(pending) < self.queue_size and submit_next():
+                pass
+            while pending:
+                frame = pending.popleft().result()
+                # Lấp lại chỗ trống trong hàng đợi trước khi trả frame cho tầng landmark
+                submit_next()
+                yield frame
+        finally:
+            # Người dùng dừng sớm (hoặc lỗi): huỷ các frame chưa decode
+            for future in pending:
+                future.cancel()
+
+    def extract_landmarks(self, encoded_frames, landmark_service, decoder=decode_base64_frame,
+                          imread_flag=cv2.IMREAD_COLOR, out=None, landmark_options=None, detector_stride=None,
+                          on_checkpoint=None, frame_cache=None, frame_digests=None):
+        """
+        Landmark của từng frame. Có out (LandmarkTensor) thì ghi thẳng vào từng hàng của nó
+        và dừng decode khi đã đủ số frame của model; không thì trả về list các mảng.
+        landmark_options được chuyển cho get_frame_landmarks (xem ModelService.landmark_options).
+        Các tham số sau chỉ dùng khi có out:
+        - detector_stride: mỗi detector chỉ chạy 1 lần trên N frame, frame bị bỏ được nội suy.
+        - on_checkpoint (vd. CheckpointScorer): được gọi với out khi số frame đạt một trong
+          on_checkpoint.checkpoints, trả về True thì dừng luôn (không decode/landmark các frame còn lại).
+        - frame_cache (TTLCache): frame đã gặp (cùng nội dung, cùng tuỳ chọn) lấy landmark từ cache,
+          frame trùng trong cùng request chỉ chạy một lần; frame_digests là hash đã tính sẵn (nếu có).
+        """
+        landmark_options = landmark_options or {}
+        if out is None:
+            return [landmark_service.get_frame_landmarks(frame_rgb, **landmark_options)
+                    for frame_rgb in self.iter_decoded(encoded_frames, decoder, imread_flag)]
+
+        first = len(out)
+        count = min(len(encoded_frames), out.capacity - first)
+        checkpoints = set(on_checkpoint.checkpoints) if on_checkpoint is not None else set()
+        checkpoints = {frames for frames in checkpoints if first < frames < first + count}
+
+        schedule = None
+        if detector_stride and any(stride > 1 for stride in detector_stride.values()):
+            anchors = [frames - first - 1 for frames in checkpoints]
+            schedule = detector_schedule(count, detector_stride, anchors)
+        frame_options = [
+            {**landmark_options, "detectors": tuple(name for name in DETECTORS if schedule[name][i])}
+            if schedule is not None else landmark_options
+            for i in range(count)
+        ]
+
+        # Mỗi frame: None = phải decode + landmark, int = giống frame đứng trước, mảng = landmark từ cache
+        sources, keys = self._plan_cached(encoded_frames, count, imread_flag, frame_options,
+                                          frame_cache, frame_digests)
+        misses = [encoded_frames[i] for i in range(count) if sources[i] is None]
+        decoded = self.iter_decoded(misses, decoder, imread_flag)
+        try:
+            for i in range(count):
+                slot = out.next_slot()
+                source = sources[i]
+                if source is None:
+                    landmark_service.get_frame_landmarks(next(decoded), out=slot, **frame_options[i])
+                    if keys is not None:
+                        frame_cache.put(keys[i], slot.copy())
+                elif isinstance(source, int):
+                    slot[...] = out.frames[first + source]
+                else:
+                    slot[...] = source
+                out.commit()
+                if len(out) in checkpoints:
+                    if schedule is not None:
+                        interpolate_skipped(out.frames[first:len(out)],
+                                            {name: ran[:len(out) - first] for name, ran in schedule.items()})
+                    if on_checkpoint(out):
+                        return out
+        finally:
+            decoded.close()
+
+        if schedule is not None:
+            interpolate_skipped(out.frames[first:len(out)], schedule)
+        return out
+
+    def _plan_cached(self, encoded_frames, count, imread_flag, frame_options, frame_cache, frame_digests):
+        if frame_cache is None or not frame_cache.enabled:
+            return [None] * count, None
+        digests = frame_digests or [frame_digest(encoded_frames[i]) for i in range(count)]
+        keys = [frame_cache_key(digests[i], imread_flag, frame_options[i]) for i in range(count)]
+        sources = []
+        first_seen = {}
+        for i, key in enumerate(keys):
+            if key in first_seen:
+                sources.append(first_seen[key])
+                continue
+            cached = frame_cache.get(key)
+            if cached is None:
+                first_seen[key] = i
+            sources.append(cached)
+        return sources, keys
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+frame_pipeline = FramePipeline()
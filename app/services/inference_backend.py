@@ -0,0 +1,168 @@
+import os
+import json
+import threading
+import numpy as np
+from app.config.settings import TFLITE_NUM_THREADS
+
+
+class KerasPredictBackend:
+    """model.predict(): dựng data adapter + callbacks mỗi lần gọi, chỉ nên dùng để đối chiếu"""
+    name = "keras"
+
+    def __init__(self, model, target_shape):
+        self.model = model
+
+    def predict(self, inputs):
+        return self.model.predict(inputs, verbose=0)
+
+
+class DirectCallBackend:
+    """Gọi thẳng model(x) ở chế độ eager, bỏ qua vòng lặp predict()"""
+    name = "direct"
+
+    def __init__(self, model, target_shape):
+        self.model = model
+
+    def predict(self, inputs):
+        return self.model(inputs, training=False).numpy()
+
+
+class TFFunctionBackend:
+    """Graph tf.function được trace một lần với batch size động"""
+    name = "function"
+    jit_compile = False
+
+    def __init__(self, model, target_shape):
+        import tensorflow as tf
+
+        self.model = model
+        self._fn = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(shape=(None, *target_shape), dtype=tf.float32)],
+            jit_compile=self.jit_compile,
+        )
+
+    def predict(self, inputs):
+        return self._fn(inputs).numpy()
+
+
+class XLAFunctionBackend(TFFunctionBackend):
+    """Như TFFunctionBackend nhưng biên dịch bằng XLA"""
+    name = "xla"
+    jit_compile = True
+
+
+def load_tflite_interpreter(model_path, num_threads=TFLITE_NUM_THREADS):
+    """Ưu tiên tflite_runtime (nhẹ, không cần cả TensorFlow), nếu không có thì dùng tf.lite"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    # Delegate XNNPACK được bật mặc định cho các op float trên CPU
+    return Interpreter(model_path=model_path, num_threads=num_threads)
+
+
+def tflite_path_for(model_file, variant=None):
+    """Đường dẫn file .tflite cạnh file .keras, vd. Family-embeded.int8.tflite"""
+    base = os.path.splitext(model_file)[0]
+    return f"{base}.{variant}.tflite" if variant else f"{base}.tflite"
+
+
+def convert_to_tflite(model, output_path, optimizations=None, supported_types=None, representative_dataset=None):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if optimizations:
+        converter.optimizations = optimizations
+    if supported_types:
+        converter.target_spec.supported_types = supported_types
+    if representative_dataset is not None:
+        converter.representative_dataset = representative_dataset
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+    print(f"Exported TFLite model: {output_path}")
+    return output_path
+
+
+class TFLiteBackend:
+    """Engine TFLite (XNNPACK) export từ file .keras; tự export lại nếu file .keras mới hơn"""
+    name = "tflite"
+
+    def __init__(self, model, target_shape, model_file=None, model_path=None):
+        self.model_path = model_path or tflite_path_for(model_file)
+        if self.needs_export(model_file, self.model_path):
+            if model is None:
+                raise ValueError(f"TFLite model {self.model_path} is missing and no Keras model to export from")
+            convert_to_tflite(model, self.model_path)
+
+        self.interpreter = load_tflite_interpreter(self.model_path)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()  # Interpreter không an toàn khi gọi từ nhiều thread
+
+    @staticmethod
+    def needs_export(model_file, tflite_path):
+        if not os.path.exists(tflite_path):
+            return True
+        return bool(model_file) and os.path.exists(model_file) and \
+            os.path.getmtime(model_file) > os.path.getmtime(tflite_path)
+
+    def predict(self, inputs):
+        inputs = np.ascontiguousarray(inputs, dtype=self._input["dtype"])
+        with self._lock:
+            if inputs.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], inputs.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = inputs.shape[0]
+            self.interpreter.set_tensor(self._input["index"], inputs)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output["index"]).copy()
+
+
+INFERENCE_BACKENDS = {
+    backend.name: backend
+    for backend in (KerasPredictBackend, DirectCallBackend, TFFunctionBackend, XLAFunctionBackend, TFLiteBackend)
+}
+
+
+def create_backend(name, model, target_shape, model_file=None, model_path=None):
+    backend_cls = INFERENCE_BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {list(INFERENCE_BACKENDS)}")
+    if backend_cls is TFLiteBackend:
+        return backend_cls(model, target_shape, model_file=model_file, model_path=model_path)
+    return backend_cls(model, target_shape)
+
+
+# Các biến thể lượng tử hoá sau huấn luyện (tạo bằng tools/quantize_models.py)
+QUANTIZED_VARIANTS = ("int8", "float16", "int8-calibrated")
+
+
+def quantization_report_path(model_file, variant):
+    return tflite_path_for(model_file, variant) + ".json"
+
+
+def quantized_variant_approved(model_file, variant):
+    """
+    Biến thể chỉ được dùng khi đã qua bước kiểm tra độ chính xác, file .tflite
+    vẫn là file đã được kiểm tra (so sánh kích thước + mtime trong báo cáo)
+    và file .keras không mới hơn biến thể/báo cáo (model đã train lại thì phải lượng tử hoá lại).
+    """
+    variant_path = tflite_path_for(model_file, variant)
+    report_path = quantization_report_path(model_file, variant)
+    if not os.path.exists(variant_path) or not os.path.exists(report_path):
+        return False, "variant or accuracy report missing"
+    with open(report_path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    stat = os.stat(variant_path)
+    if report.get("variant_size") != stat.st_size or report.get("variant_mtime") != int(stat.st_mtime):
+        return False, "variant file changed since it was checked"
+    if model_file and os.path.exists(model_file):
+        model_mtime = os.path.getmtime(model_file)
+        if model_mtime > stat.st_mtime or model_mtime > os.path.getmtime(report_path):
+            return False, "Keras model is newer than the quantized variant"
+    if not report.get("passed"):
+        return False, "variant failed the accuracy check"
+    return True, "ok"
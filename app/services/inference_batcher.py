@@ -0,0 +1,115 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from app.config.settings import INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS
+from app.services.metrics import Histogram
+
+_STOP = object()
+
+
+class InferenceBatcher:
+    """
+    Gom các tensor (1, *target_shape) của nhiều request đồng thời thành một batch,
+    gọi predict một lần rồi trả từng embedding về đúng request.
+    Một batch được chạy khi đủ max_batch phần tử hoặc phần tử đầu đã chờ max_wait_ms. Chỉ chờ gom khi
+    đang có request đồng thời (hàng đợi còn phần tử hoặc batch trước có nhiều hơn một phần tử);
+    một request lẻ được predict ngay.
+    """
+
+    def __init__(self, predict_fn, max_batch=INFERENCE_MAX_BATCH, max_wait_ms=INFERENCE_MAX_WAIT_MS, name="model"):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.batch_size_hist = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_delay_hist = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100, 250])  # ms
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()  # _closed và việc đưa vào hàng đợi thay đổi cùng nhau
+        self._recent_concurrency = False
+        self._thread = threading.Thread(target=self._run, name=f"inference-batcher-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, tensor):
+        """Đưa một tensor (1, ...) vào hàng đợi, trả về Future chứa embedding (1, dim)"""
+        future = Future()
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._queue.put((tensor, future, time.perf_counter()))
+        if closed:
+            # Đã đóng (model bị registry loại ra): không còn thread gom batch, predict trực tiếp
+            future.set_result(self.predict_fn(tensor))
+        return future
+
+    def predict(self, tensor):
+        return self.submit(tensor).result()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+
+    def get_stats(self):
+        return {
+            "pending": self._queue.qsize(),
+            "batch_size": self.batch_size_hist.snapshot(),
+            "queue_delay_ms": self.queue_delay_hist.snapshot(),
+        }
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = item[2] + self.max_wait
+            hold = self._recent_concurrency or not self._queue.empty()
+            stop = False
+            while len(batch) < self.max_batch:
+                # Không có tải đồng thời: chỉ lấy những gì đã có sẵn trong hàng đợi rồi chạy ngay
+                remaining = deadline - time.perf_counter() if hold else 0
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._recent_concurrency = len(batch) > 1
+            self._run_batch(batch)
+            if stop:
+                break
+
+        # Xử lý nốt những request còn lại sau khi đóng
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                self._run_batch([item])
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            self.queue_delay_hist.observe((started - enqueued) * 1000)
+        self.batch_size_hist.observe(len(batch))
+
+        try:
+            # Batch một phần tử dùng thẳng tensor của request, không copy
+            inputs = batch[0][0] if len(batch) == 1 else np.concatenate([tensor for tensor, _, _ in batch], axis=0)
+            outputs = self.predict_fn(inputs)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for i, (_, future, _) in enumerate(batch):
+            future.set_result(outputs[i:i + 1])
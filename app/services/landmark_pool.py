@@ -0,0 +1,264 @@
+import queue
+import threading
+import multiprocessing as mp
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+from app.config.settings import LANDMARK_WORKERS, LANDMARK_WARMUP_FRAMES, LANDMARK_FRAME_BYTES
+from app.utils.landmarks import LANDMARK_COUNT
+from app.services.metrics import registry, observe_stages
+
+LANDMARK_SHAPE = (LANDMARK_COUNT, 3)
+LANDMARK_BYTES = LANDMARK_COUNT * 3 * np.dtype(np.float32).itemsize
+
+
+class LandmarkWorkerError(RuntimeError):
+    """Process worker chết hoặc báo lỗi khi xử lý frame; pool thay worker đó bằng process mới"""
+
+
+def _worker_main(conn, frame_shm_name, landmark_shm_name, warmup_frames):
+    """Vòng lặp của process worker: mỗi worker có LandmarkService (graph MediaPipe) riêng"""
+    from app.services.landmark_service import LandmarkService
+
+    frame_shm = shared_memory.SharedMemory(name=frame_shm_name)
+    landmark_shm = shared_memory.SharedMemory(name=landmark_shm_name)
+    landmarks_out = np.ndarray(LANDMARK_SHAPE, dtype=np.float32, buffer=landmark_shm.buf)
+    try:
+        service = LandmarkService()
+        # Chạy thử vài frame để MediaPipe khởi tạo graph trước khi nhận request thật
+        blank = np.zeros((256, 256, 3), dtype=np.uint8)
+        for _ in range(warmup_frames):
+            service.get_frame_landmarks(blank)
+        conn.send(("ready", None))
+
+        while True:
+            message, payload = conn.recv()
+            if message == "stop":
+                break
+            if message == "start_sequence":
+                service.start_sequence()  # Không trả lời: tin nhắn frame kế tiếp luôn tới sau
+                continue
+            if message == "resize":
+                # Process cha đã cấp segment lớn hơn cho frame to (vd. webcam > 1080p): chuyển sang segment mới
+                try:
+                    resized = shared_memory.SharedMemory(name=payload)
+                except OSError as e:
+                    conn.send(("error", str(e)))
+                    continue
+                frame_shm.close()
+                frame_shm = resized
+                conn.send(("ok", None))
+                continue
+            try:
+                shape, options = payload
+                frame = np.ndarray(shape, dtype=np.uint8, buffer=frame_shm.buf)
+                try:
+                    service.get_frame_landmarks(frame, out=landmarks_out, **options)
+                finally:
+                    del frame  # Không giữ view vào segment, để segment đóng được khi cần cấp lại
+                conn.send(("ok", service.timings))
+            except Exception as e:
+                conn.send(("error", str(e)))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del landmarks_out
+        frame_shm.close()
+        landmark_shm.close()
+
+
+class LandmarkWorker:
+    """Handle tới một process worker; dùng như LandmarkService (get_frame_landmarks)"""
+
+    def __init__(self, ctx, index, frame_bytes, warmup_frames):
+        self.index = index
+        self.frame_shm = shared_memory.SharedMemory(create=True, size=frame_bytes)
+        self.landmark_shm = shared_memory.SharedMemory(create=True, size=LANDMARK_BYTES)
+        self.landmarks = np.ndarray(LANDMARK_SHAPE, dtype=np.float32, buffer=self.landmark_shm.buf)
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.frame_shm.name, self.landmark_shm.name, warmup_frames),
+            name=f"landmark-worker-{index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self):
+        message, detail = self.conn.recv()
+        if message != "ready":
+            raise LandmarkWorkerError(f"Landmark worker {self.index} failed to start: {detail}")
+
+    def get_frame_landmarks(self, frame, out=None, **options):
+        self._ensure_capacity(frame.nbytes)
+
+        # Frame được chép thẳng vào shared memory, worker đọc trực tiếp không qua pickle
+        shared_frame = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.frame_shm.buf)
+        np.copyto(shared_frame, frame)
+        try:
+            # options: tham số của LandmarkService.get_frame_landmarks (vd. roi=True)
+            self.conn.send(("frame", (frame.shape, options)))
+            message, detail = self.conn.recv()
+        except (EOFError, BrokenPipeError, OSError) as e:
+            raise LandmarkWorkerError(f"Landmark worker {self.index} is not responding: {str(e)}")
+        if message != "ok":
+            raise LandmarkWorkerError(f"Landmark worker {self.index} error: {detail}")
+        observe_stages(detail, prefix="mediapipe_")  # Thời gian từng detector đo trong worker
+
+        if out is None:
+            return self.landmarks.copy()
+        out[...] = self.landmarks
+        return out
+
+    def start_sequence(self):
+        try:
+            self.conn.send(("start_sequence", None))
+        except (BrokenPipeError, OSError):
+            pass  # Worker đã chết: frame kế tiếp báo lỗi và pool thay worker
+
+    def _ensure_capacity(self, nbytes):
+        """Frame lớn hơn segment hiện tại: cấp segment mới vừa frame rồi báo worker chuyển sang"""
+        if nbytes <= self.frame_shm.size:
+            return
+        frame_shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        try:
+            self.conn.send(("resize", frame_shm.name))
+            message, detail = self.conn.recv()
+            if message != "ok":
+                raise LandmarkWorkerError(f"Landmark worker {self.index} error: {detail}")
+        except (EOFError, BrokenPipeError, OSError) as e:
+            frame_shm.close()
+            frame_shm.unlink()
+            raise LandmarkWorkerError(f"Landmark worker {self.index} is not responding: {str(e)}")
+        except LandmarkWorkerError:
+            frame_shm.close()
+            frame_shm.unlink()
+            raise
+        previous, self.frame_shm = self.frame_shm, frame_shm
+        previous.close()
+        previous.unlink()
+
+    @property
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def close(self):
+        try:
+            if self.process.is_alive():
+                self.conn.send(("stop", None))
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+        except (BrokenPipeError, OSError):
+            pass
+        self.conn.close()
+        del self.landmarks
+        for shm in (self.frame_shm, self.landmark_shm):
+            shm.close()
+            shm.unlink()
+
+
+class LandmarkWorkerPool:
+    """
+    Pool process MediaPipe để dùng hết số core. Mỗi request mượn một worker
+    (acquire) cho toàn bộ chuỗi frame của nó, nên trạng thái tracking không bị trộn giữa các request.
+    size = 0: dùng một LandmarkService ngay trong process API.
+    """
+
+    def __init__(self, size=LANDMARK_WORKERS, frame_bytes=LANDMARK_FRAME_BYTES,
+                 warmup_frames=LANDMARK_WARMUP_FRAMES):
+        self.size = size
+        self.frame_bytes = frame_bytes
+        self.warmup_frames = warmup_frames
+        self._ctx = mp.get_context("spawn")
+        self._workers = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            if self.size <= 0:
+                from app.services.landmark_service import LandmarkService
+                self._idle.put(LandmarkService(report_metrics=True))
+            else:
+                workers = [self._spawn(i) for i in range(self.size)]
+                for worker in workers:
+                    worker.wait_ready()
+                    self._workers.append(worker)
+                    self._idle.put(worker)
+                print(f"Started {self.size} landmark worker processes")
+            self._started = True
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """Mượn một landmarker (worker process hoặc LandmarkService trong process)"""
+        if not self._started:
+            self.start()
+        landmarker = self._idle.get(timeout=timeout)
+        landmarker.start_sequence()
+        try:
+            yield landmarker
+        except LandmarkWorkerError:
+            landmarker = self._replace(landmarker)
+            raise
+        finally:
+            if isinstance(landmarker, LandmarkWorker) and not landmarker.is_alive:
+                landmarker = self._replace(landmarker)
+            self._idle.put(landmarker)
+
+    def run(self, work, retries=1, timeout=None):
+        """
+        work(landmarker) trên một landmarker mượn từ pool. Worker chết hoặc báo lỗi giữa chừng
+        (LandmarkWorkerError) thì được thay bằng process mới và work chạy lại trên worker mới đó,
+        tối đa retries lần; work phải chạy lại được từ đầu (hoặc tiếp tục từ chỗ dừng).
+        """
+        if not self._started:
+            self.start()
+        landmarker = self._idle.get(timeout=timeout)
+        landmarker.start_sequence()
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    return work(landmarker)
+                except LandmarkWorkerError as e:
+                    print(f"Landmark extraction failed: {str(e)}")
+                    landmarker = self._replace(landmarker)
+                    if attempt == retries:
+                        raise
+        finally:
+            if isinstance(landmarker, LandmarkWorker) and not landmarker.is_alive:
+                landmarker = self._replace(landmarker)
+            self._idle.put(landmarker)
+
+    def idle_count(self):
+        return self._idle.qsize()
+
+    def shutdown(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.close()
+            self._workers = []
+            self._idle = queue.Queue()
+            self._started = False
+
+    def _spawn(self, index):
+        return LandmarkWorker(self._ctx, index, self.frame_bytes, self.warmup_frames)
+
+    def _replace(self, dead_worker):
+        print(f"Restarting landmark worker {dead_worker.index}")
+        with self._lock:
+            dead_worker.close()
+            worker = self._spawn(dead_worker.index)
+            worker.wait_ready()
+            self._workers = [w for w in self._workers if w is not dead_worker] + [worker]
+            return worker
+
+
+landmark_pool = LandmarkWorkerPool()
+
+registry.gauge("hearme_landmark_workers_idle", "Số landmarker đang rảnh trong pool MediaPipe",
+               lambda: [((), landmark_pool.idle_count())])
@@ -1,9 +1,15 @@
+import time
 import numpy as np
 import mediapipe as mp
-from app.config.settings import FILTERED_HAND, FILTERED_POSE, FILTERED_FACE
+from app.config.settings import FILTERED_HAND, FILTERED_POSE, FILTERED_FACE, ROI_MIN_FRAME_SIDE
+from app.utils import roi
+from app.services.metrics import observe_stages
+from app.utils.landmarks import (
+    LANDMARK_COUNT, POSE_OFFSET, FACE_OFFSET, DETECTORS, EMPTY_HANDS, EMPTY_POSE, EMPTY_FACE, fill_frame_landmarks
+)
 
 class LandmarkService:
-    def __init__(self):
+    def __init__(self, report_metrics=False):
         self.mp_hands = mp.solutions.hands
         self.mp_pose = mp.solutions.pose
         self.mp_face = mp.solutions.face_mesh
@@ -15,24 +21,98 @@ class LandmarkService:
         self.HAND_NUM = len(FILTERED_HAND)
         self.POSE_NUM = len(FILTERED_POSE)
         self.FACE_NUM = len(FILTERED_FACE)
+        # Thời gian (giây) mỗi detector ở frame vừa xử lý, None nếu không chạy (metrics theo bước)
+        self.timings = dict.fromkeys(DETECTORS)
+        self.graphs = {"hands": self.hands, "pose": self.pose, "face": self.face_mesh}
+        # Vùng cắt tay/mặt (roi=True) đổi vị trí theo từng frame nên không dùng graph tracking ở trên:
+        # hands/face_mesh chế độ ảnh tĩnh riêng, tạo khi dùng ROI lần đầu
+        self.roi_graphs = None
+        # (shape frame, điểm pose độ phân giải thấp) gần nhất của request đang chạy, để dựng vùng ở frame
+        # detector_stride bỏ pose; xoá bởi start_sequence() mỗi khi pool cho mượn landmarker
+        self._roi_points = None
+        # True khi chạy ngay trong process API; worker process gửi timings về cho LandmarkWorker ghi
+        self.report_metrics = report_metrics
 
-    def get_frame_landmarks(self, frame):
-        all_landmarks = np.zeros((self.HAND_NUM * 2 + self.POSE_NUM + self.FACE_NUM, 3))
+    def start_sequence(self):
+        """Bắt đầu chuỗi frame của một request mới: bỏ trạng thái giữ từ request trước"""
+        self._roi_points = None
 
-        results_hands = self.hands.process(frame)
-        if results_hands.multi_hand_landmarks:
-            for i, hand_landmarks in enumerate(results_hands.multi_hand_landmarks):
-                index = 0 if results_hands.multi_handedness[i].classification[0].index == 0 else self.HAND_NUM
-                all_landmarks[index:index+self.HAND_NUM, :] = [(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark]
+    def get_frame_landmarks(self, frame, out=None, roi=False, detectors=DETECTORS):
+        """
+        Landmark (LANDMARK_COUNT, 3) của một frame RGB; có out thì ghi thẳng vào đó (vd. một hàng của bộ đệm).
+        roi=True: với frame lớn, hands/face chỉ chạy trên vùng tay/mặt do lượt pose độ phân giải thấp tìm ra.
+        detectors: các detector được chạy ở frame này, phần của detector bị bỏ qua để 0 (xem interpolate_skipped).
+        """
+        if out is None:
+            out = np.zeros((LANDMARK_COUNT, 3), dtype=np.float32)
+        for name in DETECTORS:
+            self.timings[name] = None
+        self._detect(frame, out, roi, detectors)
+        if self.report_metrics:
+            observe_stages(self.timings, prefix="mediapipe_")
+        return out
 
-        results_pose = self.pose.process(frame)
-        if results_pose.pose_landmarks:
-            all_landmarks[self.HAND_NUM * 2:self.HAND_NUM * 2 + self.POSE_NUM, :] = np.array(
-                [(lm.x, lm.y, lm.z) for lm in results_pose.pose_landmarks.landmark])[FILTERED_POSE]
+    def _detect(self, frame, out, roi, detectors):
+        if roi and max(frame.shape[:2]) > ROI_MIN_FRAME_SIDE and ("hands" in detectors or "face" in detectors):
+            return self._get_roi_landmarks(frame, out, detectors)
 
-        results_face = self.face_mesh.process(frame)
-        if results_face.multi_face_landmarks:
-            all_landmarks[self.HAND_NUM * 2 + self.POSE_NUM:, :] = np.array(
-                [(lm.x, lm.y, lm.z) for lm in results_face.multi_face_landmarks[0].landmark])[FILTERED_FACE]
+        results_hands = self._process("hands", frame) if "hands" in detectors else EMPTY_HANDS
+        results_pose = self._process("pose", frame) if "pose" in detectors else EMPTY_POSE
+        results_face = self._process("face", frame) if "face" in detectors else EMPTY_FACE
+        return fill_frame_landmarks(results_hands, results_pose, results_face, out)
 
-        return all_landmarks 
\ No newline at end of file
+    def _process(self, name, image, graphs=None):
+        started = time.perf_counter()
+        results = (graphs or self.graphs)[name].process(image)
+        self.timings[name] = time.perf_counter() - started
+        return results
+
+    def _get_roi_static_graphs(self):
+        if self.roi_graphs is None:
+            self.roi_graphs = {
+                "hands": self.mp_hands.Hands(True, max_num_hands=2, min_detection_confidence=0.5),
+                "face": self.mp_face.FaceMesh(True, max_num_faces=1, min_detection_confidence=0.5,
+                                              refine_landmarks=True),
+            }
+        return self.roi_graphs
+
+    def _get_roi_landmarks(self, frame, out, detectors):
+        # Lượt pose độ phân giải thấp dựng vùng tay/mặt; frame mà detector_stride bỏ pose thì dùng lại
+        # điểm pose của frame gần nhất trong request (frame lấy từ frame_cache không qua đây: nếu request
+        # chưa có điểm nào thì vẫn chạy pose) thay vì chạy thêm một lượt
+        results_pose = EMPTY_POSE
+        if "pose" in detectors or self._roi_points is None or self._roi_points[0] != frame.shape:
+            results_pose = self._process("pose", roi.downscale(frame))
+            points = roi.pose_points(results_pose.pose_landmarks) if results_pose.pose_landmarks else None
+            self._roi_points = (frame.shape, points)
+            if "pose" not in detectors:
+                results_pose = EMPTY_POSE
+        points = self._roi_points[1]
+        if points is None:
+            # Không thấy người ở độ phân giải thấp: chạy như chế độ thường
+            results_hands = self._process("hands", frame) if "hands" in detectors else EMPTY_HANDS
+            results_face = self._process("face", frame) if "face" in detectors else EMPTY_FACE
+            return fill_frame_landmarks(results_hands, results_pose, results_face, out)
+
+        # Vùng nào không dựng được (điểm pose bị che/khuất) thì detector đó chạy trên cả frame (graph tracking)
+        hand_box = face_box = None
+        results_hands, results_face = EMPTY_HANDS, EMPTY_FACE
+        if "hands" in detectors:
+            hand_box = roi.hand_region(points, frame.shape)
+            if hand_box:
+                results_hands = self._process("hands", roi.crop_hands(frame, hand_box), self._get_roi_static_graphs())
+            else:
+                results_hands = self._process("hands", frame)
+        if "face" in detectors:
+            face_box = roi.face_region(points, frame.shape)
+            if face_box:
+                results_face = self._process("face", roi.crop_face(frame, face_box), self._get_roi_static_graphs())
+            else:
+                results_face = self._process("face", frame)
+
+        fill_frame_landmarks(results_hands, results_pose, results_face, out)
+        if hand_box:
+            roi.remap(out[:POSE_OFFSET], hand_box, frame.shape)
+        if face_box:
+            roi.remap(out[FACE_OFFSET:], face_box, frame.shape)
+        return out
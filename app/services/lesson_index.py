@@ -0,0 +1,69 @@
+import threading
+from app.services.roadmap_service import RoadmapService
+from app.services.model_registry import model_registry
+from app.services.embedding_store import embedding_key
+
+
+class LessonIndex:
+    """
+    Roadmap được build sẵn cùng chỉ mục (model_id, lessonPath) -> lesson và video_id -> lesson.
+    Chỉ build lại sau khi chapters/videos thay đổi (invalidate() được gọi từ API course).
+    """
+
+    def __init__(self, roadmap_service):
+        self.roadmap_service = roadmap_service
+        self._lock = threading.Lock()
+        self._roadmap = None
+        self._by_path = {}
+        self._by_video_id = {}
+        self._by_key = {}
+        self._version = 0
+        self._built_version = -1
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def get_roadmap(self):
+        self._ensure_built()
+        return self._roadmap
+
+    def find_by_path(self, model_id, lesson_path):
+        self._ensure_built()
+        return self._by_path.get((model_id, lesson_path))
+
+    def find_by_video_id(self, video_id):
+        self._ensure_built()
+        return self._by_video_id.get(video_id)
+
+    def find_by_embedding_key(self, model_id, key):
+        self._ensure_built()
+        return self._by_key.get((model_id, key))
+
+    def _ensure_built(self):
+        if self._built_version == self._version:
+            return
+        with self._lock:
+            version = self._version
+            if self._built_version == version:
+                return
+            roadmap = self.roadmap_service.get_roadmap()
+            by_path = {}
+            by_video_id = {}
+            by_key = {}
+            for chapter in roadmap.values():
+                for lesson in chapter:
+                    # Không ghi thêm vào lesson: cùng dict được trả về nguyên vẹn cho /roadmap
+                    by_path[(lesson["modelId"], lesson["path"])] = lesson
+                    by_video_id[lesson["id"]] = lesson
+                    by_key[(lesson["modelId"], embedding_key(lesson["embedding"]))] = lesson
+
+            self._roadmap = roadmap
+            self._by_path = by_path
+            self._by_video_id = by_video_id
+            self._by_key = by_key
+            self._built_version = version
+            print(f"Lesson index built: {len(by_video_id)} lessons")
+
+
+lesson_index = LessonIndex(RoadmapService(model_registry))
@@ -0,0 +1,209 @@
+import bisect
+import contextvars
+import threading
+import time
+from app.config.settings import METRICS_STAGE_BUCKETS, METRICS_REQUEST_BUCKETS, METRICS_FRAME_BUCKETS
+from app.services.tracing import record_span
+
+
+class Histogram:
+    """Histogram đơn giản với bucket cố định (giới hạn trên, giống Prometheus), an toàn giữa các thread"""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # bucket cuối là +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def cumulative(self):
+        """([(giới hạn trên, số mẫu <= giới hạn)], tổng, số mẫu)"""
+        with self._lock:
+            counts, total_sum, total_count = list(self._counts), self._sum, self._count
+        cumulative = []
+        total = 0
+        for upper, count in zip(self.buckets + [float("inf")], counts):
+            total += count
+            cumulative.append((upper, total))
+        return cumulative, total_sum, total_count
+
+    def snapshot(self):
+        cumulative, total_sum, total_count = self.cumulative()
+        return {
+            "count": total_count,
+            "sum": total_sum,
+            "mean": total_sum / total_count if total_count else 0.0,
+            "buckets": [{"le": "+Inf" if upper == float("inf") else upper, "count": c} for upper, c in cumulative],
+        }
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class HistogramFamily:
+    """Các Histogram cùng tên, mỗi bộ giá trị nhãn một Histogram (tạo khi dùng lần đầu)"""
+
+    def __init__(self, name, documentation, buckets, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, histogram in sorted(self._children.items()):
+            cumulative, total_sum, total_count = histogram.cumulative()
+            for upper, count in cumulative:
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(upper)}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{labels} {total_count}")
+        return lines
+
+
+class CallbackFamily:
+    """Gauge/counter đọc từ get_stats() của service lúc scrape: callback() -> [(giá trị nhãn, giá trị)]"""
+
+    def __init__(self, name, documentation, labelnames, callback, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in self.callback():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Tập metric xuất ra ở định dạng text của Prometheus"""
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, documentation, buckets, labelnames=()):
+        return self._register(HistogramFamily(name, documentation, buckets, labelnames))
+
+    def gauge(self, name, documentation, callback, labelnames=(), kind="gauge"):
+        return self._register(CallbackFamily(name, documentation, labelnames, callback, kind))
+
+    def render(self):
+        with self._lock:
+            families = list(self._families.values())
+        lines = []
+        for family in families:
+            try:
+                lines.extend(family.render())
+            except Exception as e:
+                print(f"Error collecting metric {family.name}: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+    def _register(self, family):
+        with self._lock:
+            # Đăng ký lại cùng tên (vd. reload module) thì thay family cũ
+            self._families[family.name] = family
+        return family
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "hearme_stage_seconds",
+    "Thời gian từng bước của đường chấm điểm (decode, MediaPipe, predict, similarity, ghi tiến trình)",
+    METRICS_STAGE_BUCKETS, ("stage", "model_id"))
+request_seconds = registry.histogram(
+    "hearme_request_seconds",
+    "Thời gian xử lý một request chấm điểm/nhận dạng (không tính thời gian chờ trong hàng đợi)",
+    METRICS_REQUEST_BUCKETS, ("endpoint", "model_id", "frames"))
+
+# model_id của request đang chạy, để các bước không biết model (decode, landmark) vẫn gắn được nhãn
+_model_label = contextvars.ContextVar("metrics_model_id", default="")
+
+
+def frames_label(frames):
+    """Nhãn frames của histogram request: giới hạn trên nhỏ nhất của METRICS_FRAME_BUCKETS chứa frames"""
+    index = bisect.bisect_left(METRICS_FRAME_BUCKETS, frames)
+    return str(METRICS_FRAME_BUCKETS[index]) if index < len(METRICS_FRAME_BUCKETS) else "+Inf"
+
+
+def bind_model_id(model_id):
+    """Gắn nhãn model_id cho các bước chạy sau đó trong context hiện tại (vd. cả phiên WebSocket)"""
+    return _model_label.set(str(model_id))
+
+
+def observe_stage(stage, seconds, model_id=None):
+    """Ghi thời gian một bước vào histogram, và thành một span nếu request đang được trace"""
+    stage_seconds.labels(stage, str(model_id) if model_id is not None else _model_label.get()).observe(seconds)
+    record_span(stage, seconds)
+
+
+def observe_stages(timings, prefix=""):
+    """timings: {tên bước: giây} (vd. LandmarkService.timings), bước không chạy có giá trị None"""
+    model_id = _model_label.get()
+    for stage, seconds in timings.items():
+        if seconds is not None:
+            stage_seconds.labels(prefix + stage, model_id).observe(seconds)
+            record_span(prefix + stage, seconds)
+
+
+class RequestMetrics:
+    """
+    Đo một request: gắn model_id cho các bước chạy bên trong (ContextVar) và ghi request_seconds khi kết thúc.
+        with RequestMetrics("process-video", model_id) as request:
+            ...
+            request.frames = len(landmarks)
+    """
+
+    def __init__(self, endpoint, model_id):
+        self.endpoint = endpoint
+        self.model_id = str(model_id)
+        self.frames = 0
+        self._token = None
+        self._started = None
+
+    def __enter__(self):
+        self._token = bind_model_id(self.model_id)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self._started
+        _model_label.reset(self._token)
+        if exc_type is None:
+            request_seconds.labels(self.endpoint, self.model_id, frames_label(self.frames)).observe(elapsed)
+        return False
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from app.services.model_service import ModelService
+from app.config.settings import MODEL_CACHE_MAX_MB
+from app.services.metrics import registry
+
+
+class ModelRegistry:
+    """
+    Giữ mỗi model (theo model_id) trong bộ nhớ, chỉ load một lần.
+    - Entry được thay thế nguyên khối (atomic swap) nên request đang chạy vẫn dùng handle cũ an toàn
+    - Khi tổng bộ nhớ vượt ngân sách thì loại model ít dùng nhất (LRU)
+    """
+
+    def __init__(self, max_bytes=MODEL_CACHE_MAX_MB * 1024 * 1024, loader=ModelService):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self._entries = OrderedDict()  # model_id -> ModelService
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "load_errors": 0,
+            "evictions": 0,
+            "load_time_total": 0.0,
+            "load_time_last": {},
+        }
+
+    def get(self, model_id):
+        """Trả về ModelService của model_id, load từ DB/đĩa nếu chưa có"""
+        with self._lock:
+            service = self._entries.get(model_id)
+            if service is not None:
+                self._entries.move_to_end(model_id)
+                self._stats["hits"] += 1
+                return service
+            load_lock = self._load_locks.setdefault(model_id, threading.Lock())
+
+        # Chỉ một thread load cùng một model, các thread khác đợi rồi dùng lại kết quả
+        with load_lock:
+            with self._lock:
+                service = self._entries.get(model_id)
+                if service is not None:
+                    self._entries.move_to_end(model_id)
+                    self._stats["hits"] += 1
+                    return service
+                self._stats["misses"] += 1
+
+            service = self._load(model_id)
+            self._install(model_id, service)
+            return service
+
+    def reload(self, model_id):
+        """Load lại model (vd. sau khi đổi file .keras) rồi thay entry cũ"""
+        load_lock = self._get_load_lock(model_id)
+        with load_lock:
+            service = self._load(model_id)
+            self._install(model_id, service)
+            return service
+
+    def evict(self, model_id):
+        with self._lock:
+            removed = self._entries.pop(model_id, None)
+            self._sizes.pop(model_id, None)
+            if removed is not None:
+                self._stats["evictions"] += 1
+        if removed is not None:
+            removed.close()
+        return removed is not None
+
+    def loaded_model_ids(self):
+        with self._lock:
+            return list(self._entries.keys())
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "load_time_last": dict(self._stats["load_time_last"]),
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "loaded_models": list(self._entries.keys()),
+                "memory_bytes": sum(self._sizes.values()),
+                "memory_budget_bytes": self.max_bytes,
+            }
+
+    def get_batching_stats(self):
+        with self._lock:
+            services = dict(self._entries)
+        return {model_id: service.get_batching_stats() for model_id, service in services.items()}
+
+    def _get_load_lock(self, model_id):
+        with self._lock:
+            return self._load_locks.setdefault(model_id, threading.Lock())
+
+    def _load(self, model_id):
+        start = time.perf_counter()
+        try:
+            service = self.loader(model_id)
+        except Exception:
+            with self._lock:
+                self._stats["load_errors"] += 1
+            raise
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats["loads"] += 1
+            self._stats["load_time_total"] += elapsed
+            self._stats["load_time_last"][model_id] = elapsed
+        print(f"Model {model_id} loaded in {elapsed:.2f}s")
+        return service
+
+    def _install(self, model_id, service):
+        size = service.estimate_memory_bytes()
+        retired = []
+        with self._lock:
+            previous = self._entries.get(model_id)
+            if previous is not None and previous is not service:
+                retired.append(previous)
+            self._entries[model_id] = service
+            self._entries.move_to_end(model_id)
+            self._sizes[model_id] = size
+
+            # Luôn giữ lại model vừa được cài đặt, kể cả khi nó một mình vượt ngân sách
+            while sum(self._sizes.values()) > self.max_bytes and len(self._entries) > 1:
+                evicted_id, evicted = self._entries.popitem(last=False)
+                self._sizes.pop(evicted_id, None)
+                retired.append(evicted)
+                self._stats["evictions"] += 1
+                print(f"Evicted model {evicted_id} from registry (LRU)")
+
+        # Request đang chạy vẫn giữ handle cũ; batcher đã đóng sẽ predict trực tiếp
+        for old_service in retired:
+            old_service.close()
+
+
+model_registry = ModelRegistry()
+
+registry.gauge("hearme_inference_pending", "Số tensor đang chờ gom batch inference theo model",
+               lambda: [((model_id,), stats["pending"])
+                        for model_id, stats in model_registry.get_batching_stats().items() if stats],
+               ("model_id",))
+registry.gauge("hearme_models_loaded", "Số model đang được giữ trong registry",
+               lambda: [((), len(model_registry.get_stats()["loaded_models"]))])
@@ -1,15 +1,47 @@
+import os
+import json
+import threading
+import time
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.metrics import CosineSimilarity
-from app.database.connection import execute_query
+from app.config.settings import DEFAULT_MODEL_OPTIONS, MODEL_OPTIONS
+from app.services.inference_batcher import InferenceBatcher
+from app.services.tensor_pool import LandmarkTensor, LandmarkTensorPool
+from app.services.early_exit import EarlyExitPolicy
+from app.services.metrics import observe_stage
+from app.services.tracing import span
+from app.utils.landmarks import DETECTORS
+from app.services.similarity import similarity_score
+from app.services.inference_backend import (
+    create_backend, tflite_path_for, quantized_variant_approved, TFLiteBackend
+)
 from datetime import datetime
 from fastapi import Request
 
 class ModelService:
-    def __init__(self):
-        self.model = None
-        self.config = None
-        self.load_config_and_model()
+    """
+    Handle cho một model đã load. Không tạo trực tiếp trong request,
+    lấy qua model_registry.get(model_id) để dùng chung giữa các request.
+    """
+
+    def __init__(self, model_id=1, config=None, model=None, backend=None):
+        self.model_id = model_id
+        self.model = model
+        self.config = config
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
+        # backend truyền vào (vd. tools so sánh keras/tflite) được giữ nguyên, không bị biến thể lượng tử hoá thay
+        self.explicit_backend = backend is not None
+        self.backend_name = backend or self.options["inference_backend"]
+        self.quantized_variant = None
+        if self.config is None:
+            self.load_config_and_model(model_id)
+        else:
+            self.select_quantized_variant()
+            if self.model is None and self.needs_keras_model():
+                self.load_keras_model()
+        self.backend = create_backend(self.backend_name, self.model, self.config['target_shape'],
+                                      model_file=self.config['model_file'], model_path=self.tflite_path())
+        self.input_buffers = LandmarkTensorPool(self.config['target_shape'])
 
     def load_config_and_model(self, model_id=1):
         query = """
@@ -17,7 +49,11 @@ class ModelService:
             FROM models
             WHERE id = %s
         """
-        config = execute_query(query, (model_id,), fetch_one=True)
+        # Import khi dùng: tools chạy với model giả (không DB) không cần SQLAlchemy
+        from app.database.connection import execute_query
+
+        with span("db.model_config", model_id=model_id):
+            config = execute_query(query, (model_id,), fetch_one=True)
         if not config:
             raise Exception(f"Model with ID {model_id} not found in database")
 
@@ -27,6 +63,7 @@ class ModelService:
         except ValueError as e:
             raise Exception(f"Invalid target_shape format: {str(e)}")
 
+        self.model_id = model_id
         self.config = {
             "model_file": config['model_file'],
             "embedding_dir": config['embedding_dir'],
@@ -34,38 +71,167 @@ class ModelService:
             "target_shape": target_shape
         }
 
+        self.select_quantized_variant()
+        if self.needs_keras_model():
+            self.load_keras_model()
+
+    def select_quantized_variant(self):
+        """
+        Dùng biến thể lượng tử hoá (options["quantized_variant"]) nếu nó đã qua kiểm tra độ chính xác.
+        Chỉ áp dụng khi không chỉ định backend khi tạo ModelService.
+        """
+        variant = self.options["quantized_variant"]
+        if not variant or self.explicit_backend:
+            return
+        approved, reason = quantized_variant_approved(self.config['model_file'], variant)
+        if approved:
+            self.quantized_variant = variant
+            self.backend_name = TFLiteBackend.name
+            print(f"Model {self.model_id}: using quantized variant {variant}")
+        else:
+            print(f"Model {self.model_id}: quantized variant {variant} not activated ({reason})")
+
+    def tflite_path(self):
+        return tflite_path_for(self.config['model_file'], self.quantized_variant)
+
+    def needs_keras_model(self):
+        """Backend TFLite đã có file .tflite mới nhất thì không cần load cả model Keras/TensorFlow"""
+        if self.backend_name != TFLiteBackend.name:
+            return True
+        if self.quantized_variant:
+            return False
+        return TFLiteBackend.needs_export(self.config['model_file'], self.tflite_path())
+
+    def load_keras_model(self):
+        # Chỉ import TensorFlow khi thật sự cần model Keras (backend TFLite đã export thì không)
+        from tensorflow.keras.models import load_model
+
         try:
             print(f"Loading model from: {self.config['model_file']}")
             self.model = load_model(self.config['model_file'])
         except Exception as e:
             raise Exception(f"Error loading model file: {str(e)}")
 
+    @property
+    def options(self):
+        """Tuỳ chọn runtime của model (settings.MODEL_OPTIONS), đã gộp với giá trị mặc định"""
+        return {**DEFAULT_MODEL_OPTIONS, **MODEL_OPTIONS.get(self.model_id, {})}
+
+    def estimate_memory_bytes(self):
+        """Ước lượng bộ nhớ của model (float32 weights), dùng cho ngân sách LRU của registry"""
+        try:
+            return int(self.model.count_params()) * 4
+        except Exception:
+            model_file = self.config.get('model_file') if self.config else None
+            if self.backend_name == TFLiteBackend.name and model_file:
+                model_file = self.tflite_path()
+            if model_file and os.path.exists(model_file):
+                return os.path.getsize(model_file)
+            return 0
+
+    def prepare_input(self, video_landmarks):
+        """Đưa chuỗi landmark về tensor (1, *target_shape) mới: cắt bớt hoặc pad 0 cho đủ số frame"""
+        return LandmarkTensor(self.config['target_shape']).fill(video_landmarks).tensor
+
+    def predict_batch(self, inputs):
+        """Một lần forward cho batch (n, *target_shape) -> embedding (n, dim)"""
+        return self.backend.predict(inputs)
+
+    @property
+    def batcher(self):
+        if self._batcher is None:
+            with self._batcher_lock:
+                if self._batcher is None:
+                    self._batcher = InferenceBatcher(self.predict_batch, name=str(self.model_id))
+        return self._batcher
+
     def extract_embedding(self, video_landmarks):
-        video_landmarks = np.array(video_landmarks)
-        target_shape = self.config['target_shape']
-        
-        if video_landmarks.shape[0] < target_shape[0]:
-            padding = target_shape[0] - video_landmarks.shape[0]
-            video_landmarks = np.pad(video_landmarks, ((0, padding), (0, 0), (0, 0)), mode='constant')
-        else:
-            video_landmarks = video_landmarks[:target_shape[0], :, :]
-            
-        video_landmarks = np.reshape(video_landmarks, (1, *target_shape))
-        return self.model.predict(video_landmarks)
+        """
+        Embedding (1, dim) của chuỗi landmark. Nhận LandmarkTensor đã được ghi sẵn (không copy),
+        hoặc mảng (frames, điểm, 3) sẽ được chép vào một tensor mượn từ input_buffers.
+        """
+        if isinstance(video_landmarks, LandmarkTensor):
+            return self._predict(video_landmarks.tensor)
+        with self.input_buffers.acquire() as buffer:
+            return self._predict(buffer.fill(video_landmarks).tensor)
+
+    def _predict(self, inputs):
+        started = time.perf_counter()
+        # Khi gom batch, thời gian gồm cả lúc chờ trong InferenceBatcher
+        embedding = self.batcher.predict(inputs) if self.options["batching"] else self.predict_batch(inputs)
+        observe_stage("predict", time.perf_counter() - started, self.model_id)
+        return embedding
+
+    def get_batching_stats(self):
+        return self._batcher.get_stats() if self._batcher is not None else None
+
+    def close(self):
+        """Dừng các thread nền của model (gọi khi registry loại model ra)"""
+        if self._batcher is not None:
+            self._batcher.close()
+
+    @property
+    def landmark_options(self):
+        """Tham số landmark theo model, chuyển cho LandmarkService.get_frame_landmarks"""
+        return {"roi": self.options["landmark_detection"] == "roi"}
 
-    def calculate_similarity(self, embedding1, embedding2):
-        cosine_similarity = CosineSimilarity()
-        similarity = cosine_similarity(embedding1, embedding2)
-        return float(similarity.numpy())
+    @property
+    def detector_stride(self):
+        """Số frame giữa hai lần chạy của mỗi detector (options["detector_stride"], thiếu thì = 1)"""
+        return {name: max(1, int(self.options["detector_stride"].get(name, 1))) for name in DETECTORS}
+
+    @property
+    def early_exit(self):
+        """EarlyExitPolicy theo options["early_exit"], None nếu luôn chấm trên cả chuỗi frame"""
+        return EarlyExitPolicy.from_options(self.options)
+
+    @property
+    def cache_version(self):
+        """
+        Chuỗi định danh kết quả chấm của model (dùng trong khoá result_cache): đổi file model,
+        biến thể lượng tử, tuỳ chọn hay ngưỡng thì kết quả cũ trong cache không còn được dùng
+        """
+        model_file = self.config.get('model_file')
+        if self.backend_name == TFLiteBackend.name and model_file:
+            model_file = self.tflite_path()
+        mtime = os.path.getmtime(model_file) if model_file and os.path.exists(model_file) else None
+        return json.dumps({
+            "model_id": self.model_id,
+            "model_file": model_file,
+            "mtime": mtime,
+            "backend": self.backend_name,
+            "quantized_variant": self.quantized_variant,
+            "options": self.options,
+            "threshold": self.threshold,
+        }, sort_keys=True, default=str)
+
+    @property
+    def similarity_metric(self):
+        return self.options["similarity_metric"]
+
+    @property
+    def threshold(self):
+        """Ngưỡng Match của metric đang dùng (options["threshold"] ghi đè giá trị trong bảng models)"""
+        override = self.options["threshold"]
+        return float(override) if override is not None else self.config['threshold']
+
+    def calculate_similarity(self, embedding1, embedding2, normalized=False):
+        started = time.perf_counter()
+        similarity = similarity_score(embedding1, embedding2, self.similarity_metric, normalized)
+        observe_stage("similarity", time.perf_counter() - started, self.model_id)
+        return similarity
 
     def get_similarity_status(self, similarity, user_id: int = None, video_id: int = None):
-        threshold = self.config['threshold']
+        threshold = self.threshold
         status = "Match!" if similarity >= threshold else "Not Match"
         
         print(f"Checking match with threshold {threshold}: similarity={similarity}, status={status}")
         print(f"User ID: {user_id}, Video ID: {video_id}")
         
         if status == "Match!" and user_id is not None and video_id is not None:
+            from app.database.connection import execute_query
+
+            started = time.perf_counter()
             try:
                 print(f"Attempting to save progress for user {user_id} on video {video_id}")
                 insert_progress = """
@@ -77,7 +243,8 @@ class ModelService:
                 params = (user_id, video_id, True, current_time)
                 print(f"Executing query with params: {params}")
                 
-                result = execute_query(insert_progress, params)
+                with span("db.save_progress"):
+                    result = execute_query(insert_progress, params)
                 print(f"Query executed. Result: {result}")
                 
                 # Verify if the record was actually saved
@@ -85,7 +252,8 @@ class ModelService:
                     SELECT * FROM user_video_progress 
                     WHERE user_id = %s AND video_id = %s
                 """
-                verify_result = execute_query(verify_query, (user_id, video_id), fetch_one=True)
+                with span("db.verify_progress"):
+                    verify_result = execute_query(verify_query, (user_id, video_id), fetch_one=True)
                 print(f"Verification query result: {verify_result}")
                 
                 if verify_result:
@@ -99,5 +267,6 @@ class ModelService:
                 import traceback
                 print(f"Full traceback: {traceback.format_exc()}")
                 # Continue with returning status even if saving progress fails
+            observe_stage("progress_write", time.perf_counter() - started, self.model_id)
                 
         return status 
\ No newline at end of file
@@ -0,0 +1,73 @@
+import numpy as np
+from app.database.connection import execute_query
+from app.services.similarity import normalize
+from app.services.tracing import span
+
+
+class RecognitionService:
+    """Nhận dạng ký hiệu: so embedding của người dùng với mọi embedding tham chiếu của model"""
+
+    def __init__(self, embedding_store, lesson_index):
+        self.embedding_store = embedding_store
+        self.lesson_index = lesson_index
+
+    def top_k(self, model_service, user_embedding, k):
+        """k embedding tham chiếu giống nhất: [(key, similarity)], một lần nhân ma trận cho cả tập"""
+        embeddings = self.embedding_store.get_model(model_service.model_id)
+        if embeddings is None or len(embeddings) == 0:
+            return []
+
+        query = normalize(user_embedding)
+        # Tập lớn: chỉ mục IVF thu hẹp ứng viên, sau đó vẫn chấm điểm chính xác bằng metric của model
+        rows = self.embedding_store.candidate_rows(embeddings, query, k)
+        if rows is not None and len(rows) == 0:
+            return []
+
+        scores = embeddings.similarities(query, model_service.similarity_metric, rows)
+        # len(embeddings): hàng bị overlay thay (điểm -inf) không bao giờ lọt vào top k
+        k = min(k, len(scores), len(embeddings))
+        # argpartition O(n) rồi chỉ sắp xếp k phần tử tốt nhất
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            return [(embeddings.keys[rows[i]], float(scores[i])) for i in top]
+        return [(embeddings.keys[i], float(scores[i])) for i in top]
+
+    def recognize(self, model_service, user_embedding, k, include_below_threshold=False):
+        threshold = model_service.threshold
+        candidates = self.top_k(model_service, user_embedding, k)
+        if not include_below_threshold:
+            candidates = [(key, score) for key, score in candidates if score >= threshold]
+
+        vocabularies = self.find_vocabularies([key for key, _ in candidates])
+        roadmap_service = self.lesson_index.roadmap_service
+        matches = []
+        for key, score in candidates:
+            lesson = self.lesson_index.find_by_embedding_key(model_service.model_id, key)
+            matches.append({
+                "name": roadmap_service.clean_label(key),
+                "similarity": score,
+                "isMatch": score >= threshold,
+                "videoId": lesson["id"] if lesson else None,
+                "path": lesson["path"] if lesson else None,
+                "vocabulary": vocabularies.get(key),
+            })
+        return matches
+
+    def find_vocabularies(self, keys):
+        """Từ vựng ứng với các video (cột video_url của vocabularies là tên file video mẫu)"""
+        if not keys:
+            return {}
+        placeholders = ", ".join(["%s"] * len(keys))
+        query = f"""
+            SELECT id, word, meaning, video_url, image_url, topic_id
+            FROM vocabularies
+            WHERE video_url IN ({placeholders})
+        """
+        try:
+            with span("db.vocabularies", keys=len(keys)):
+                rows = execute_query(query, tuple(f"{key}.mp4" for key in keys))
+        except Exception as e:
+            print(f"Error fetching vocabularies for recognition: {str(e)}")
+            return {}
+        return {row['video_url'].rsplit('.', 1)[0]: row for row in rows}
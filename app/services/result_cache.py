@@ -0,0 +1,164 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+from app.config.settings import FRAME_CACHE_MAX_MB, FRAME_CACHE_TTL, RESULT_CACHE_MAX_MB, RESULT_CACHE_TTL
+from app.services.metrics import registry
+
+DIGEST_SIZE = 16
+ENTRY_OVERHEAD = 200  # Ước lượng byte cho khoá, tuple và OrderedDict của mỗi mục
+
+
+def frame_digest(encoded):
+    """Hash nội dung một frame đã mã hoá (chuỗi base64 hoặc bytes/memoryview JPEG/WebP)"""
+    if isinstance(encoded, str):
+        encoded = encoded.encode()
+    return hashlib.blake2b(encoded, digest_size=DIGEST_SIZE).digest()
+
+
+def request_digest(model_version, video_id, reference_embedding, frame_digests):
+    """Khoá của một lần chấm: phiên bản model + bài học + embedding mẫu + nội dung các frame"""
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    digest.update(model_version.encode())
+    digest.update(str(video_id).encode())
+    digest.update(np.ascontiguousarray(reference_embedding, dtype=np.float32).tobytes())
+    for frame in frame_digests:
+        digest.update(frame)
+    return digest.digest()
+
+
+class TTLCache:
+    """
+    Cache LRU giới hạn theo byte, mỗi mục hết hạn sau ttl giây. sizeof(value) ước lượng kích thước một mục.
+    get_or_compute gộp các request trùng khoá đang chạy cùng lúc (vd. client gửi lại khi mạng chập chờn).
+    """
+
+    def __init__(self, max_bytes, ttl, sizeof):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (hết hạn lúc, value, byte)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expired = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self.ttl > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                self._remove(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        size = self.sizeof(value) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is not None or not self.enabled:
+            return value if value is not None else compute()
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+
+# Mức 1: nội dung frame -> landmark (LANDMARK_COUNT, 3), dùng chung giữa các request
+frame_cache = TTLCache(FRAME_CACHE_MAX_MB * 1024 * 1024, FRAME_CACHE_TTL, sizeof=lambda landmarks: landmarks.nbytes)
+# Mức 2: khoá request (request_digest) -> (similarity, số frame đã chấm)
+result_cache = TTLCache(RESULT_CACHE_MAX_MB * 1024 * 1024, RESULT_CACHE_TTL, sizeof=lambda result: 64)
+
+
+def _cache_metric(field):
+    caches = (("frames", frame_cache), ("results", result_cache))
+    return lambda: [((name,), cache.get_stats()[field]) for name, cache in caches]
+
+
+registry.gauge("hearme_cache_hit_ratio", "Tỉ lệ hit của cache", _cache_metric("hit_rate"), ("cache",))
+registry.gauge("hearme_cache_entries", "Số mục trong cache", _cache_metric("entries"), ("cache",))
+registry.gauge("hearme_cache_bytes", "Dung lượng ước lượng của cache", _cache_metric("bytes"), ("cache",))
+registry.gauge("hearme_cache_hits_total", "Số lần tìm thấy trong cache", _cache_metric("hits"), ("cache",),
+               kind="counter")
+registry.gauge("hearme_cache_misses_total", "Số lần không có trong cache", _cache_metric("misses"), ("cache",),
+               kind="counter")
+registry.gauge("hearme_cache_coalesced_total", "Số request trùng được gộp vào một lần tính",
+               _cache_metric("coalesced"), ("cache",), kind="counter")
+registry.gauge("hearme_cache_evictions_total", "Số mục bị loại do vượt dung lượng", _cache_metric("evictions"),
+               ("cache",), kind="counter")
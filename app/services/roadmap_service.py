@@ -1,71 +1,56 @@
 import re
 from app.database.connection import execute_query
+from app.config.settings import MODEL_DIRS
+from app.services.embedding_store import embedding_filename
+from app.services.tracing import span
 
 class RoadmapService:
-    def __init__(self, model_service):
-        self.model_service = model_service
+    def __init__(self, model_registry):
+        self.model_registry = model_registry
         # Ánh xạ model_id -> thư mục
-        self.model_config = {
-            1: {
-                "video_dir": "Family_video2",
-                "embedding_dir": "Family/reference_embedding2",
-            },
-            2: {
-                "video_dir": "Color_video2",
-                "embedding_dir": "Color_model/reference_embedding2",
-            }
-            # Thêm model khác nếu cần
-        }
+        self.model_config = MODEL_DIRS
 
     def clean_label(self, video_filename):
         raw_label_name = video_filename.split('-')[-1].split('.')[0]
         return re.sub(r'\s*\d+$', '', raw_label_name)
 
     def get_roadmap(self):
-        # Lấy tất cả chapters thuộc model_id = 1
-        chapters_query = """
-            SELECT id, name, model_id
-            FROM chapters
-            ORDER BY model_id, id
+        # Lấy tất cả chapters và videos trong một truy vấn (tránh N+1 truy vấn theo chapter)
+        query = """
+            SELECT c.id AS chapter_id, c.name AS chapter_name, c.model_id,
+                   v.id AS video_id, v.video_filename
+            FROM chapters c
+            LEFT JOIN videos v ON v.chapter_id = c.id AND v.model_id = c.model_id
+            ORDER BY c.model_id, c.id, v.video_filename
         """
-        chapters = execute_query(chapters_query)
+        with span("db.roadmap"):
+            rows = execute_query(query)
 
         roadmap = {}
-        for chapter in chapters:
-            chapter_id = chapter['id']
-            chapter_name = chapter['name']
-            model_id = chapter['model_id']
+        for row in rows:
+            model_id = row['model_id']
 
             # Lấy cấu hình thư mục tương ứng model_id
             config = self.model_config.get(model_id)
             if not config:
                 continue  # bỏ qua nếu không có cấu hình
 
-            videos_query = """
-                SELECT id, video_filename
-                FROM videos
-                WHERE model_id = %s AND chapter_id = %s
-                ORDER BY video_filename
-            """
-            videos = execute_query(videos_query, (model_id, chapter_id))
-
-            chapter_videos = []
-            for video in videos:
-                video_filename = video['video_filename']
-                base = video_filename.split('.')[0]
-                label = self.clean_label(video_filename)
-                public_path = f"/{config['video_dir']}/{video_filename}".replace("Family/", "")
-                embedding_path = f"{config['embedding_dir']}/{base}_embedding.npy"
-
-                chapter_videos.append({
-                    "id": video['id'],  # Thêm video_id vào mỗi lesson
-                    "name": label,
-                    "path": public_path,
-                    "embedding": embedding_path,
-                    "modelId": model_id
-                })
-
             # Thêm model_id vào tên chương
-            roadmap[f"{model_id}-{chapter_name}"] = chapter_videos
-
-        return roadmap 
\ No newline at end of file
+            chapter_videos = roadmap.setdefault(f"{model_id}-{row['chapter_name']}", [])
+            if row['video_id'] is None:
+                continue  # chương chưa có video
+
+            video_filename = row['video_filename']
+            label = self.clean_label(video_filename)
+            public_path = f"/{config['video_dir']}/{video_filename}".replace("Family/", "")
+            embedding_path = f"{config['embedding_dir']}/{embedding_filename(video_filename)}"
+
+            chapter_videos.append({
+                "id": row['video_id'],  # Thêm video_id vào mỗi lesson
+                "name": label,
+                "path": public_path,
+                "embedding": embedding_path,
+                "modelId": model_id
+            })
+
+        return roadmap
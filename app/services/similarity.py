@@ -0,0 +1,56 @@
+import numpy as np
+
+EPSILON = 1e-12
+
+
+def as_matrix(embeddings):
+    """(dim,) hoặc (n, dim) -> mảng float32 (n, dim)"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return embeddings.reshape(1, -1) if embeddings.ndim == 1 else embeddings.reshape(len(embeddings), -1)
+
+
+def normalize(embeddings):
+    """Chuẩn hoá L2 từng hàng (giống tf.math.l2_normalize)"""
+    embeddings = as_matrix(embeddings)
+    norms = np.sqrt(np.maximum(np.einsum("ij,ij->i", embeddings, embeddings), EPSILON))
+    return embeddings / norms[:, None]
+
+
+def cosine_similarity(a, b, normalized=False):
+    """Cosine giữa mọi cặp hàng của a (m, dim) và b (n, dim) -> (m, n), một lần nhân ma trận"""
+    if not normalized:
+        a, b = normalize(a), normalize(b)
+    return as_matrix(a) @ as_matrix(b).T
+
+
+def l2_similarity(a, b, normalized=False):
+    """1 / (1 + khoảng cách Euclid) giữa mọi cặp hàng -> (m, n), càng lớn càng giống"""
+    a, b = as_matrix(a), as_matrix(b)
+    if not normalized:
+        a, b = normalize(a), normalize(b)
+    # ||a - b||² = ||a||² + ||b||² - 2 a·b, phần a·b là một lần gọi BLAS
+    squared = np.einsum("ij,ij->i", a, a)[:, None] + np.einsum("ij,ij->i", b, b)[None, :] - 2.0 * (a @ b.T)
+    return 1.0 / (1.0 + np.sqrt(np.maximum(squared, 0.0)))
+
+
+SIMILARITY_METRICS = {
+    "cosine": cosine_similarity,
+    "l2": l2_similarity,
+}
+
+
+def get_metric(name):
+    metric = SIMILARITY_METRICS.get(name)
+    if metric is None:
+        raise ValueError(f"Unknown similarity metric '{name}', expected one of {list(SIMILARITY_METRICS)}")
+    return metric
+
+
+def pairwise_similarity(a, b, metric="cosine", normalized=False):
+    """Một-với-một, một-với-nhiều hoặc nhiều-với-nhiều: luôn trả về ma trận (m, n)"""
+    return get_metric(metric)(a, b, normalized=normalized)
+
+
+def similarity_score(a, b, metric="cosine", normalized=False):
+    """Độ tương đồng giữa hai embedding đơn -> float"""
+    return float(pairwise_similarity(a, b, metric, normalized)[0, 0])
@@ -0,0 +1,90 @@
+import threading
+from contextlib import contextmanager
+import numpy as np
+from app.config.settings import INPUT_BUFFER_POOL_SIZE
+from app.utils.landmarks import LANDMARK_COUNT
+
+
+class LandmarkTensor:
+    """
+    Tensor đầu vào (1, *target_shape) float32 của một request, được LandmarkService ghi từng frame.
+    Các frame chưa ghi luôn bằng 0 nên không cần pad; dùng lại qua LandmarkTensorPool.
+    """
+
+    def __init__(self, target_shape):
+        self.tensor = np.zeros((1, *target_shape), dtype=np.float32)
+        # View (frames, điểm, 3) trên cùng bộ nhớ: mỗi hàng là landmark của một frame
+        self.frames = self.tensor.reshape(target_shape[0], LANDMARK_COUNT, 3)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return len(self.frames)
+
+    @property
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def next_slot(self):
+        """Hàng sẽ được ghi frame kế tiếp"""
+        if self.is_full:
+            raise IndexError(f"Landmark tensor is full ({self.capacity} frames)")
+        return self.frames[self.count]
+
+    def commit(self):
+        self.count += 1
+
+    def fill(self, landmarks):
+        """Chép chuỗi landmark (frames, điểm, 3) có sẵn vào tensor, phần vượt quá số frame của model bị bỏ"""
+        count = min(len(landmarks), self.capacity)
+        self.frames[:count] = np.asarray(landmarks[:count]).reshape(count, LANDMARK_COUNT, 3)
+        self.frames[count:self.count] = 0
+        self.count = count
+        return self
+
+    def reset(self):
+        # Chỉ xoá các frame đã ghi, phần còn lại vẫn là 0
+        self.frames[:self.count] = 0
+        self.count = 0
+
+
+class LandmarkTensorPool:
+    """Các LandmarkTensor rảnh của một model; hết thì cấp phát thêm, giữ lại tối đa max_idle tensor"""
+
+    def __init__(self, target_shape, max_idle=INPUT_BUFFER_POOL_SIZE):
+        self.target_shape = tuple(target_shape)
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.in_use = 0
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            tensor = self._idle.pop() if self._idle else None
+            if tensor is None:
+                self.created += 1
+            self.in_use += 1
+        if tensor is None:
+            tensor = LandmarkTensor(self.target_shape)
+        try:
+            yield tensor
+        finally:
+            tensor.reset()
+            with self._lock:
+                self.in_use -= 1
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(tensor)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "created": self.created,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "tensor_bytes": int(np.prod(self.target_shape)) * 4,
+            }
@@ -0,0 +1,266 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from app.config.settings import (
+    SLOW_REQUEST_MS, SLOW_REQUEST_LOG_FILE, SLOW_REQUEST_LOG_MAX_BYTES, SLOW_REQUEST_LOG_BACKUPS, TRACE_MAX_SPANS
+)
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_span_depth = contextvars.ContextVar("span_depth", default=0)
+
+
+class Trace:
+    """Các span của một request; thread decode (context được copy) ghi vào cùng một Trace"""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started_at = datetime.utcnow()
+        self.origin = time.perf_counter()
+        self.spans = []  # (tên, bắt đầu, thời gian, độ sâu, attrs, lỗi)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, name, started, duration, depth, attrs, error=False):
+        with self._lock:
+            if len(self.spans) >= TRACE_MAX_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append((name, started, duration, depth, attrs, error))
+
+    def to_dict(self, duration, error=None):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span[1])
+        return {
+            "time": self.started_at.isoformat() + "Z",
+            "request": self.name,
+            "attrs": self.attrs,
+            "duration_ms": round(duration * 1000, 3),
+            "error": error,
+            "dropped_spans": self.dropped,
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": round((started - self.origin) * 1000, 3),
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "depth": depth,
+                    **({"attrs": attrs} if attrs else {}),
+                    **({"error": True} if failed else {}),
+                }
+                for name, started, elapsed, depth, attrs, failed in spans
+            ],
+        }
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attrs", "started", "token")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.token = _span_depth.set(_span_depth.get() + 1)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self.started
+        _span_depth.reset(self.token)
+        self.trace.add(self.name, self.started, duration, _span_depth.get(), self.attrs, exc_type is not None)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, **attrs):
+    """Đo một bước trong request đang được trace; ngoài request thì không làm gì"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _Span(trace, name, attrs)
+
+
+def record_span(name, seconds, **attrs):
+    """Ghi một bước đã đo xong (vd. từ metrics.observe_stage), kết thúc ngay lúc gọi"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, time.perf_counter() - seconds, seconds, _span_depth.get(), attrs)
+
+
+_slow_logger = None
+_slow_logger_lock = threading.Lock()
+
+
+def _get_slow_logger():
+    global _slow_logger
+    if _slow_logger is None:
+        with _slow_logger_lock:
+            if _slow_logger is None:
+                os.makedirs(os.path.dirname(SLOW_REQUEST_LOG_FILE), exist_ok=True)
+                handler = RotatingFileHandler(SLOW_REQUEST_LOG_FILE, maxBytes=SLOW_REQUEST_LOG_MAX_BYTES,
+                                              backupCount=SLOW_REQUEST_LOG_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger = logging.getLogger("hearme.slow_requests")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.addHandler(handler)
+                _slow_logger = logger
+    return _slow_logger
+
+
+class RequestTrace:
+    """
+    Trace một request chấm điểm/nhận dạng. Request lâu hơn SLOW_REQUEST_MS được ghi (một dòng JSON
+    gồm mọi span) vào SLOW_REQUEST_LOG_FILE; request cũng được báo cho profiler nếu đang profile.
+        with RequestTrace("score", model_id=1):
+            with span("extract_landmarks"):
+                ...
+    """
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.trace = None
+        self._token = None
+        self._profile = None
+
+    def __enter__(self):
+        self.trace = Trace(self.name, self.attrs)
+        self._token = _current_trace.set(self.trace)
+        self._profile = profiler.request_started()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self.trace.origin
+        _current_trace.reset(self._token)
+        if self._profile is not None:
+            profiler.request_finished(self._profile)
+        if SLOW_REQUEST_MS and duration * 1000 >= SLOW_REQUEST_MS:
+            error = f"{exc_type.__name__}: {exc}" if exc_type is not None else None
+            try:
+                _get_slow_logger().info(json.dumps(self.trace.to_dict(duration, error), ensure_ascii=False))
+                print(f"Slow request {self.name} ({duration * 1000:.0f} ms) written to {SLOW_REQUEST_LOG_FILE}")
+            except OSError as e:
+                print(f"Could not write slow request trace: {str(e)}")
+        return False
+
+
+# Khung stack của thread đang rảnh (chờ việc), bỏ qua khi lấy mẫu thread nền
+_IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"), ("thread.py", "_worker")}
+
+
+class ProfileSession:
+    def __init__(self, requests, interval):
+        self.requests = requests
+        self.interval = interval
+        self.claimed = 0
+        self.completed = 0
+        self.request_threads = set()
+        self.stacks = Counter()
+        self.samples = 0
+        self.done = threading.Event()
+        self.stopped = threading.Event()
+
+
+class SamplingProfiler:
+    """
+    Profiler lấy mẫu stack (sys._current_frames) cho N request chấm điểm tiếp theo.
+    Trong lúc có request được profile, mỗi interval lấy stack của thread xử lý request đó (kể cả lúc chờ,
+    vì chờ cũng là độ trễ) và của các thread nền đang chạy code của app (decode, gom batch inference).
+    MediaPipe chạy trong process worker nên chỉ thấy được phần chờ kết quả ở thread request.
+    Kết quả ở dạng collapsed stack ("khung;khung;khung số_mẫu"), dùng được với flamegraph.pl/speedscope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+
+    def start(self, requests, interval):
+        with self._lock:
+            if self._session is not None:
+                raise RuntimeError("A profiling session is already running")
+            session = self._session = ProfileSession(requests, interval)
+        threading.Thread(target=self._sample_loop, args=(session,), name="profiler", daemon=True).start()
+        return session
+
+    def collect(self, session, timeout):
+        """Chờ đủ số request (hoặc hết timeout) rồi trả về profile dạng collapsed stack"""
+        session.done.wait(timeout)
+        session.stopped.set()
+        with self._lock:
+            if self._session is session:
+                self._session = None
+            stacks = dict(session.stacks)
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+    def request_started(self):
+        """Session profile nhận request đang bắt đầu ở thread hiện tại, None nếu không profile"""
+        session = self._session
+        if session is None:
+            return None
+        with self._lock:
+            if self._session is not session or session.claimed >= session.requests:
+                return None
+            session.claimed += 1
+            session.request_threads.add(threading.get_ident())
+            return session
+
+    def request_finished(self, session):
+        with self._lock:
+            session.request_threads.discard(threading.get_ident())
+            session.completed += 1
+            if session.completed >= session.requests:
+                session.done.set()
+
+    def _sample_loop(self, session):
+        own = threading.get_ident()
+        while not session.stopped.wait(session.interval):
+            with self._lock:
+                request_threads = set(session.request_threads)
+            if not request_threads:
+                continue
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = self._collapse(frame, ident in request_threads)
+                if stack is not None:
+                    kind = "request" if ident in request_threads else names.get(ident, "thread")
+                    with self._lock:
+                        session.stacks[f"{kind};{stack}"] += 1
+                        session.samples += 1
+
+    @staticmethod
+    def _collapse(frame, is_request):
+        frames = []
+        in_app = False
+        while frame is not None:
+            code = frame.f_code
+            filename = code.co_filename
+            in_app = in_app or f"{os.sep}app{os.sep}" in filename
+            frames.append((os.path.basename(filename), code.co_name, code.co_firstlineno))
+            frame = frame.f_back
+        if not is_request and (not in_app or frames[0][:2] in _IDLE_FRAMES):
+            return None
+        return ";".join(f"{name} ({filename}:{line})" for filename, name, line in reversed(frames))
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,206 @@
+import operator
+from itertools import chain
+from types import SimpleNamespace
+import numpy as np
+from app.config.settings import FILTERED_HAND, FILTERED_POSE, FILTERED_FACE, FRAMES_LIMIT
+
+HAND_NUM = len(FILTERED_HAND)
+POSE_NUM = len(FILTERED_POSE)
+FACE_NUM = len(FILTERED_FACE)
+LANDMARK_COUNT = HAND_NUM * 2 + POSE_NUM + FACE_NUM
+
+# Thứ tự các điểm trong một frame: tay phải, tay trái, pose, face (giống LandmarkService)
+LANDMARK_LAYOUT = f"hand:{HAND_NUM}x2,pose:{POSE_NUM},face:{FACE_NUM}"
+POSE_OFFSET = HAND_NUM * 2
+FACE_OFFSET = POSE_OFFSET + POSE_NUM
+
+# Chỉ số cần lấy trong kết quả của từng detector MediaPipe, tính sẵn một lần
+HAND_INDICES = tuple(FILTERED_HAND)
+POSE_INDICES = tuple(FILTERED_POSE)
+FACE_INDICES = tuple(FILTERED_FACE)
+_XYZ = operator.attrgetter("x", "y", "z")
+
+# Các detector MediaPipe và phần của mảng landmark do mỗi detector ghi
+DETECTOR_PARTS = {
+    "hands": (slice(0, HAND_NUM), slice(HAND_NUM, POSE_OFFSET)),
+    "pose": (slice(POSE_OFFSET, FACE_OFFSET),),
+    "face": (slice(FACE_OFFSET, LANDMARK_COUNT),),
+}
+DETECTORS = tuple(DETECTOR_PARTS)
+
+# Kết quả rỗng thay cho detector bị bỏ qua ở một frame
+EMPTY_HANDS = SimpleNamespace(multi_hand_landmarks=None, multi_handedness=None)
+EMPTY_POSE = SimpleNamespace(pose_landmarks=None)
+EMPTY_FACE = SimpleNamespace(multi_face_landmarks=None)
+
+LANDMARK_DTYPES = {
+    "float16": np.float16,
+    "float32": np.float32,
+}
+
+
+def copy_landmarks(landmarks, indices, out):
+    """
+    Chép (x, y, z) của các điểm indices trong danh sách landmark MediaPipe vào out (len(indices), 3).
+    Chỉ đọc các điểm được lọc, không dựng mảng trung gian cho cả 478 điểm face mesh.
+    """
+    values = np.fromiter(chain.from_iterable(map(_XYZ, map(landmarks.__getitem__, indices))),
+                         dtype=out.dtype, count=len(indices) * 3)
+    out[...] = values.reshape(len(indices), 3)
+    return out
+
+
+def fill_frame_landmarks(results_hands, results_pose, results_face, out):
+    """Ghi kết quả hands/pose/face của một frame vào out (LANDMARK_COUNT, 3); phần không phát hiện được = 0"""
+    out[...] = 0
+    if results_hands.multi_hand_landmarks:
+        for i, hand_landmarks in enumerate(results_hands.multi_hand_landmarks):
+            index = 0 if results_hands.multi_handedness[i].classification[0].index == 0 else HAND_NUM
+            copy_landmarks(hand_landmarks.landmark, HAND_INDICES, out[index:index + HAND_NUM])
+    if results_pose.pose_landmarks:
+        copy_landmarks(results_pose.pose_landmarks.landmark, POSE_INDICES, out[POSE_OFFSET:FACE_OFFSET])
+    if results_face.multi_face_landmarks:
+        copy_landmarks(results_face.multi_face_landmarks[0].landmark, FACE_INDICES, out[FACE_OFFSET:])
+    return out
+
+
+def detector_schedule(count, stride, anchors=()):
+    """
+    {detector: mảng bool (count,)}: detector chạy ở frame i nếu i chia hết cho stride của nó.
+    Frame cuối (và các frame anchors, vd. frame cuối của mỗi checkpoint) luôn được chạy
+    để các frame bị bỏ được nội suy giữa hai frame thật.
+    """
+    schedule = {}
+    anchors = [i for i in anchors if 0 <= i < count]
+    for name in DETECTORS:
+        ran = np.zeros(count, dtype=bool)
+        ran[::max(1, int(stride.get(name, 1)))] = True
+        ran[anchors] = True
+        if count:
+            ran[-1] = True
+        schedule[name] = ran
+    return schedule
+
+
+def interpolate_skipped(frames, schedule):
+    """
+    Lấp các frame mà detector bị bỏ qua (frames: (count, điểm, 3), ghi tại chỗ) bằng nội suy tuyến tính
+    giữa hai frame gần nhất detector có chạy. Nếu chỉ một trong hai frame đó phát hiện được (tay vừa
+    xuất hiện/biến mất) thì lấy theo frame gần hơn; không frame nào phát hiện thì giữ 0.
+    """
+    for name, ran in schedule.items():
+        if ran.all():
+            continue
+        run_frames = np.flatnonzero(ran)
+        for part in DETECTOR_PARTS[name]:
+            values = frames[:, part]
+            for prev, nxt in zip(run_frames[:-1], run_frames[1:]):
+                gap = nxt - prev
+                if gap <= 1:
+                    continue
+                start, end = values[prev], values[nxt]
+                if start.any() and end.any():
+                    weights = (np.arange(1, gap, dtype=np.float32) / gap)[:, None, None]
+                    values[prev + 1:nxt] = start + (end - start) * weights
+                else:
+                    middle = prev + gap // 2
+                    values[prev + 1:middle + 1] = start
+                    values[middle + 1:nxt] = end
+    return frames
+
+
+def max_landmark_frames(target_shape):
+    """Số frame tối đa của một tensor landmark: số frame của model nhưng không quá FRAMES_LIMIT"""
+    return min(target_shape[0], FRAMES_LIMIT)
+
+
+def describe_layout(target_shape):
+    """Mô tả layout để client (MediaPipe trên trình duyệt) tạo tensor đúng định dạng"""
+    return {
+        "layout": LANDMARK_LAYOUT,
+        "target_shape": list(target_shape),
+        "max_frames": max_landmark_frames(target_shape),
+        "dtypes": list(LANDMARK_DTYPES),
+        "hand": FILTERED_HAND,
+        "pose": FILTERED_POSE,
+        "face": FILTERED_FACE,
+    }
+
+
+def parse_landmark_tensor(body, dtype_name, shape_str, layout, target_shape):
+    """
+    Đọc tensor landmark (frames, điểm, toạ độ) do client gửi lên và kiểm tra chặt
+    với target_shape của model. Trả về mảng float32, lỗi thì raise ValueError.
+    """
+    if layout != LANDMARK_LAYOUT:
+        raise ValueError(f"Unsupported landmark layout '{layout}', expected '{LANDMARK_LAYOUT}'")
+
+    dtype = LANDMARK_DTYPES.get(dtype_name)
+    if dtype is None:
+        raise ValueError(f"Unsupported dtype '{dtype_name}', expected one of {list(LANDMARK_DTYPES)}")
+
+    try:
+        shape = tuple(int(x) for x in shape_str.strip("()").replace(" ", "").split(","))
+    except ValueError:
+        raise ValueError(f"Invalid shape '{shape_str}'")
+
+    if len(target_shape) != 3 or target_shape[1] != LANDMARK_COUNT:
+        raise ValueError(f"Model target_shape {target_shape} does not use the {LANDMARK_LAYOUT} layout")
+    if len(shape) != 3 or shape[1:] != tuple(target_shape[1:]):
+        raise ValueError(f"Shape {shape} does not match model input (frames, {target_shape[1]}, {target_shape[2]})")
+    max_frames = max_landmark_frames(target_shape)
+    if not 1 <= shape[0] <= max_frames:
+        raise ValueError(f"Frame count must be between 1 and {max_frames}, got {shape[0]}")
+
+    expected_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if len(body) != expected_bytes:
+        raise ValueError(f"Body has {len(body)} bytes, expected {expected_bytes} for {dtype_name}{shape}")
+
+    landmarks = np.frombuffer(body, dtype=dtype).reshape(shape)
+    if not np.isfinite(landmarks).all():
+        raise ValueError("Landmarks contain NaN or infinite values")
+
+    return landmarks.astype(np.float32)
+
+
+class LandmarkRingBuffer:
+    """Bộ đệm vòng cấp phát sẵn cho landmark của các frame gần nhất (dùng cho luồng streaming)"""
+
+    def __init__(self, capacity, landmark_shape=(LANDMARK_COUNT, 3)):
+        self.capacity = capacity
+        self.buffer = np.zeros((capacity, *landmark_shape), dtype=np.float32)
+        self.count = 0  # Tổng số frame đã ghi
+        self.since_score = 0  # Số frame mới kể từ lần chấm điểm gần nhất
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def next_slot(self):
+        """Hàng sẽ được ghi frame kế tiếp (ghi đè frame cũ nhất khi đầy)"""
+        return self.buffer[self.count % self.capacity]
+
+    def commit(self):
+        self.count += 1
+        self.since_score += 1
+
+    def append(self, landmarks):
+        self.next_slot()[...] = landmarks
+        self.commit()
+
+    def ordered(self):
+        """Các frame trong cửa sổ theo thứ tự thời gian"""
+        if self.count <= self.capacity:
+            return self.buffer[:self.count]
+        start = self.count % self.capacity
+        return np.concatenate((self.buffer[start:], self.buffer[:start]))
+
+    def mark_scored(self):
+        self.since_score = 0
+
+    def clear(self):
+        self.count = 0
+        self.since_score = 0
@@ -0,0 +1,92 @@
+"""
+Vùng quan tâm (ROI) cho chế độ landmark_detection = "roi": pose chạy trên frame thu nhỏ,
+hands/face chỉ chạy trên vùng cắt quanh tay và đầu, sau đó toạ độ được đổi về cả frame.
+"""
+import numpy as np
+import cv2
+from app.config.settings import (
+    ROI_POSE_WIDTH, ROI_MIN_VISIBILITY, ROI_HAND_MARGIN, ROI_FACE_MARGIN, ROI_HAND_SIZE, ROI_FACE_SIZE
+)
+
+# Chỉ số điểm của MediaPipe Pose
+POSE_FACE_POINTS = tuple(range(11))  # mũi, mắt, tai, miệng
+POSE_SHOULDERS = (11, 12)
+POSE_HAND_POINTS = tuple(range(15, 23))  # cổ tay, ngón út, ngón trỏ, ngón cái
+
+
+def downscale(frame, width=ROI_POSE_WIDTH):
+    """Thu nhỏ frame về chiều rộng width (giữ tỉ lệ); toạ độ chuẩn hoá trên ảnh nhỏ vẫn đúng cho ảnh gốc"""
+    height, frame_width = frame.shape[:2]
+    if frame_width <= width:
+        return frame
+    return cv2.resize(frame, (width, max(1, round(height * width / frame_width))), interpolation=cv2.INTER_AREA)
+
+
+def pose_points(pose_landmarks):
+    """(33, 4): x, y, z, visibility của kết quả Pose"""
+    return np.array([(lm.x, lm.y, lm.z, lm.visibility) for lm in pose_landmarks.landmark], dtype=np.float32)
+
+
+def region(points, indices, margin, frame_shape):
+    """
+    Hộp pixel (x0, y0, x1, y1) bao các điểm indices đủ visibility, nới mỗi phía margin lần độ rộng vai
+    và cắt theo frame; None nếu không có điểm nào hoặc hộp rỗng.
+    """
+    height, width = frame_shape[:2]
+    selected = points[list(indices)]
+    selected = selected[selected[:, 3] >= ROI_MIN_VISIBILITY]
+    if len(selected) == 0:
+        return None
+
+    left, right = points[POSE_SHOULDERS[0]], points[POSE_SHOULDERS[1]]
+    shoulder_width = np.hypot((left[0] - right[0]) * width, (left[1] - right[1]) * height)
+    pad = margin * max(shoulder_width, 0.1 * min(width, height))
+
+    x0 = int(max(0, selected[:, 0].min() * width - pad))
+    y0 = int(max(0, selected[:, 1].min() * height - pad))
+    x1 = int(min(width, np.ceil(selected[:, 0].max() * width + pad)))
+    y1 = int(min(height, np.ceil(selected[:, 1].max() * height + pad)))
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        return None
+    return x0, y0, x1, y1
+
+
+def hand_region(points, frame_shape):
+    return region(points, POSE_HAND_POINTS, ROI_HAND_MARGIN, frame_shape)
+
+
+def face_region(points, frame_shape):
+    return region(points, POSE_FACE_POINTS, ROI_FACE_MARGIN, frame_shape)
+
+
+def crop(frame, box, max_side):
+    """Cắt vùng box, thu nhỏ nếu cạnh dài hơn max_side; luôn trả về mảng liên tục cho MediaPipe"""
+    x0, y0, x1, y1 = box
+    patch = frame[y0:y1, x0:x1]
+    scale = max_side / max(patch.shape[:2])
+    if scale < 1:
+        size = (max(1, round(patch.shape[1] * scale)), max(1, round(patch.shape[0] * scale)))
+        return cv2.resize(patch, size, interpolation=cv2.INTER_AREA)
+    return np.ascontiguousarray(patch)
+
+
+def crop_hands(frame, box):
+    return crop(frame, box, ROI_HAND_SIZE)
+
+
+def crop_face(frame, box):
+    return crop(frame, box, ROI_FACE_SIZE)
+
+
+def remap(landmarks, box, frame_shape):
+    """
+    Đổi landmark (n, 3) chuẩn hoá theo vùng cắt về toạ độ chuẩn hoá của cả frame, tại chỗ.
+    z của MediaPipe cùng thang với x nên được nhân cùng tỉ lệ; hàng toàn 0 (không phát hiện) giữ nguyên.
+    """
+    x0, y0, x1, y1 = box
+    height, width = frame_shape[:2]
+    detected = landmarks.any(axis=1)
+    landmarks[detected, 0] = (x0 + landmarks[detected, 0] * (x1 - x0)) / width
+    landmarks[detected, 1] = (y0 + landmarks[detected, 1] * (y1 - y0)) / height
+    landmarks[detected, 2] *= (x1 - x0) / width
+    return landmarks
@@ -0,0 +1,64 @@
+import os
+import numpy as np
+import cv2
+from app.config.settings import BASE_DIR
+from app.utils.landmarks import LANDMARK_COUNT
+
+
+def list_videos(video_dir):
+    """Các file .mp4 trong thư mục video mẫu, sắp xếp theo tên"""
+    if not os.path.isabs(video_dir):
+        video_dir = os.path.join(BASE_DIR, video_dir)
+    return sorted(
+        os.path.join(video_dir, name) for name in os.listdir(video_dir) if name.lower().endswith(".mp4")
+    )
+
+
+def read_video_frames(video_path, limit=None):
+    """Đọc các frame RGB của một video (tối đa limit frame)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Error opening video: {video_path}")
+    frames = []
+    try:
+        while limit is None or len(frames) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    finally:
+        cap.release()
+    return frames
+
+
+def extract_video_landmarks(video_path, landmarker, limit=None):
+    """Landmark (frames, điểm, 3) của một video, giống cách tạo embedding tham chiếu"""
+    frames = read_video_frames(video_path, limit)
+    landmarks = np.zeros((len(frames), LANDMARK_COUNT, 3), dtype=np.float32)
+    for frame, out in zip(frames, landmarks):
+        landmarker.get_frame_landmarks(frame, out=out)
+    return landmarks
+
+
+def load_reference_landmarks(video_dir, landmarker=None, limit=None, cache_file=None):
+    """
+    Landmark của tất cả video mẫu trong thư mục: {tên video không đuôi: mảng landmark}.
+    MediaPipe rất chậm nên kết quả được lưu vào cache_file (.npz) để các công cụ dùng lại.
+    """
+    if cache_file and os.path.exists(cache_file):
+        with np.load(cache_file) as data:
+            return {key: data[key] for key in data.files}
+
+    if landmarker is None:
+        from app.services.landmark_service import LandmarkService
+        landmarker = LandmarkService()
+
+    landmarks = {}
+    for video_path in list_videos(video_dir):
+        key = os.path.basename(video_path).split('.')[0]
+        landmarks[key] = extract_video_landmarks(video_path, landmarker, limit)
+        print(f"Extracted {len(landmarks[key])} frames of landmarks from {key}")
+
+    if cache_file:
+        np.savez_compressed(cache_file, **landmarks)
+    return landmarks
@@ -0,0 +1,47 @@
+import sys
+import textwrap
+import pytest
+
+# MediaPipe giả: pose trả về điểm mã hoá nội dung frame (pixel cuối, kích thước) để kiểm tra frame tới nguyên vẹn.
+# Pixel đầu = 255: process thoát ngay (worker chết), nếu có file FAKE_MEDIAPIPE_CRASH_ONCE thì chỉ chết một lần.
+FAKE_MEDIAPIPE = textwrap.dedent('''
+    import os
+    from types import SimpleNamespace
+
+
+    class _Graph:
+        def __init__(self, kind):
+            self.kind = kind
+
+        def process(self, image):
+            if image[0, 0, 0] == 255:
+                marker = os.environ.get("FAKE_MEDIAPIPE_CRASH_ONCE")
+                if not marker or os.path.exists(marker):
+                    if marker:
+                        os.remove(marker)
+                    os._exit(1)
+            if self.kind != "pose":
+                return SimpleNamespace(multi_hand_landmarks=None, multi_handedness=None,
+                                       multi_face_landmarks=None)
+            point = SimpleNamespace(x=image[-1, -1, 0] / 255.0, y=image.shape[0] / 10000.0,
+                                    z=image.shape[1] / 10000.0, visibility=1.0)
+            return SimpleNamespace(pose_landmarks=SimpleNamespace(landmark=[point] * 33))
+
+
+    solutions = SimpleNamespace(
+        hands=SimpleNamespace(Hands=lambda *args, **kwargs: _Graph("hands")),
+        pose=SimpleNamespace(Pose=lambda *args, **kwargs: _Graph("pose")),
+        face_mesh=SimpleNamespace(FaceMesh=lambda *args, **kwargs: _Graph("face")),
+    )
+''')
+
+
+@pytest.fixture
+def fake_mediapipe(tmp_path, monkeypatch):
+    """Cài package mediapipe giả lên sys.path (process worker spawn cũng thấy vì nhận sys.path của cha)"""
+    package = tmp_path / "fake_site" / "mediapipe"
+    package.mkdir(parents=True)
+    (package / "__init__.py").write_text(FAKE_MEDIAPIPE, encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path / "fake_site"))
+    for name in [name for name in sys.modules if name == "mediapipe" or name == "app.services.landmark_service"]:
+        monkeypatch.delitem(sys.modules, name)
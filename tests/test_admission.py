@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.services.admission import ScoringQueue
+
+
+async def hold(queue, entered, release, deadline_ms=None):
+    async with queue.slot(deadline_ms):
+        entered.set()
+        await release.wait()
+
+
+async def rejection(queue, deadline_ms=None):
+    with pytest.raises(HTTPException) as error:
+        async with queue.slot(deadline_ms):
+            pass
+    return error.value
+
+
+def test_admits_and_releases():
+    async def scenario():
+        queue = ScoringQueue(concurrency=2, max_queue=2, default_deadline_ms=10000)
+        for _ in range(3):
+            async with queue.slot() as waited:
+                assert waited == pytest.approx(0, abs=0.1)
+                assert queue.active == 1
+        return queue.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["admitted"] == stats["completed"] == 3
+    assert stats["active"] == stats["queue_depth"] == 0
+
+
+def test_full_queue_answers_429():
+    async def scenario():
+        queue = ScoringQueue(concurrency=1, max_queue=1, default_deadline_ms=10000)
+        entered, release = asyncio.Event(), asyncio.Event()
+        running = asyncio.create_task(hold(queue, entered, release))
+        await entered.wait()
+        waiting = asyncio.create_task(hold(queue, asyncio.Event(), release))
+        while queue.waiting < 1:
+            await asyncio.sleep(0)
+
+        error = await rejection(queue)
+        release.set()
+        await asyncio.gather(running, waiting)
+        return error, queue.get_stats()
+
+    error, stats = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+    assert stats["rejected_queue_full"] == 1
+    assert stats["admitted"] == stats["completed"] == 2
+
+
+def test_expected_wait_over_deadline_answers_503():
+    async def scenario():
+        queue = ScoringQueue(concurrency=1, max_queue=4, default_deadline_ms=10000)
+        queue.avg_service_time = 2.0
+        entered, release = asyncio.Event(), asyncio.Event()
+        running = asyncio.create_task(hold(queue, entered, release))
+        await entered.wait()
+
+        error = await rejection(queue, deadline_ms=3000)
+        release.set()
+        await running
+        return error, queue.get_stats()
+
+    error, stats = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == "2"
+    assert stats["rejected_deadline"] == 1
+
+
+def test_deadline_expired_while_queued_answers_503():
+    async def scenario():
+        queue = ScoringQueue(concurrency=1, max_queue=4, default_deadline_ms=10000)
+        queue.avg_service_time = 0.01
+        entered, release = asyncio.Event(), asyncio.Event()
+        running = asyncio.create_task(hold(queue, entered, release))
+        await entered.wait()
+
+        error = await rejection(queue, deadline_ms=100)
+        waiting = queue.waiting
+        release.set()
+        await running
+        return error, waiting, queue.get_stats()
+
+    error, waiting, stats = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert "expired" in error.detail
+    assert waiting == 0
+    assert stats["timed_out"] == 1
+    assert stats["admitted"] == stats["completed"] == 1
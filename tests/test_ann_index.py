@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from app.services.ann_index import IVFIndex
+from app.services.similarity import normalize
+
+
+def clustered_vectors(count=2000, clusters=40, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = centers[rng.integers(clusters, size=count)] + 0.3 * rng.standard_normal((count, dim))
+    return normalize(vectors.astype(np.float32))
+
+
+def exact_top(vectors, query, k):
+    return set(np.argsort(-(vectors @ normalize(query)[0]))[:k])
+
+
+def test_recall_against_brute_force():
+    vectors = clustered_vectors()
+    keys = [f"video-{i}" for i in range(len(vectors))]
+    index = IVFIndex.build(keys, vectors, nprobe=8)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), 50, replace=False)] + 0.05 * rng.standard_normal((50, 32))
+
+    recall = []
+    for query in queries.astype(np.float32):
+        ids, scores = index.search(query[None], 10)
+        assert np.all(np.diff(scores) <= 1e-6)
+        recall.append(len(set(ids) & exact_top(vectors, query[None], 10)) / 10)
+    assert np.mean(recall) >= 0.9
+
+
+def test_search_with_every_list_is_exact():
+    vectors = clustered_vectors(count=300)
+    index = IVFIndex.build([str(i) for i in range(len(vectors))], vectors)
+    query = vectors[7:8]
+
+    ids, scores = index.search(query, 5, nprobe=index.nlist)
+    assert set(ids) == exact_top(vectors, query, 5)
+    assert ids[0] == 7
+    assert scores[0] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    vectors = clustered_vectors(count=500)
+    keys = [f"video-{i}" for i in range(len(vectors))]
+    index = IVFIndex.build(keys, vectors, nprobe=4)
+    index.add("extra", vectors[:1] * 2)
+    path = tmp_path / "ann.npz"
+    index.save(str(path))
+
+    loaded = IVFIndex.load(str(path))
+    assert loaded.keys == index.keys
+    assert loaded.nprobe == 4
+    assert loaded.built_size == 500
+    assert "extra" in loaded
+    np.testing.assert_array_equal(loaded.centroids, index.centroids)
+    np.testing.assert_array_equal(loaded.vectors, index.vectors)
+    for query in vectors[::50]:
+        expected = index.search(query[None], 10)
+        actual = loaded.search(query[None], 10)
+        np.testing.assert_array_equal(actual[0], expected[0])
+        np.testing.assert_allclose(actual[1], expected[1])
+
+
+def test_add_to_copy_leaves_original_unchanged():
+    vectors = clustered_vectors(count=200)
+    index = IVFIndex.build([str(i) for i in range(len(vectors))], vectors)
+    copy = index.copy()
+    copy.add("new", vectors[3:4])
+    copy.add("0", vectors[3:4])
+
+    assert "new" in copy and "new" not in index
+    assert len(index) == 200 and len(copy) == 201
+    np.testing.assert_allclose(index.vectors[0], vectors[0], atol=1e-6)
+    np.testing.assert_allclose(copy.vectors[0], vectors[3], atol=1e-6)
+    assert sum(len(rows) for rows in copy._lists) == 201
+    assert not copy.needs_rebuild()
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from app.services.embedding_file import (
+    EmbeddingFile, dequantize, embedding_file_name, find_embedding_files, is_embedding_file, write_embedding_file
+)
+from app.services.similarity import normalize
+
+TOLERANCE = {"float32": 1e-6, "float16": 1e-3, "int8": 1e-2}
+
+
+def matrix(count=20, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_round_trip(tmp_path, dtype):
+    values = matrix()
+    keys = [f"{i}-WORD" for i in range(len(values))]
+    video_ids = list(range(100, 100 + len(values)))
+    path = write_embedding_file(str(tmp_path / embedding_file_name(3)), keys, values, dtype=dtype,
+                                model_version=3, video_ids=video_ids, metadata={"model_file": "Family.keras"})
+
+    embedding_file = EmbeddingFile(path)
+    assert embedding_file.dtype == dtype
+    assert embedding_file.model_version == 3
+    assert (len(embedding_file), embedding_file.dim) == values.shape
+    assert embedding_file.keys == keys
+    assert embedding_file.video_ids == video_ids
+    assert embedding_file.metadata == {"model_file": "Family.keras"}
+    assert embedding_file.vectors.ctypes.data % 64 == 0
+    restored = dequantize(embedding_file.vectors, embedding_file.scales)
+    np.testing.assert_allclose(restored, normalize(values), atol=TOLERANCE[dtype])
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / embedding_file_name(1)
+    path.write_bytes(b"\x00" * 128)
+    with pytest.raises(ValueError, match="not an embedding store file"):
+        EmbeddingFile(str(path))
+
+
+def test_unknown_dtype(tmp_path):
+    with pytest.raises(ValueError, match="Unknown embedding dtype"):
+        write_embedding_file(str(tmp_path / embedding_file_name(1)), ["a"], matrix(1), dtype="bfloat16")
+
+
+def test_find_embedding_files(tmp_path):
+    for version in (1, 12):
+        write_embedding_file(str(tmp_path / embedding_file_name(version)), ["a"], matrix(1))
+    (tmp_path / "a_embedding.npy").write_bytes(b"")
+
+    assert find_embedding_files(str(tmp_path)) == {
+        1: str(tmp_path / embedding_file_name(1)),
+        12: str(tmp_path / embedding_file_name(12)),
+    }
+    assert is_embedding_file(embedding_file_name(12))
+    assert not is_embedding_file("a_embedding.npy")
@@ -0,0 +1,57 @@
+import numpy as np
+from app.config.settings import EMBEDDING_SUFFIX
+from app.services.embedding_store import ReferenceEmbeddingStore
+
+MODEL_ID = 99
+
+
+def write_embedding(directory, key, value, dim=8):
+    np.save(directory / f"{key}{EMBEDDING_SUFFIX}", np.full((1, dim), value, dtype=np.float32))
+
+
+def new_store(directory):
+    return ReferenceEmbeddingStore({MODEL_ID: {"embedding_dir": str(directory)}}, watch_interval=0)
+
+
+def test_add_video_after_reload(tmp_path):
+    write_embedding(tmp_path, "a", 1.0)
+    store = new_store(tmp_path)
+    store.reload(MODEL_ID)
+    write_embedding(tmp_path, "b", 2.0)
+
+    assert store.add_video(MODEL_ID, "b.mp4", video_id=7)
+    assert store.get(MODEL_ID, "b")[0, 0] == 2.0
+    assert store.key_for_video(MODEL_ID, 7) == "b"
+    assert store.get(MODEL_ID, "a")[0, 0] == 1.0
+
+
+def test_add_video_during_reload_is_kept(tmp_path):
+    write_embedding(tmp_path, "a", 1.0)
+    store = new_store(tmp_path)
+    store.reload(MODEL_ID)
+    load_directory = store._load_directory
+
+    def slow_load(model_id, directory):
+        # Thư mục đã được đọc xong thì video mới mới được đăng ký
+        embeddings = load_directory(model_id, directory)
+        write_embedding(tmp_path, "b", 2.0)
+        assert store.add_video(MODEL_ID, "b.mp4", video_id=7)
+        return embeddings
+
+    store._load_directory = slow_load
+    embeddings = store.reload(MODEL_ID)
+
+    assert sorted(embeddings.keys) == ["a", "b"]
+    assert store.get(MODEL_ID, "b")[0, 0] == 2.0
+    assert store.key_for_video(MODEL_ID, 7) == "b"
+    assert not store._added
+
+
+def test_add_video_rejects_other_dimension(tmp_path):
+    write_embedding(tmp_path, "a", 1.0)
+    store = new_store(tmp_path)
+    store.reload(MODEL_ID)
+    write_embedding(tmp_path, "b", 2.0, dim=4)
+
+    assert not store.add_video(MODEL_ID, "b.mp4")
+    assert store.get(MODEL_ID, "b") is None
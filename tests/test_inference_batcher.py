@@ -0,0 +1,77 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from app.services.inference_batcher import InferenceBatcher
+
+
+class RecordingModel:
+    """predict: embedding = 10 x tensor, ghi lại kích thước từng batch"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, inputs):
+        with self.lock:
+            self.batches.append(len(inputs))
+        time.sleep(self.delay)
+        return inputs.reshape(len(inputs), -1) * 10
+
+
+def tensor(value):
+    return np.full((1, 4, 3), value, dtype=np.float32)
+
+
+def test_concurrent_requests_get_their_own_embedding():
+    model = RecordingModel(delay=0.005)
+    batcher = InferenceBatcher(model, max_batch=8, max_wait_ms=20)
+    try:
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            outputs = list(executor.map(lambda i: batcher.predict(tensor(i)), range(200)))
+    finally:
+        batcher.close()
+
+    for i, output in enumerate(outputs):
+        assert output.shape == (1, 12)
+        np.testing.assert_array_equal(output, np.full((1, 12), i * 10, dtype=np.float32))
+    assert sum(model.batches) == 200
+    assert max(model.batches) <= 8
+    assert max(model.batches) > 1
+
+
+def test_single_request_is_not_held_for_max_wait():
+    batcher = InferenceBatcher(RecordingModel(), max_batch=8, max_wait_ms=1000)
+    try:
+        started = time.perf_counter()
+        batcher.predict(tensor(1))
+        assert time.perf_counter() - started < 0.5
+    finally:
+        batcher.close()
+
+
+def test_predict_error_reaches_every_request_of_the_batch():
+    def failing(inputs):
+        time.sleep(0.01)
+        raise RuntimeError("boom")
+
+    batcher = InferenceBatcher(failing, max_batch=4, max_wait_ms=20)
+    try:
+        futures = [batcher.submit(tensor(i)) for i in range(6)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="boom"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_closed_batcher_predicts_directly():
+    model = RecordingModel()
+    batcher = InferenceBatcher(model, max_batch=4, max_wait_ms=20)
+    batcher.close()
+
+    output = batcher.predict(tensor(3))
+    np.testing.assert_array_equal(output, np.full((1, 12), 30, dtype=np.float32))
+    assert model.batches == [1]
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from app.services.landmark_pool import LandmarkWorkerPool, LandmarkWorkerError
+from app.utils.landmarks import POSE_OFFSET
+
+
+@pytest.fixture
+def pool(fake_mediapipe, tmp_path, monkeypatch):
+    crash_marker = tmp_path / "crash-once"
+    crash_marker.touch()
+    monkeypatch.setenv("FAKE_MEDIAPIPE_CRASH_ONCE", str(crash_marker))
+    pool = LandmarkWorkerPool(size=1, frame_bytes=1920 * 1080 * 3, warmup_frames=1)
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+
+def frame(height, width, value):
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[-1, -1, 0] = value
+    return image
+
+
+def test_frame_larger_than_1080p_is_processed(pool):
+    with pool.acquire() as worker:
+        small = worker.get_frame_landmarks(frame(480, 640, 51))
+        large = worker.get_frame_landmarks(frame(2160, 3840, 102))
+        again = worker.get_frame_landmarks(frame(1080, 1920, 153))
+
+    assert small[POSE_OFFSET] == pytest.approx([0.2, 0.048, 0.064])
+    assert large[POSE_OFFSET] == pytest.approx([0.4, 0.216, 0.384])
+    assert again[POSE_OFFSET] == pytest.approx([0.6, 0.108, 0.192])
+    assert worker.frame_shm.size >= 2160 * 3840 * 3
+
+
+def test_run_retries_on_replacement_worker(pool):
+    crashing = frame(120, 160, 51)
+    crashing[0, 0, 0] = 255
+    first = pool._workers[0]
+
+    landmarks = pool.run(lambda worker: worker.get_frame_landmarks(crashing))
+
+    assert landmarks[POSE_OFFSET][0] == pytest.approx(0.2)
+    assert pool._workers[0] is not first
+    assert pool.idle_count() == 1
+
+
+def test_run_gives_up_after_retry(pool, monkeypatch):
+    monkeypatch.delenv("FAKE_MEDIAPIPE_CRASH_ONCE")
+    pool.shutdown()
+    pool.start()  # Worker mới không có file đánh dấu: frame crash luôn làm worker chết
+    crashing = frame(120, 160, 51)
+    crashing[0, 0, 0] = 255
+
+    with pytest.raises(LandmarkWorkerError):
+        pool.run(lambda worker: worker.get_frame_landmarks(crashing))
+
+    assert pool.idle_count() == 1
+    with pool.acquire() as worker:
+        assert worker.is_alive
+        assert worker.get_frame_landmarks(frame(120, 160, 102))[POSE_OFFSET][0] == pytest.approx(0.4)
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from app.config.settings import ROI_MIN_FRAME_SIDE
+
+
+@pytest.fixture
+def service(fake_mediapipe):
+    from app.services.landmark_service import LandmarkService
+    return LandmarkService()
+
+
+def large_frame():
+    side = ROI_MIN_FRAME_SIDE * 2
+    return np.full((side, side, 3), 128, dtype=np.uint8)
+
+
+def test_roi_reuses_pose_points_within_a_sequence(service):
+    service.start_sequence()
+    service.get_frame_landmarks(large_frame(), roi=True)
+    service.get_frame_landmarks(large_frame(), roi=True, detectors=("hands", "face"))
+
+    assert service.timings["pose"] is None
+
+
+def test_new_sequence_does_not_reuse_previous_pose_points(service):
+    service.get_frame_landmarks(large_frame(), roi=True)
+    service.start_sequence()
+    service.get_frame_landmarks(large_frame(), roi=True, detectors=("hands", "face"))
+
+    assert service.timings["pose"] is not None
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from app.config.settings import FRAMES_LIMIT
+from app.utils.landmarks import LANDMARK_COUNT, LANDMARK_LAYOUT, describe_layout, parse_landmark_tensor
+
+TARGET_SHAPE = (120, LANDMARK_COUNT, 3)
+
+
+def body(frames, dtype=np.float32):
+    return np.zeros((frames, LANDMARK_COUNT, 3), dtype=dtype).tobytes()
+
+
+def parse(frames, dtype="float32", layout=LANDMARK_LAYOUT, shape=None, data=None):
+    shape = shape or f"{frames},{LANDMARK_COUNT},3"
+    return parse_landmark_tensor(data if data is not None else body(frames), dtype, shape, layout, TARGET_SHAPE)
+
+
+def test_accepts_one_to_frames_limit():
+    assert parse(1).shape == (1, LANDMARK_COUNT, 3)
+    landmarks = parse(FRAMES_LIMIT, "float16", data=body(FRAMES_LIMIT, np.float16))
+    assert landmarks.shape == (FRAMES_LIMIT, LANDMARK_COUNT, 3)
+    assert landmarks.dtype == np.float32
+
+
+@pytest.mark.parametrize("frames", [0, FRAMES_LIMIT + 1, TARGET_SHAPE[0]])
+def test_rejects_frame_counts_out_of_bounds(frames):
+    with pytest.raises(ValueError, match="Frame count"):
+        parse(frames)
+
+
+def test_layout_reports_the_frame_limit():
+    assert describe_layout(TARGET_SHAPE)["max_frames"] == FRAMES_LIMIT
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({"layout": "hand:21"}, "layout"),
+    ({"dtype": "float64"}, "dtype"),
+    ({"shape": "10,5,3"}, "does not match"),
+    ({"shape": "ten"}, "Invalid shape"),
+    ({"data": b"\0" * 12}, "bytes"),
+])
+def test_rejects_malformed_tensors(kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        parse(10, **kwargs)
+
+
+def test_rejects_non_finite_values():
+    data = np.zeros((2, LANDMARK_COUNT, 3), dtype=np.float32)
+    data[1, 0, 0] = np.nan
+    with pytest.raises(ValueError, match="NaN"):
+        parse(2, data=data.tobytes())
@@ -0,0 +1,112 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.services import result_cache
+from app.services.result_cache import ENTRY_OVERHEAD, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache, "time", clock)
+    return clock
+
+
+def new_cache(entries=3, ttl=60):
+    return TTLCache((100 + ENTRY_OVERHEAD) * entries, ttl, sizeof=lambda value: 100)
+
+
+def test_evicts_least_recently_used_when_full(clock):
+    cache = new_cache(entries=3)
+    for key in "abc":
+        cache.put(key, key.upper())
+    assert cache.get("a") == "A"  # a mới được dùng: b là mục cũ nhất
+    cache.put("d", "D")
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["A", "C", "D"]
+    stats = cache.get_stats()
+    assert stats["entries"] == 3
+    assert stats["bytes"] == 3 * (100 + ENTRY_OVERHEAD)
+    assert stats["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = new_cache(ttl=10)
+    cache.put("a", "A")
+    clock.now += 9
+    assert cache.get("a") == "A"
+    clock.now += 2
+
+    assert cache.get("a") is None
+    assert cache.get_stats()["expired"] == 1
+    assert cache.get_stats()["bytes"] == 0
+
+
+def test_value_larger_than_cache_is_not_stored(clock):
+    cache = TTLCache(ENTRY_OVERHEAD + 50, 60, sizeof=lambda value: 100)
+    cache.put("a", "A")
+    assert cache.get("a") is None
+    assert cache.get_stats()["bytes"] == 0
+
+
+def test_disabled_cache_always_computes():
+    cache = TTLCache(0, 60, sizeof=lambda value: 100)
+    calls = []
+    assert cache.get_or_compute("a", lambda: calls.append(1) or "A") == "A"
+    assert cache.get_or_compute("a", lambda: calls.append(1) or "A") == "A"
+    assert len(calls) == 2
+
+
+def test_concurrent_identical_requests_are_coalesced():
+    cache = new_cache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "A"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(cache.get_or_compute, "a", compute) for _ in range(8)]
+        deadline = time.monotonic() + 5
+        while cache.get_stats()["coalesced"] < 7 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        release.set()
+        results = [future.result(timeout=5) for future in futures]
+
+    assert results == ["A"] * 8
+    assert len(calls) == 1
+    assert cache.get_stats()["coalesced"] == 7
+    assert cache.get("a") == "A"
+
+
+def test_compute_error_reaches_waiters_and_is_not_cached():
+    cache = new_cache()
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        raise ValueError("bad frame")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(cache.get_or_compute, "a", compute) for _ in range(4)]
+        deadline = time.monotonic() + 5
+        while cache.get_stats()["coalesced"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError, match="bad frame"):
+                future.result(timeout=5)
+
+    assert cache.get_or_compute("a", lambda: "A") == "A"
@@ -0,0 +1,3 @@
+"""
+Công cụ chạy offline (kiểm tra, lượng tử hoá, benchmark) - chạy từ thư mục gốc của repo bằng `python -m tools.<tên>`
+"""
@@ -0,0 +1,99 @@
+"""
+So sánh recall và độ trễ của chỉ mục IVF với tìm kiếm chính xác (brute force).
+
+    python -m tools.bench_ann --sizes 1000 10000 50000 --nprobe 4 8 16 --json ann_bench.json
+
+Tập dữ liệu được nhân lên từ embedding tham chiếu thật (Family/reference_embedding2): mỗi vector tổng hợp
+là một embedding thật cộng nhiễu, query là biến thể nhiễu của một vector trong tập.
+"""
+import json
+import time
+import numpy as np
+from app.services.ann_index import IVFIndex
+from app.services.embedding_store import ReferenceEmbeddingStore
+from app.services.similarity import normalize
+from tools.common import DEFAULT_EMBEDDING_DIR, new_parser
+
+
+def synthetic_set(base, size, noise, rng):
+    picks = base[rng.integers(len(base), size=size)]
+    return normalize(picks + noise * rng.standard_normal(picks.shape).astype(np.float32))
+
+
+def exact_top_k(vectors, queries, k):
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row) for row in top]
+
+
+def run(base, size, nprobes, k, queries_count, noise, seed):
+    rng = np.random.default_rng(seed)
+    vectors = synthetic_set(base, size, noise, rng)
+    keys = [str(i) for i in range(size)]
+    queries = synthetic_set(vectors, queries_count, noise / 2, rng)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(keys, vectors)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    truth = exact_top_k(vectors, queries, k)
+    exact_ms = (time.perf_counter() - start) / queries_count * 1000
+    # Độ trễ brute force cho từng query riêng lẻ (giống /recognize)
+    start = time.perf_counter()
+    for query in queries:
+        scores = vectors @ query
+        np.argpartition(-scores, k - 1)[:k]
+    exact_single_ms = (time.perf_counter() - start) / queries_count * 1000
+
+    results = []
+    for nprobe in nprobes:
+        hits = 0
+        start = time.perf_counter()
+        found = [index.search(query, k, nprobe=nprobe)[0] for query in queries]
+        ivf_ms = (time.perf_counter() - start) / queries_count * 1000
+        for ids, expected in zip(found, truth):
+            hits += len(set(ids.tolist()) & expected)
+        results.append({
+            "size": size,
+            "nlist": index.nlist,
+            "nprobe": nprobe,
+            "recall_at_k": hits / (k * queries_count),
+            "ivf_ms": ivf_ms,
+            "exact_ms": exact_single_ms,
+            "exact_batched_ms": exact_ms,
+            "build_seconds": build_seconds,
+        })
+    return results
+
+
+def main():
+    parser = new_parser(__doc__)
+    parser.add_argument("--embedding-dir", default=DEFAULT_EMBEDDING_DIR)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    store = ReferenceEmbeddingStore({0: {"embedding_dir": args.embedding_dir}}, watch_interval=0)
+    base = store.reload(0).vectors()
+
+    results = []
+    print(f"{'size':>7} {'nlist':>6} {'nprobe':>6} {'recall@k':>9} {'ivf ms':>8} {'exact ms':>9}")
+    for size in args.sizes:
+        for row in run(base, size, args.nprobe, args.k, args.queries, args.noise, args.seed):
+            results.append(row)
+            print(f"{row['size']:>7} {row['nlist']:>6} {row['nprobe']:>6} {row['recall_at_k']:>9.3f} "
+                  f"{row['ivf_ms']:>8.3f} {row['exact_ms']:>9.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
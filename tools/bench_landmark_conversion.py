@@ -0,0 +1,91 @@
+"""
+Đo chi phí chuyển kết quả MediaPipe (protobuf) sang NumPy cho một frame, không chạy MediaPipe.
+
+    python -m tools.bench_landmark_conversion
+    python -m tools.bench_landmark_conversion --frames 20000 --missing-face
+
+Kết quả hands/pose/face giả có cùng cấu trúc với MediaPipe (multi_hand_landmarks, pose_landmarks,
+multi_face_landmarks ...). So sánh cách cũ (dựng list (x, y, z) cho mọi điểm rồi fancy-index)
+với fill_frame_landmarks (chỉ đọc các điểm được lọc, ghi thẳng vào bộ đệm của caller).
+"""
+import random
+import time
+from types import SimpleNamespace
+import numpy as np
+from app.config.settings import FILTERED_POSE, FILTERED_FACE
+from app.utils.landmarks import HAND_NUM, POSE_NUM, LANDMARK_COUNT, fill_frame_landmarks
+from tools.common import new_parser
+
+POSE_POINTS = 33
+FACE_POINTS = 478  # refine_landmarks=True
+
+
+def fake_landmarks(count, rng):
+    return SimpleNamespace(landmark=[
+        SimpleNamespace(x=rng.random(), y=rng.random(), z=rng.random()) for _ in range(count)
+    ])
+
+
+def fake_results(rng, hands=2, pose=True, face=True):
+    """Kết quả giả của Hands/Pose/FaceMesh.process() cho một frame"""
+    hand_landmarks = [fake_landmarks(HAND_NUM, rng) for _ in range(hands)]
+    handedness = [SimpleNamespace(classification=[SimpleNamespace(index=i)]) for i in range(hands)]
+    results_hands = SimpleNamespace(multi_hand_landmarks=hand_landmarks or None, multi_handedness=handedness or None)
+    results_pose = SimpleNamespace(pose_landmarks=fake_landmarks(POSE_POINTS, rng) if pose else None)
+    results_face = SimpleNamespace(multi_face_landmarks=[fake_landmarks(FACE_POINTS, rng)] if face else None)
+    return results_hands, results_pose, results_face
+
+
+def legacy_convert(results_hands, results_pose, results_face):
+    """Cách chuyển đổi cũ của LandmarkService.get_frame_landmarks"""
+    all_landmarks = np.zeros((LANDMARK_COUNT, 3))
+    if results_hands.multi_hand_landmarks:
+        for i, hand_landmarks in enumerate(results_hands.multi_hand_landmarks):
+            index = 0 if results_hands.multi_handedness[i].classification[0].index == 0 else HAND_NUM
+            all_landmarks[index:index + HAND_NUM, :] = [(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark]
+    if results_pose.pose_landmarks:
+        all_landmarks[HAND_NUM * 2:HAND_NUM * 2 + POSE_NUM, :] = np.array(
+            [(lm.x, lm.y, lm.z) for lm in results_pose.pose_landmarks.landmark])[FILTERED_POSE]
+    if results_face.multi_face_landmarks:
+        all_landmarks[HAND_NUM * 2 + POSE_NUM:, :] = np.array(
+            [(lm.x, lm.y, lm.z) for lm in results_face.multi_face_landmarks[0].landmark])[FILTERED_FACE]
+    return all_landmarks
+
+
+def per_frame_us(fn, samples, repeat):
+    started = time.perf_counter()
+    for i in range(repeat):
+        fn(*samples[i % len(samples)])
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = new_parser(__doc__)
+    parser.add_argument("--frames", type=int, default=5000, help="Số frame được chuyển đổi cho mỗi cách")
+    parser.add_argument("--hands", type=int, choices=[0, 1, 2], default=2)
+    parser.add_argument("--missing-face", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    samples = [fake_results(rng, args.hands, face=not args.missing_face) for _ in range(16)]
+
+    # Hai cách phải cho cùng kết quả (cách mới ghi float32 như bộ đệm dùng khi chấm điểm)
+    out = np.zeros((LANDMARK_COUNT, 3), dtype=np.float32)
+    for sample in samples:
+        expected = legacy_convert(*sample)
+        fill_frame_landmarks(*sample, out)
+        if not np.allclose(expected, out, atol=1e-6):
+            raise SystemExit("fill_frame_landmarks does not match the legacy conversion")
+
+    legacy = per_frame_us(legacy_convert, samples, args.frames)
+    filled = per_frame_us(lambda *sample: fill_frame_landmarks(*sample, out), samples, args.frames)
+
+    print(f"{'conversion':<22} {'us/frame':>10}")
+    print(f"{'legacy (all points)':<22} {legacy:>10.1f}")
+    print(f"{'filtered, in place':<22} {filled:>10.1f}")
+    print(f"speedup: {legacy / filled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+Benchmark đường chấm điểm trên video mẫu: các video trong --video-dir được chuyển thành payload
+giống VideoProcessRequest (frame JPEG base64) ở nhiều độ phân giải, rồi đo từng bước riêng lẻ
+và cả đường end-to-end.
+
+    python -m tools.bench_scoring --fake-model --json bench.json
+    python -m tools.bench_scoring --fake-model --resolutions 640x480 1280x720 --stages end_to_end --concurrency 4
+    python -m tools.bench_scoring --model-file Family-embeded.keras --json new.json --compare bench.json
+
+Các bước (--stages):
+- decode: base64 + cv2.imdecode từng frame (decode_base64_frame)
+- landmarks: LandmarkService.get_frame_landmarks trên frame đã decode (cần MediaPipe)
+- embedding: ModelService.extract_embedding trên chuỗi landmark của một request
+- similarity: ModelService.calculate_similarity giữa embedding người dùng và embedding mẫu của chính video đó
+- end_to_end: như score_frames (decode trên thread pool + landmark_pool + embedding + similarity),
+  --concurrency request chạy cùng lúc; không qua DB nên không có bước ghi tiến trình
+--fake-model dùng FakeEmbeddingModel (tools/common.py), không cần TensorFlow hay DB.
+Embedding mẫu lấy từ --embedding-dir (như ReferenceEmbeddingStore), chỉ video có embedding mẫu mới được dùng;
+similarity (khi có bước landmarks) và end_to_end báo thêm match_rate: tỉ lệ request đạt ngưỡng của model thật.
+Không có embedding mẫu thì phải chạy với --random-references: embedding của chuỗi landmark ngẫu nhiên,
+chỉ đo được thời gian, không có match_rate.
+Không có MediaPipe thì mặc định chỉ chạy decode, embedding và similarity.
+Kết quả (frames/s, requests/s, p50/p95/p99 ms) được in ra và ghi vào --json để so sánh giữa các lần chạy
+(--compare file JSON của lần trước).
+"""
+import base64
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import cv2
+from app.config.settings import BASE_DIR, FRAMES_LIMIT
+from app.models.schemas import VideoProcessRequest
+from app.utils.landmarks import LANDMARK_COUNT
+from app.utils.video import list_videos, read_video_frames
+from app.services.embedding_store import embedding_key
+from tools.common import (
+    add_model_arguments, new_parser, load_model_service, fake_model_service, parse_target_shape,
+    load_reference_embeddings
+)
+
+STAGES = ("decode", "landmarks", "embedding", "similarity", "end_to_end")
+MEDIAPIPE_STAGES = ("landmarks", "end_to_end")
+PERCENTILES = (50, 95, 99)
+
+
+def parse_resolution(value):
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+def encode_frame(frame_rgb, resolution, quality):
+    """Frame RGB -> data URL JPEG base64 ở độ phân giải resolution, như client gửi lên"""
+    frame = cv2.resize(frame_rgb, resolution, interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpg", cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode frame")
+    return "data:image/jpeg;base64," + base64.b64encode(buffer).decode()
+
+
+def build_payloads(videos, resolutions, frames, quality, model_id):
+    """{(rộng, cao): [VideoProcessRequest]}, mỗi video mẫu một request"""
+    payloads = {resolution: [] for resolution in resolutions}
+    for path in videos:
+        video_frames = read_video_frames(path, frames)
+        lesson_path = os.path.basename(path)
+        for resolution in resolutions:
+            payloads[resolution].append(VideoProcessRequest(
+                frames=[encode_frame(frame, resolution, quality) for frame in video_frames],
+                lessonPath=lesson_path,
+                modelId=model_id,
+            ))
+    return payloads
+
+
+def summarize(stage, resolution, latencies, frames, elapsed, requests=None):
+    """latencies: giây mỗi lần đo (mỗi frame hoặc mỗi request); elapsed: tổng thời gian tường"""
+    latencies_ms = np.asarray(latencies) * 1000
+    result = {
+        "stage": stage,
+        "resolution": f"{resolution[0]}x{resolution[1]}" if resolution else None,
+        "samples": len(latencies_ms),
+        "frames": frames,
+        "seconds": elapsed,
+        "frames_per_second": frames / elapsed if elapsed and frames else None,
+        "requests_per_second": requests / elapsed if elapsed and requests else None,
+        "latency_ms": {"mean": float(latencies_ms.mean()) if len(latencies_ms) else None},
+    }
+    for p in PERCENTILES:
+        result["latency_ms"][f"p{p}"] = float(np.percentile(latencies_ms, p)) if len(latencies_ms) else None
+    return result
+
+
+def timed(fn, items):
+    """Gọi fn(item) tuần tự, trả về (kết quả, thời gian từng lần, tổng thời gian)"""
+    outputs, latencies = [], []
+    started = time.perf_counter()
+    for item in items:
+        begin = time.perf_counter()
+        outputs.append(fn(item))
+        latencies.append(time.perf_counter() - begin)
+    return outputs, latencies, time.perf_counter() - started
+
+
+def bench_decode(payloads, resolution, imread_flag):
+    from app.services.frame_pipeline import decode_base64_frame
+
+    encoded = [frame for payload in payloads for frame in payload.frames]
+    decoded, latencies, elapsed = timed(lambda frame: decode_base64_frame(frame, imread_flag), encoded)
+    return summarize("decode", resolution, latencies, len(encoded), elapsed), decoded
+
+
+def bench_landmarks(landmarker, decoded, resolution, landmark_options):
+    def run(frame):
+        return landmarker.get_frame_landmarks(frame, **landmark_options)
+
+    landmarks, latencies, elapsed = timed(run, decoded)
+    return summarize("landmarks", resolution, latencies, len(decoded), elapsed), landmarks
+
+
+def bench_embedding(model_service, sequences, resolution):
+    embeddings, latencies, elapsed = timed(model_service.extract_embedding, sequences)
+    frames = sum(len(sequence) for sequence in sequences)
+    return summarize("embedding", resolution, latencies, frames, elapsed, len(sequences)), embeddings
+
+
+def match_rate(model_service, similarities):
+    """Tỉ lệ request đạt ngưỡng của model (như get_similarity_status trả về "Match!")"""
+    return float(np.mean(np.asarray(similarities) >= model_service.threshold))
+
+
+def bench_similarity(model_service, embeddings, references, resolution, repeat, decisions=True):
+    """embeddings[i] là của request i % len(references), so với embedding mẫu của chính video đó"""
+    pairs = [(embeddings[i % len(embeddings)], references[i % len(references)])
+             for i in range(len(embeddings) * repeat)]
+    similarities, latencies, elapsed = timed(lambda pair: model_service.calculate_similarity(*pair), pairs)
+    result = summarize("similarity", resolution, latencies, 0, elapsed, len(pairs))
+    result["match_rate"] = match_rate(model_service, similarities) if decisions else None
+    return result
+
+
+def score_request(model_service, payload, reference, imread_flag):
+    """Như routes.score_frames nhưng không qua DB/cache: decode + landmark + embedding + similarity"""
+    from app.services.frame_pipeline import frame_pipeline, decode_base64_frame
+    from app.services.landmark_pool import landmark_pool
+
+    with model_service.input_buffers.acquire() as user_landmarks:
+        with landmark_pool.acquire() as landmarker:
+            frame_pipeline.extract_landmarks(payload.frames[:FRAMES_LIMIT], landmarker,
+                                             decoder=decode_base64_frame, imread_flag=imread_flag,
+                                             out=user_landmarks, landmark_options=model_service.landmark_options,
+                                             detector_stride=model_service.detector_stride)
+        frames = len(user_landmarks)
+        embedding = model_service.extract_embedding(user_landmarks)
+    similarity = model_service.calculate_similarity(embedding, reference)
+    return frames, similarity
+
+
+def bench_end_to_end(model_service, payloads, references, resolution, imread_flag, concurrency, repeat,
+                     decisions=True):
+    jobs = [(payloads[i % len(payloads)], references[i % len(references)])
+            for i in range(len(payloads) * repeat)]
+
+    def run(job):
+        begin = time.perf_counter()
+        frames, similarity = score_request(model_service, job[0], job[1], imread_flag)
+        return frames, similarity, time.perf_counter() - begin
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outputs = list(executor.map(run, jobs))
+    elapsed = time.perf_counter() - started
+    frames = sum(count for count, _, _ in outputs)
+    result = summarize("end_to_end", resolution, [latency for _, _, latency in outputs], frames, elapsed,
+                       len(jobs))
+    result["concurrency"] = concurrency
+    result["match_rate"] = match_rate(model_service, [similarity for _, similarity, _ in outputs]) if decisions else None
+    return result
+
+
+def random_sequences(count, frames, seed=0):
+    """Chuỗi landmark giả khi không chạy bước landmarks (chi phí embedding không phụ thuộc giá trị)"""
+    rng = np.random.default_rng(seed)
+    return [rng.random((frames, LANDMARK_COUNT, 3), dtype=np.float32) for _ in range(count)]
+
+
+def load_references(args, videos):
+    """
+    (video, embedding mẫu) của các video có embedding trong --embedding-dir, theo thứ tự của videos.
+    Với --random-references: embedding của chuỗi ngẫu nhiên được tính sau khi có model (trả về None).
+    """
+    if args.random_references:
+        print("WARNING: --random-references: similarity is measured against random embeddings, "
+              "match_rate is not reported")
+        return videos, None
+    embeddings = load_reference_embeddings(args)
+    paired = [(path, embeddings.get(embedding_key(path))) for path in videos]
+    missing = [os.path.basename(path) for path, reference in paired if reference is None]
+    if missing:
+        print(f"No reference embedding for {len(missing)} videos, skipping them: {missing[:5]}...")
+    paired = [(path, reference) for path, reference in paired if reference is not None]
+    if not paired:
+        raise SystemExit(f"No reference embeddings in {args.embedding_dir} for the videos in {args.video_dir} "
+                         f"(build them first, or pass --random-references to benchmark timing only)")
+    return [path for path, _ in paired], [reference for _, reference in paired]
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def result_key(result):
+    return result["stage"], result["resolution"], result.get("concurrency")
+
+
+def compare(results, previous_file):
+    """In thay đổi throughput và p95 so với file JSON của lần chạy trước"""
+    with open(previous_file, encoding="utf-8") as f:
+        previous = {result_key(result): result for result in json.load(f)["results"]}
+    print(f"\nCompared with {previous_file}:")
+    print(f"{'stage':<12} {'resolution':<10} {'throughput':>11} {'p95':>9}")
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None:
+            continue
+        metric = "requests_per_second" if result["frames_per_second"] is None else "frames_per_second"
+        throughput = result[metric] / before[metric] - 1 if before.get(metric) else None
+        p95 = result["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1 if before["latency_ms"]["p95"] else None
+        print(f"{result['stage']:<12} {result['resolution'] or '-':<10} "
+              f"{throughput if throughput is not None else float('nan'):>+11.1%} "
+              f"{p95 if p95 is not None else float('nan'):>+9.1%}")
+
+
+def print_result(result):
+    fps = f"{result['frames_per_second']:.1f}" if result["frames_per_second"] else "-"
+    rps = f"{result['requests_per_second']:.1f}" if result["requests_per_second"] else "-"
+    latency = result["latency_ms"]
+    matches = f"{result['match_rate']:.1%}" if result.get("match_rate") is not None else "-"
+    print(f"{result['stage']:<12} {result['resolution'] or '-':<10} {fps:>9} {rps:>9} "
+          f"{latency['p50']:>9.3f} {latency['p95']:>9.3f} {latency['p99']:>9.3f} {matches:>7}")
+
+
+def select_stages(stages):
+    """Bước được chọn; landmarks/end_to_end cần MediaPipe nên bị bỏ khỏi mặc định nếu chưa cài"""
+    has_mediapipe = importlib.util.find_spec("mediapipe") is not None
+    if stages is None:
+        if has_mediapipe:
+            return list(STAGES)
+        print(f"MediaPipe is not installed: skipping the {', '.join(MEDIAPIPE_STAGES)} stages "
+              f"(install mediapipe to benchmark them)")
+        return [stage for stage in STAGES if stage not in MEDIAPIPE_STAGES]
+    missing = [stage for stage in stages if stage in MEDIAPIPE_STAGES]
+    if missing and not has_mediapipe:
+        raise SystemExit(f"Stages {', '.join(missing)} need MediaPipe, which is not installed")
+    return stages
+
+
+def main():
+    parser = add_model_arguments(new_parser(__doc__))
+    parser.add_argument("--fake-model", action="store_true", help="Dùng FakeEmbeddingModel, không cần TensorFlow/DB")
+    parser.add_argument("--resolutions", nargs="+", default=["320x240", "640x480", "1280x720"])
+    parser.add_argument("--stages", nargs="+", choices=STAGES,
+                        help="Mặc định: mọi bước (không có MediaPipe thì bỏ landmarks và end_to_end)")
+    parser.add_argument("--videos", type=int, default=10, help="Số video mẫu dùng làm request")
+    parser.add_argument("--frames", type=int, default=FRAMES_LIMIT)
+    parser.add_argument("--quality", type=int, default=80, help="Chất lượng JPEG của frame")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp lại tập request (embedding/end_to_end)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Số request end_to_end chạy cùng lúc")
+    parser.add_argument("--warmup", type=int, default=2, help="Số request chạy trước khi đo")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--compare", help="File JSON của lần chạy trước để so sánh")
+    parser.add_argument("--random-references", action="store_true",
+                        help="Không có embedding mẫu: so với embedding ngẫu nhiên (chỉ đo thời gian)")
+    args = parser.parse_args()
+    args.stages = select_stages(args.stages)
+
+    from app.services.frame_pipeline import imread_flag_for_scale
+
+    videos = list_videos(args.video_dir)[:args.videos]
+    if not videos:
+        raise SystemExit(f"No videos in {args.video_dir}")
+    videos, references = load_references(args, videos)
+    # match_rate chỉ có nghĩa khi embedding người dùng đến từ model thật và so với embedding mẫu thật
+    decisions = references is not None and not args.fake_model
+    resolutions = [parse_resolution(value) for value in args.resolutions]
+    print(f"Encoding {len(videos)} videos x {len(resolutions)} resolutions ({args.frames} frames each)...")
+    payloads = build_payloads(videos, resolutions, args.frames, args.quality, args.model_id)
+
+    if args.fake_model:
+        # Model giả cho ra embedding cùng số chiều với embedding mẫu
+        dim = references[0].size if references is not None else 128
+        model_service = fake_model_service(parse_target_shape(args.target_shape), args.threshold, args.model_id,
+                                           dim)
+    else:
+        model_service = load_model_service(args)
+    imread_flag = imread_flag_for_scale(model_service.options["decode_scale"])
+    landmark_options = model_service.landmark_options
+    needs_mediapipe = "landmarks" in args.stages or "end_to_end" in args.stages
+    landmarker = None
+    if needs_mediapipe:
+        from app.services.landmark_service import LandmarkService
+        from app.services.landmark_pool import landmark_pool
+        landmarker = LandmarkService()
+        if "end_to_end" in args.stages:
+            landmark_pool.start()
+
+    if references is None:
+        references = [model_service.extract_embedding(sequence)
+                      for sequence in random_sequences(len(videos), args.frames, seed=1)]
+    for sequence in random_sequences(args.warmup, args.frames, seed=2):
+        model_service.extract_embedding(sequence)
+
+    results = []
+    print(f"\n{'stage':<12} {'resolution':<10} {'frames/s':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'match':>7}")
+    try:
+        for resolution in resolutions:
+            requests = payloads[resolution]
+            decoded = landmarks = None
+            if "decode" in args.stages or "landmarks" in args.stages:
+                result, decoded = bench_decode(requests, resolution, imread_flag)
+                if "decode" in args.stages:
+                    results.append(result)
+                    print_result(result)
+            if "landmarks" in args.stages:
+                for frame in decoded[:args.warmup]:
+                    landmarker.get_frame_landmarks(frame, **landmark_options)
+                result, landmarks = bench_landmarks(landmarker, decoded, resolution, landmark_options)
+                results.append(result)
+                print_result(result)
+
+            if landmarks is not None:
+                offsets = np.cumsum([0] + [len(payload.frames) for payload in requests])
+                sequences = [np.stack(landmarks[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+            else:
+                sequences = random_sequences(len(requests), args.frames)
+            embeddings = None
+            if "embedding" in args.stages or "similarity" in args.stages:
+                result, embeddings = bench_embedding(model_service, sequences * args.repeat, resolution)
+                if "embedding" in args.stages:
+                    results.append(result)
+                    print_result(result)
+            if "similarity" in args.stages:
+                result = bench_similarity(model_service, embeddings, references, resolution, args.repeat,
+                                          decisions and landmarks is not None)
+                results.append(result)
+                print_result(result)
+
+            if "end_to_end" in args.stages:
+                for payload in requests[:args.warmup]:
+                    score_request(model_service, payload, references[0], imread_flag)
+                result = bench_end_to_end(model_service, requests, references, resolution, imread_flag,
+                                          args.concurrency, args.repeat, decisions)
+                results.append(result)
+                print_result(result)
+    finally:
+        model_service.close()
+        if needs_mediapipe and "end_to_end" in args.stages:
+            from app.services.frame_pipeline import frame_pipeline
+            from app.services.landmark_pool import landmark_pool
+            landmark_pool.shutdown()
+            frame_pipeline.shutdown()
+
+    report = {
+        "meta": {
+            "time": datetime.utcnow().isoformat() + "Z",
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "model": "fake" if args.fake_model else (args.model_file or f"model_id={args.model_id}"),
+            "references": "random" if args.random_references else args.embedding_dir,
+            "target_shape": list(model_service.config["target_shape"]),
+            "options": model_service.options,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\nResults written to {args.json}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Gộp các file <video>_embedding.npy của một model thành một file embedding hợp nhất (mmap được).
+
+    python -m tools.build_embedding_store --model-id 1                      # float16, version kế tiếp
+    python -m tools.build_embedding_store --model-id 2 --dtype int8 --version 3
+    python -m tools.build_embedding_store --embedding-dir Family/reference_embedding2 --no-db
+
+File được ghi vào chính thư mục embedding (embeddings-v<version>.emb); ReferenceEmbeddingStore dùng
+version mới nhất trừ khi MODEL_OPTIONS[model_id]["embedding_store_version"] chỉ định khác.
+Khi có DB, video_id của từng embedding (bảng videos) được ghi vào chỉ mục của file.
+"""
+import os
+import sys
+import time
+import numpy as np
+from app.config.settings import BASE_DIR, MODEL_DIRS
+from app.services.embedding_file import (
+    DTYPES, EmbeddingFile, dequantize, embedding_file_name, find_embedding_files, write_embedding_file
+)
+from app.services.embedding_store import ReferenceEmbeddingStore, embedding_key
+from app.services.similarity import normalize
+from tools.common import new_parser
+
+
+def load_video_ids(model_id):
+    """{embedding key: video_id} từ bảng videos"""
+    from app.database.connection import execute_query
+
+    rows = execute_query("SELECT id, video_filename FROM videos WHERE model_id = %s", (model_id,))
+    return {embedding_key(row["video_filename"]): row["id"] for row in rows}
+
+
+def compare(reference, stored):
+    """Sai số của file so với embedding float32 gốc: cosine nhỏ nhất và tỉ lệ giữ nguyên top-1"""
+    reference = normalize(reference)
+    cosines = np.einsum("ij,ij->i", reference, normalize(stored))
+    exact_top1 = np.argsort(-(reference @ reference.T), axis=1)[:, 1]
+    stored_top1 = np.argsort(-(reference @ normalize(stored).T), axis=1)[:, 1]
+    return {
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "neighbour_agreement": float(np.mean(exact_top1 == stored_top1)),
+    }
+
+
+def main():
+    parser = new_parser(__doc__)
+    parser.add_argument("--model-id", type=int, default=1)
+    parser.add_argument("--embedding-dir", help="Mặc định lấy từ MODEL_DIRS[model_id]")
+    parser.add_argument("--dtype", choices=list(DTYPES), default="float16")
+    parser.add_argument("--version", type=int, help="Version model của file, mặc định version lớn nhất + 1")
+    parser.add_argument("--no-db", action="store_true", help="Không đọc video_id từ bảng videos")
+    args = parser.parse_args()
+
+    embedding_dir = args.embedding_dir or MODEL_DIRS[args.model_id]["embedding_dir"]
+    directory = embedding_dir if os.path.isabs(embedding_dir) else os.path.join(BASE_DIR, embedding_dir)
+    if not os.path.isdir(directory):
+        print(f"Embedding directory not found: {directory}")
+        return 1
+
+    # Luôn đọc từ các file .npy gốc, không đọc lại file hợp nhất đã lượng tử hoá
+    store = ReferenceEmbeddingStore({args.model_id: {"embedding_dir": directory}}, watch_interval=0)
+    embeddings = store._load_directory(args.model_id, directory)
+    if len(embeddings) == 0:
+        print(f"No {directory}/*_embedding.npy files")
+        return 1
+
+    video_ids = None
+    if not args.no_db:
+        known = load_video_ids(args.model_id)
+        video_ids = [known.get(key) for key in embeddings.keys]
+        print(f"{sum(v is not None for v in video_ids)}/{len(embeddings)} embeddings matched to a video_id")
+
+    existing = find_embedding_files(directory)
+    version = args.version or (max(existing) + 1 if existing else 1)
+    path = os.path.join(directory, embedding_file_name(version))
+    npy_bytes = sum(size for name, _, size in embeddings.signature if name.endswith(".npy"))
+
+    started = time.perf_counter()
+    write_embedding_file(path, embeddings.keys, embeddings.matrix, args.dtype, version, video_ids,
+                         metadata={"source": embedding_dir, "created": int(time.time())})
+    stored = EmbeddingFile(path)
+
+    print(f"Wrote {path} in {time.perf_counter() - started:.2f}s")
+    print(f"  {len(stored)} x {stored.dim} {stored.dtype}, {stored.nbytes} bytes "
+          f"({len(embeddings)} .npy files, {npy_bytes} bytes)")
+    for name, value in compare(embeddings.matrix, dequantize(stored.vectors, stored.scales)).items():
+        print(f"  {name}: {value:.6f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
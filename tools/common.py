@@ -0,0 +1,116 @@
+import argparse
+import os
+import numpy as np
+from app.config.settings import BASE_DIR, MODEL_DIRS
+from app.services.embedding_store import ReferenceEmbeddingStore
+from app.services.similarity import similarity_score
+from app.utils.video import load_reference_landmarks
+
+DEFAULT_VIDEO_DIR = "Family/Family_video2"
+DEFAULT_EMBEDDING_DIR = MODEL_DIRS[1]["embedding_dir"]
+
+
+def add_model_arguments(parser):
+    """Model lấy từ bảng models (--model-id) hoặc khai báo trực tiếp khi không có DB"""
+    parser.add_argument("--model-id", type=int, default=1)
+    parser.add_argument("--model-file", help="Bỏ qua DB: đường dẫn file .keras")
+    parser.add_argument("--target-shape", default="120,100,3")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--video-dir", default=DEFAULT_VIDEO_DIR)
+    parser.add_argument("--embedding-dir", default=DEFAULT_EMBEDDING_DIR)
+    parser.add_argument("--landmark-cache", default=os.path.join(BASE_DIR, "reference_landmarks.npz"),
+                        help="File .npz lưu landmark của video mẫu để không phải chạy lại MediaPipe")
+    return parser
+
+
+def parse_target_shape(value):
+    return tuple(int(x) for x in value.strip("()").replace(" ", "").split(","))
+
+
+def load_model_service(args, backend=None, model=None):
+    from app.services.model_service import ModelService
+
+    if not args.model_file:
+        return ModelService(args.model_id, backend=backend)
+
+    config = {
+        "model_file": args.model_file,
+        "embedding_dir": args.embedding_dir,
+        "threshold": args.threshold,
+        "target_shape": parse_target_shape(args.target_shape),
+    }
+    if model is None and backend != "tflite":
+        from tensorflow.keras.models import load_model
+        model = load_model(args.model_file)
+    return ModelService(args.model_id, config=config, model=model, backend=backend)
+
+
+class FakeOutput:
+    def __init__(self, value):
+        self.value = value
+
+    def numpy(self):
+        return self.value
+
+
+class FakeEmbeddingModel:
+    """
+    Model giả có giao diện như model Keras (__call__, predict, count_params) để chạy công cụ/benchmark
+    trên máy không có TensorFlow: mỗi frame qua một lớp dense + ReLU cố định (seed) rồi lấy trung bình
+    theo thời gian -> embedding (n, dim). Rẻ hơn model thật nhiều, chỉ dùng để đo phần còn lại của pipeline.
+    """
+
+    def __init__(self, target_shape, dim=128, seed=0):
+        self.frames = target_shape[0]
+        features = int(np.prod(target_shape[1:]))
+        rng = np.random.default_rng(seed)
+        self.weights = (rng.standard_normal((features, dim)) / np.sqrt(features)).astype(np.float32)
+        self.bias = np.full(dim, 0.01, dtype=np.float32)
+
+    def __call__(self, inputs, training=False):
+        inputs = np.asarray(inputs, dtype=np.float32)
+        hidden = np.maximum(inputs.reshape(len(inputs), self.frames, -1) @ self.weights + self.bias, 0)
+        return FakeOutput(hidden.mean(axis=1))
+
+    def predict(self, inputs, verbose=0):
+        return self(inputs).numpy()
+
+    def count_params(self):
+        return self.weights.size + self.bias.size
+
+
+def fake_model_service(target_shape, threshold=0.5, model_id=0, dim=128):
+    """ModelService dùng FakeEmbeddingModel (backend "direct"), không cần DB hay file model"""
+    from app.services.model_service import ModelService
+
+    config = {"model_file": "fake.keras", "embedding_dir": "", "threshold": threshold, "target_shape": target_shape}
+    return ModelService(model_id, config=config, model=FakeEmbeddingModel(target_shape, dim), backend="direct")
+
+
+def load_reference_embeddings(args):
+    """Embedding tham chiếu của model trong --embedding-dir (file hợp nhất hoặc các file .npy)"""
+    store = ReferenceEmbeddingStore({args.model_id: {"embedding_dir": args.embedding_dir}}, watch_interval=0)
+    return store.reload(args.model_id)
+
+
+def load_reference_set(args, limit):
+    """Landmark của các video mẫu + embedding tham chiếu tương ứng (chỉ lấy video có cả hai)"""
+    cache_file = None
+    if args.landmark_cache:
+        # Mỗi số frame tối đa có file cache riêng
+        cache_file = f"{os.path.splitext(args.landmark_cache)[0]}.{limit or 'all'}frames.npz"
+    landmarks = load_reference_landmarks(args.video_dir, limit=limit, cache_file=cache_file)
+    embeddings = load_reference_embeddings(args)
+    keys = [key for key in sorted(landmarks) if key in embeddings.rows]
+    missing = sorted(set(landmarks) - set(keys))
+    if missing:
+        print(f"No reference embedding for {len(missing)} videos: {missing[:5]}...")
+    return keys, {key: landmarks[key] for key in keys}, embeddings
+
+
+def cosine(a, b):
+    return similarity_score(a, b, "cosine")
+
+
+def new_parser(description):
+    return argparse.ArgumentParser(description=description)
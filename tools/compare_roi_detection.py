@@ -0,0 +1,107 @@
+"""
+So sánh chế độ landmark_detection "roi" với "full" trên video mẫu, có thể phóng to frame
+để mô phỏng webcam độ phân giải cao của client desktop.
+
+    python -m tools.compare_roi_detection --scale 2 --videos 10
+    python -m tools.compare_roi_detection --scale 3 --score --model-id 1
+
+In thời gian landmark mỗi frame của hai chế độ, sai lệch landmark (toạ độ chuẩn hoá) theo từng phần
+và tỉ lệ frame mà một chế độ phát hiện được phần đó còn chế độ kia thì không.
+--score: chấm thêm similarity với embedding tham chiếu để xem quyết định Match có đổi không.
+"""
+import time
+import numpy as np
+import cv2
+from app.config.settings import FRAMES_LIMIT
+from app.utils.landmarks import HAND_NUM, POSE_OFFSET, FACE_OFFSET, LANDMARK_COUNT
+from app.utils.video import list_videos, read_video_frames
+from app.services.embedding_store import embedding_key
+from tools.common import add_model_arguments, new_parser, load_model_service, load_reference_set
+
+PARTS = {
+    "right_hand": slice(0, HAND_NUM),
+    "left_hand": slice(HAND_NUM, POSE_OFFSET),
+    "pose": slice(POSE_OFFSET, FACE_OFFSET),
+    "face": slice(FACE_OFFSET, LANDMARK_COUNT),
+}
+
+
+def upscale(frames, scale):
+    if scale == 1:
+        return frames
+    return [cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR) for frame in frames]
+
+
+def extract(service, frames, roi):
+    """Landmark (frames, điểm, 3) và thời gian trung bình mỗi frame (ms)"""
+    landmarks = np.zeros((len(frames), LANDMARK_COUNT, 3), dtype=np.float32)
+    started = time.perf_counter()
+    for frame, out in zip(frames, landmarks):
+        service.get_frame_landmarks(frame, out=out, roi=roi)
+    return landmarks, (time.perf_counter() - started) / max(len(frames), 1) * 1000
+
+
+def compare_parts(full, roi):
+    stats = {}
+    for name, part in PARTS.items():
+        full_found = full[:, part].any(axis=(1, 2))
+        roi_found = roi[:, part].any(axis=(1, 2))
+        both = full_found & roi_found
+        error = np.abs(full[both, part] - roi[both, part])[..., :2].mean() if both.any() else 0.0
+        stats[name] = (float(error), float(np.mean(full_found != roi_found)))
+    return stats
+
+
+def main():
+    from app.services.landmark_service import LandmarkService
+
+    parser = add_model_arguments(new_parser(__doc__))
+    parser.add_argument("--scale", type=float, default=2.0, help="Hệ số phóng to frame video mẫu")
+    parser.add_argument("--videos", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=FRAMES_LIMIT)
+    parser.add_argument("--score", action="store_true", help="Chấm similarity bằng model (cần DB hoặc --model-file)")
+    args = parser.parse_args()
+
+    videos = list_videos(args.video_dir)[:args.videos]
+    model_service = embeddings = None
+    if args.score:
+        model_service = load_model_service(args)
+        _, _, embeddings = load_reference_set(args, args.frames)
+
+    # Mỗi chế độ có LandmarkService riêng để trạng thái tracking không lẫn vào nhau
+    services = {False: LandmarkService(), True: LandmarkService()}
+    totals = {False: [], True: []}
+    part_stats = {name: [] for name in PARTS}
+    flips = 0
+    frames = []
+    for path in videos:
+        frames = upscale(read_video_frames(path, args.frames), args.scale)
+        full, full_ms = extract(services[False], frames, roi=False)
+        roi, roi_ms = extract(services[True], frames, roi=True)
+        totals[False].append(full_ms)
+        totals[True].append(roi_ms)
+        for name, values in compare_parts(full, roi).items():
+            part_stats[name].append(values)
+
+        line = f"{embedding_key(path):<40} full {full_ms:7.1f} ms/frame  roi {roi_ms:7.1f} ms/frame"
+        reference = embeddings.get(embedding_key(path)) if embeddings is not None else None
+        if reference is not None:
+            scores = [model_service.calculate_similarity(model_service.extract_embedding(x), reference)
+                      for x in (full, roi)]
+            flipped = (scores[0] >= model_service.threshold) != (scores[1] >= model_service.threshold)
+            flips += flipped
+            line += f"  similarity {scores[0]:.4f} -> {scores[1]:.4f}{'  MATCH CHANGED' if flipped else ''}"
+        print(line)
+
+    height, width = frames[0].shape[:2] if frames else (0, 0)
+    print(f"\n{len(videos)} videos at {width}x{height}: full {np.mean(totals[False]):.1f} ms/frame, "
+          f"roi {np.mean(totals[True]):.1f} ms/frame")
+    for name, values in part_stats.items():
+        errors, mismatches = zip(*values) if values else ((0,), (0,))
+        print(f"  {name:<11} mean |dxy| {np.mean(errors):.4f}  detection mismatch {np.mean(mismatches):.1%}")
+    if args.score:
+        print(f"  Match decision changed for {flips} videos")
+
+
+if __name__ == "__main__":
+    main()
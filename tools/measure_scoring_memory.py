@@ -0,0 +1,132 @@
+"""
+Đo bộ nhớ đỉnh và số vùng nhớ được cấp phát cho mỗi request trên đường chấm điểm
+(landmark từng frame -> tensor đầu vào -> predict), so sánh cách cũ với LandmarkTensorPool.
+
+    python -m tools.measure_scoring_memory
+    python -m tools.measure_scoring_memory --frames 60 --target-shape 120,100,3 --requests 50
+
+MediaPipe và model được thay bằng bản giả (không cần DB, TensorFlow hay video) để chỉ đo phần
+NumPy của đường chấm điểm. Số vùng nhớ được đếm bằng tracemalloc tại thời điểm model nhận tensor,
+là lúc mọi bản sao của chuỗi landmark còn sống.
+"""
+import tracemalloc
+import numpy as np
+from app.config.settings import FRAMES_LIMIT
+from app.utils.landmarks import LANDMARK_COUNT
+from tools.common import FakeOutput, new_parser, parse_target_shape
+
+EMBEDDING_DIM = 1024
+
+
+class FakeLandmarker:
+    """Thay LandmarkService: trả landmark cố định, có out thì ghi vào đó"""
+
+    def __init__(self):
+        self.values = np.random.default_rng(0).random((LANDMARK_COUNT, 3))
+
+    def get_frame_landmarks(self, frame, out=None):
+        if out is None:
+            out = np.zeros((LANDMARK_COUNT, 3))
+        out[...] = self.values
+        return out
+
+
+class LegacyLandmarker(FakeLandmarker):
+    """Cách cũ: mỗi frame một mảng float64 mới"""
+
+    def get_frame_landmarks(self, frame, out=None):
+        all_landmarks = np.zeros((LANDMARK_COUNT, 3))
+        all_landmarks[...] = self.values
+        return all_landmarks
+
+
+class FakeModel:
+    """Model giả cho DirectCallBackend: chụp snapshot tracemalloc khi nhận tensor"""
+
+    def __init__(self):
+        self.snapshot = None
+
+    def __call__(self, inputs, training=False):
+        if tracemalloc.is_tracing():
+            self.snapshot = tracemalloc.take_snapshot()
+        flat = np.asarray(inputs).reshape(len(inputs), -1)
+        return FakeOutput(flat[:, :EMBEDDING_DIM].astype(np.float32))
+
+
+def legacy_prepare_input(video_landmarks, target_shape):
+    """ModelService.prepare_input trước khi có LandmarkTensorPool"""
+    video_landmarks = np.array(video_landmarks, dtype=np.float32)
+    if video_landmarks.shape[0] < target_shape[0]:
+        padding = target_shape[0] - video_landmarks.shape[0]
+        video_landmarks = np.pad(video_landmarks, ((0, padding), (0, 0), (0, 0)), mode='constant')
+    else:
+        video_landmarks = video_landmarks[:target_shape[0], :, :]
+    return np.reshape(video_landmarks, (1, *target_shape))
+
+
+def legacy_request(model_service, frames):
+    landmarker = LegacyLandmarker()
+    user_landmarks = [landmarker.get_frame_landmarks(frame) for frame in frames]
+    inputs = legacy_prepare_input(user_landmarks, model_service.config['target_shape'])
+    return model_service._predict(inputs)
+
+
+def pooled_request(model_service, frames):
+    landmarker = FakeLandmarker()
+    with model_service.input_buffers.acquire() as user_landmarks:
+        for frame in frames:
+            landmarker.get_frame_landmarks(frame, out=user_landmarks.next_slot())
+            user_landmarks.commit()
+            if user_landmarks.is_full:
+                break
+        return model_service.extract_embedding(user_landmarks)
+
+
+def measure(run, model_service, model, frames, requests):
+    """(KiB đỉnh, số vùng nhớ còn sống lúc predict, KiB còn sống lúc predict) trung bình mỗi request"""
+    run(model_service, frames)  # Khởi tạo pool/batcher trước khi đo
+    peaks, blocks, sizes = [], [], []
+    tracemalloc.start()
+    try:
+        for _ in range(requests):
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            run(model_service, frames)
+            peaks.append(tracemalloc.get_traced_memory()[1] - start)
+            diff = [stat for stat in model.snapshot.compare_to(before, "lineno") if stat.size_diff > 0]
+            blocks.append(sum(stat.count_diff for stat in diff))
+            sizes.append(sum(stat.size_diff for stat in diff))
+    finally:
+        tracemalloc.stop()
+    return np.mean(peaks) / 1024, np.mean(blocks), np.mean(sizes) / 1024
+
+
+def main():
+    from app.services.model_service import ModelService
+
+    parser = new_parser(__doc__)
+    parser.add_argument("--frames", type=int, default=FRAMES_LIMIT)
+    parser.add_argument("--target-shape", default="120,100,3")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    target_shape = parse_target_shape(args.target_shape)
+    model = FakeModel()
+    config = {"model_file": "fake.keras", "embedding_dir": "", "threshold": 0.5, "target_shape": target_shape}
+    model_service = ModelService(0, config=config, model=model, backend="direct")
+    frames = [None] * args.frames  # Landmarker giả không đọc frame
+
+    try:
+        print(f"{args.frames} frames -> tensor {(1, *target_shape)}, {args.requests} requests")
+        print(f"{'path':<8} {'peak KiB':>9} {'live blocks':>12} {'live KiB':>9}")
+        for name, run in (("legacy", legacy_request), ("pooled", pooled_request)):
+            peak, blocks, size = measure(run, model_service, model, frames, args.requests)
+            print(f"{name:<8} {peak:>9.1f} {blocks:>12.1f} {size:>9.1f}")
+        print(f"input buffers: {model_service.input_buffers.get_stats()}")
+    finally:
+        model_service.close()
+
+
+if __name__ == "__main__":
+    main()
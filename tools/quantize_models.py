@@ -0,0 +1,132 @@
+"""
+Tạo biến thể lượng tử hoá (int8 dynamic-range, float16, int8 có calibration) cho các model
+trong bảng models và kiểm tra độ chính xác trước khi cho phép dùng.
+
+    python -m tools.quantize_models                      # mọi model trong bảng models
+    python -m tools.quantize_models --model-id 1 --variants int8 float16
+    python -m tools.quantize_models --model-file Family-embeded.keras --threshold 0.5
+
+Calibration dùng landmark tính từ video mẫu (Family/Family_video2). Mỗi biến thể được so với model
+float: quyết định Match/Not Match (theo threshold của model) và cosine similarity với các embedding
+tham chiếu. Kết quả ghi vào <model>.<variant>.tflite.json; ModelService chỉ bật biến thể có "passed": true.
+"""
+import json
+import os
+import sys
+import numpy as np
+from app.config.settings import FRAMES_LIMIT
+from app.services.similarity import cosine_similarity, normalize
+from app.services.inference_backend import (
+    QUANTIZED_VARIANTS, TFLiteBackend, convert_to_tflite, tflite_path_for, quantization_report_path
+)
+from tools.common import add_model_arguments, new_parser, load_model_service, load_reference_set
+
+
+def converter_options(variant, calibration_inputs):
+    import tensorflow as tf
+
+    if variant == "int8":
+        return {"optimizations": [tf.lite.Optimize.DEFAULT]}
+    if variant == "float16":
+        return {"optimizations": [tf.lite.Optimize.DEFAULT], "supported_types": [tf.float16]}
+    if variant == "int8-calibrated":
+        def representative_dataset():
+            for inputs in calibration_inputs:
+                yield [inputs]
+        return {"optimizations": [tf.lite.Optimize.DEFAULT], "representative_dataset": representative_dataset}
+    raise ValueError(f"Unknown variant {variant}")
+
+
+def compare_to_float(float_embeddings, quant_embeddings, references, threshold):
+    """So sánh quyết định Match/Not Match và cosine của mọi cặp (lần thử, video mẫu)"""
+    float_sim = cosine_similarity(float_embeddings, references)
+    quant_sim = cosine_similarity(quant_embeddings, references)
+    float_match = float_sim >= threshold
+    quant_match = quant_sim >= threshold
+    parity = np.sum(normalize(float_embeddings) * normalize(quant_embeddings), axis=1)
+    return {
+        "pairs": int(float_sim.size),
+        "decision_agreement": float(np.mean(float_match == quant_match)),
+        "decision_flips": int(np.sum(float_match != quant_match)),
+        "own_reference_flips": int(np.sum(np.diag(float_match) != np.diag(quant_match))),
+        "max_similarity_delta": float(np.max(np.abs(float_sim - quant_sim))),
+        "mean_similarity_delta": float(np.mean(np.abs(float_sim - quant_sim))),
+        "min_embedding_cosine": float(np.min(parity)),
+    }
+
+
+def quantize_model(args, model_id=None):
+    if model_id is not None:
+        args.model_id = model_id
+    float_service = load_model_service(args, backend="keras")
+    model_file = float_service.config['model_file']
+    threshold = float_service.config['threshold']
+
+    keys, landmarks, embeddings = load_reference_set(args, limit=FRAMES_LIMIT)
+    inputs = [float_service.prepare_input(landmarks[key]) for key in keys]
+    references = np.concatenate([embeddings.get(key) for key in keys])
+    float_embeddings = np.concatenate([float_service.predict_batch(x) for x in inputs])
+    # Calibration trên một phần video mẫu để phần còn lại kiểm tra khách quan hơn
+    calibration_inputs = inputs[::args.calibration_step]
+
+    results = {}
+    for variant in args.variants:
+        variant_path = tflite_path_for(model_file, variant)
+        convert_to_tflite(float_service.model, variant_path, **converter_options(variant, calibration_inputs))
+        backend = TFLiteBackend(None, float_service.config['target_shape'], model_path=variant_path)
+        quant_embeddings = np.concatenate([backend.predict(x) for x in inputs])
+
+        report = compare_to_float(float_embeddings, quant_embeddings, references, threshold)
+        report["passed"] = (report["decision_agreement"] >= args.min_agreement
+                            and report["own_reference_flips"] == 0
+                            and report["max_similarity_delta"] <= args.max_similarity_delta)
+        stat = os.stat(variant_path)
+        report.update({
+            "model_id": args.model_id,
+            "variant": variant,
+            "threshold": threshold,
+            "videos": len(keys),
+            "float_size": os.path.getsize(model_file),
+            "variant_size": stat.st_size,
+            "variant_mtime": int(stat.st_mtime),
+        })
+        with open(quantization_report_path(model_file, variant), "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        print(f"[model {args.model_id}] {variant:16s} agreement={report['decision_agreement']:.4f} "
+              f"flips={report['decision_flips']} max|Δsim|={report['max_similarity_delta']:.4f} "
+              f"size={stat.st_size / 1e6:.1f}MB -> {'PASS' if report['passed'] else 'FAIL'}")
+        results[variant] = report
+    return results
+
+
+def list_model_ids():
+    from app.database.connection import execute_query
+    return [row['id'] for row in execute_query("SELECT id FROM models ORDER BY id")]
+
+
+def main():
+    parser = add_model_arguments(new_parser(__doc__))
+    parser.set_defaults(model_id=None)
+    parser.add_argument("--variants", nargs="+", choices=QUANTIZED_VARIANTS, default=list(QUANTIZED_VARIANTS))
+    parser.add_argument("--calibration-step", type=int, default=2, help="Dùng 1/N video mẫu để calibration")
+    parser.add_argument("--min-agreement", type=float, default=0.995)
+    parser.add_argument("--max-similarity-delta", type=float, default=0.02)
+    args = parser.parse_args()
+
+    if args.model_file:
+        model_ids = [args.model_id or 1]
+    elif args.model_id is not None:
+        model_ids = [args.model_id]
+    else:
+        model_ids = list_model_ids()
+
+    all_passed = True
+    for model_id in model_ids:
+        results = quantize_model(args, model_id)
+        all_passed = all_passed and all(report["passed"] for report in results.values())
+    sys.exit(0 if all_passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Chọn margin cho chấm điểm sớm (options["early_exit"]) từ tập video mẫu.
+
+    python -m tools.tune_early_exit --checkpoints 30 45
+    python -m tools.tune_early_exit --model-file Family-embeded.keras --checkpoints 20 30 45 --noise 0.02
+
+Mỗi video mẫu (landmark có thêm nhiễu --noise để giống một người làm lại) được so với embedding của
+chính nó (lần làm đúng) và với embedding của --negatives ký hiệu khác (lần làm sai). Với mỗi checkpoint,
+accept_margin/reject_margin là margin nhỏ nhất mà quyết định dừng sớm không khác quyết định khi chấm
+cả chuỗi (cho phép --tolerance tỉ lệ sai khác). In ra tỉ lệ request dừng được ở mỗi checkpoint
+và giá trị options["early_exit"] để đưa vào MODEL_OPTIONS.
+"""
+import json
+import numpy as np
+from app.config.settings import FRAMES_LIMIT
+from tools.common import add_model_arguments, new_parser, load_model_service, load_reference_set
+
+MARGIN_STEP = 0.005
+
+
+def partial_scores(model_service, landmarks, references, checkpoints):
+    """similarity (len(checkpoints) + 1, len(references)): mỗi checkpoint và cả chuỗi"""
+    embeddings = [model_service.extract_embedding(landmarks[:frames]) for frames in checkpoints]
+    embeddings.append(model_service.extract_embedding(landmarks))
+    return np.array([[model_service.calculate_similarity(embedding, reference) for reference in references]
+                     for embedding in embeddings])
+
+
+def smallest_margin(gaps, tolerance):
+    """Margin nhỏ nhất để không quá tolerance phần các mẫu có quyết định sai vượt qua (gaps = độ vượt ngưỡng)"""
+    gaps = np.sort(np.asarray(gaps))[::-1]
+    allowed = int(np.floor(tolerance * len(gaps)))
+    if len(gaps) <= allowed:
+        return 0.0
+    worst = max(gaps[allowed], 0.0)
+    return float(np.ceil((worst + 1e-9) / MARGIN_STEP) * MARGIN_STEP)
+
+
+def tune(scores, threshold, checkpoints, tolerance):
+    """scores: (mẫu, checkpoint + 1). Trả về [(frames, accept_margin, reject_margin, tỉ lệ dừng)]"""
+    final_match = scores[:, -1] >= threshold
+    results = []
+    undecided = np.ones(len(scores), dtype=bool)
+    for column, frames in enumerate(checkpoints):
+        partial = scores[:, column]
+        # accept sai: chấm sớm trên ngưỡng nhưng cả chuỗi là Not Match, reject sai thì ngược lại
+        accept_margin = smallest_margin(partial[~final_match] - threshold, tolerance)
+        reject_margin = smallest_margin(threshold - partial[final_match], tolerance)
+        exits = undecided & ((partial >= threshold + accept_margin) | (partial <= threshold - reject_margin))
+        results.append((frames, accept_margin, reject_margin, float(exits.sum() / len(scores))))
+        undecided &= ~exits
+    return results
+
+
+def main():
+    parser = add_model_arguments(new_parser(__doc__))
+    parser.add_argument("--checkpoints", type=int, nargs="+", default=[30, 45])
+    parser.add_argument("--frames", type=int, default=FRAMES_LIMIT)
+    parser.add_argument("--negatives", type=int, default=5, help="Số ký hiệu khác so với mỗi video")
+    parser.add_argument("--noise", type=float, default=0.01, help="Độ lệch chuẩn nhiễu thêm vào landmark")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Tỉ lệ quyết định sớm được phép sai khác")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    checkpoints = sorted(frames for frames in args.checkpoints if frames < args.frames)
+    model_service = load_model_service(args)
+    keys, landmarks, embeddings = load_reference_set(args, args.frames)
+    if len(keys) < 2:
+        raise SystemExit("Need at least two reference videos with embeddings")
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+    for i, key in enumerate(keys):
+        attempt = landmarks[key] + rng.normal(0, args.noise, landmarks[key].shape).astype(np.float32)
+        attempt[landmarks[key] == 0] = 0  # Phần không phát hiện được vẫn là 0
+        others = rng.choice([k for k in keys if k != key], size=min(args.negatives, len(keys) - 1), replace=False)
+        references = [embeddings.get(key)] + [embeddings.get(other) for other in others]
+        rows.append(partial_scores(model_service, attempt, references, checkpoints).T)
+        print(f"\r{i + 1}/{len(keys)} videos", end="", flush=True)
+    print()
+
+    scores = np.concatenate(rows)
+    threshold = model_service.threshold
+    results = tune(scores, threshold, checkpoints, args.tolerance)
+    print(f"{len(scores)} attempts, threshold {threshold}, "
+          f"{np.mean(scores[:, -1] >= threshold):.1%} Match on the full sequence")
+    print(f"{'frames':>6} {'accept':>8} {'reject':>8} {'exits':>7}")
+    for frames, accept, reject, exits in results:
+        print(f"{frames:>6} {accept:>8.3f} {reject:>8.3f} {exits:>7.1%}")
+
+    option = {"checkpoints": [
+        {"frames": frames, "accept_margin": accept, "reject_margin": reject}
+        for frames, accept, reject, _ in results
+    ]}
+    print(f'\nMODEL_OPTIONS[{args.model_id}]["early_exit"] = {json.dumps(option)}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Kiểm tra chính sách detector_stride trên video mẫu: similarity khi bỏ frame + nội suy
+so với similarity khi landmark đủ mọi frame.
+
+    python -m tools.validate_detector_stride --policies face=3,pose=2 face=2 face=3 face=4,pose=2
+    python -m tools.validate_detector_stride --model-file Family-embeded.keras --policies face=3 --json stride.json
+
+Landmark đủ frame được tính một lần (cache trong --landmark-cache). Mỗi chính sách được mô phỏng bằng
+cách xoá phần của detector ở các frame bị bỏ rồi nội suy lại đúng như FramePipeline, nên không tính
+ảnh hưởng của việc MediaPipe tracking giữa các frame bị thưa đi.
+"""
+import json
+import numpy as np
+from app.config.settings import FRAMES_LIMIT
+from app.utils.landmarks import DETECTORS, DETECTOR_PARTS, detector_schedule, interpolate_skipped
+from tools.common import add_model_arguments, new_parser, load_model_service, load_reference_set
+
+
+def parse_policy(value):
+    """'face=3,pose=2' -> {"hands": 1, "pose": 2, "face": 3}"""
+    stride = {name: 1 for name in DETECTORS}
+    for item in filter(None, value.split(",")):
+        name, _, count = item.partition("=")
+        if name not in stride:
+            raise SystemExit(f"Unknown detector '{name}', expected one of {list(DETECTORS)}")
+        stride[name] = int(count)
+    return stride
+
+
+def subsample(landmarks, stride):
+    """Landmark như khi chỉ chạy detector theo stride rồi nội suy, và số lần gọi mỗi detector"""
+    schedule = detector_schedule(len(landmarks), stride)
+    sampled = landmarks.copy()
+    for name, ran in schedule.items():
+        for part in DETECTOR_PARTS[name]:
+            sampled[~ran, part] = 0
+    interpolate_skipped(sampled, schedule)
+    return sampled, {name: int(ran.sum()) for name, ran in schedule.items()}
+
+
+def evaluate(model_service, keys, landmarks, embeddings, stride):
+    threshold = model_service.threshold
+    deltas, flips = [], 0
+    calls = {name: 0 for name in DETECTORS}
+    frames = 0
+    for key in keys:
+        reference = embeddings.get(key)
+        full = model_service.calculate_similarity(model_service.extract_embedding(landmarks[key]), reference)
+        sampled, used = subsample(landmarks[key], stride)
+        score = model_service.calculate_similarity(model_service.extract_embedding(sampled), reference)
+        deltas.append(score - full)
+        flips += (full >= threshold) != (score >= threshold)
+        frames += len(landmarks[key])
+        for name, count in used.items():
+            calls[name] += count
+
+    deltas = np.abs(deltas)
+    return {
+        "stride": stride,
+        "videos": len(keys),
+        "mean_abs_delta": float(deltas.mean()),
+        "max_abs_delta": float(deltas.max()),
+        "match_flips": int(flips),
+        "calls_per_frame": {name: calls[name] / frames for name in DETECTORS},
+    }
+
+
+def main():
+    parser = add_model_arguments(new_parser(__doc__))
+    parser.add_argument("--policies", nargs="+", default=["pose=2,face=3"])
+    parser.add_argument("--frames", type=int, default=FRAMES_LIMIT)
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    model_service = load_model_service(args)
+    keys, landmarks, embeddings = load_reference_set(args, args.frames)
+    if not keys:
+        raise SystemExit("No reference videos with embeddings")
+
+    results = []
+    print(f"{'policy':<28} {'mean |d|':>9} {'max |d|':>9} {'flips':>6}  calls/frame (hands pose face)")
+    for policy in args.policies:
+        result = evaluate(model_service, keys, landmarks, embeddings, parse_policy(policy))
+        results.append(result)
+        calls = " ".join(f"{result['calls_per_frame'][name]:.2f}" for name in DETECTORS)
+        print(f"{policy:<28} {result['mean_abs_delta']:>9.4f} {result['max_abs_delta']:>9.4f} "
+              f"{result['match_flips']:>6}  {calls}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Kiểm tra một inference backend cho ra embedding giống model Keras gốc.
+
+    python -m tools.verify_inference_backend --model-id 1 --backend tflite
+    python -m tools.verify_inference_backend --model-file Family-embeded.keras --backend function
+
+Landmark được tính lại từ các video mẫu (Family/Family_video2), embedding của backend được so với
+model.predict() và với embedding tham chiếu trong Family/reference_embedding2.
+"""
+import sys
+import time
+import numpy as np
+from app.services.inference_backend import INFERENCE_BACKENDS
+from tools.common import add_model_arguments, new_parser, load_model_service, load_reference_set, cosine
+
+
+def verify_backend(reference, candidate, keys, landmarks, embeddings, min_cosine):
+    worst = 1.0
+    max_abs_diff = 0.0
+    timings = {reference.backend_name: 0.0, candidate.backend_name: 0.0}
+    rows = []
+    for key in keys:
+        inputs = reference.prepare_input(landmarks[key])
+        outputs = {}
+        for service in (reference, candidate):
+            start = time.perf_counter()
+            outputs[service.backend_name] = service.predict_batch(inputs)
+            timings[service.backend_name] += time.perf_counter() - start
+
+        expected = outputs[reference.backend_name]
+        actual = outputs[candidate.backend_name]
+        parity = cosine(expected, actual)
+        worst = min(worst, parity)
+        max_abs_diff = max(max_abs_diff, float(np.max(np.abs(expected - actual))))
+        stored = embeddings.get(key)
+        rows.append((key, parity, cosine(expected, stored), cosine(actual, stored)))
+
+    for key, parity, ref_vs_stored, cand_vs_stored in rows:
+        flag = "" if parity >= min_cosine else "  <-- FAIL"
+        print(f"{key:45s} parity={parity:.6f} keras~stored={ref_vs_stored:.4f} "
+              f"{candidate.backend_name}~stored={cand_vs_stored:.4f}{flag}")
+
+    count = max(len(keys), 1)
+    print(f"\nVideos: {len(keys)}  min parity cosine: {worst:.6f}  max |diff|: {max_abs_diff:.6f}")
+    for name, total in timings.items():
+        print(f"{name:10s} mean latency: {total / count * 1000:.2f} ms")
+    return worst >= min_cosine
+
+
+def main():
+    parser = add_model_arguments(new_parser(__doc__))
+    parser.add_argument("--backend", choices=list(INFERENCE_BACKENDS), default="tflite")
+    parser.add_argument("--min-cosine", type=float, default=0.9999)
+    args = parser.parse_args()
+
+    reference = load_model_service(args, backend="keras")
+    candidate = load_model_service(args, backend=args.backend, model=reference.model)
+    target_frames = reference.config['target_shape'][0]
+
+    keys, landmarks, embeddings = load_reference_set(args, limit=target_frames)
+    passed = verify_backend(reference, candidate, keys, landmarks, embeddings, args.min_cosine)
+    print("PASS" if passed else "FAIL")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()